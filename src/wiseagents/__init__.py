@@ -6,7 +6,9 @@ from .utils import AbstractClassError, enforce_no_abstract_class_instances
 from wiseagents.core import WiseAgent
 from wiseagents.core import WiseAgentCollaborationType
 from wiseagents.core import WiseAgentContext
+from wiseagents.core import WiseAgentHistoryPolicy
 from wiseagents.core import WiseAgentRegistry
+from wiseagents.core import WiseAgentRegistrySettings
 from wiseagents.core import WiseAgentTool
 from wiseagents.core import WiseAgentMetaData
 from wiseagents.wise_agent_messaging import WiseAgentEvent
@@ -18,7 +20,7 @@ from wiseagents.wise_agent_messaging import WiseAgentTransport
 
 # Optionally, you can define __all__ to specify the public interface of the package
 # __all__ = ['module1', 'module2', 'subpackage']
-__all__ = ['WiseAgentRegistry', 'WiseAgentContext', 'WiseAgent', 'WiseAgentTool', 'WiseAgentMetaData',
+__all__ = ['WiseAgentRegistry', 'WiseAgentRegistrySettings', 'WiseAgentContext', 'WiseAgent', 'WiseAgentTool', 'WiseAgentMetaData',
            'WiseAgentMessage', 'WiseAgentMessageType', 'WiseAgentTransport', 'WiseAgentEvent',
-           'WiseAgentCollaborationType',
+           'WiseAgentCollaborationType', 'WiseAgentHistoryPolicy',
            'AbstractClassError', 'enforce_no_abstract_class_instances']
@@ -21,15 +21,20 @@ class AssistantAgent(WiseAgent):
     _response_delivery = None
     _cond = threading.Condition()
     _response : WiseAgentMessage = None
+    # The request waiting for a response, None when slow_echo isn't waiting
+    _pending_request : WiseAgentMessage = None
     _ctx = None
     
     def __new__(cls, *args, **kwargs):
         """Create a new instance of the class, setting default values for the optional instance variables."""
         obj = super().__new__(cls)
+        obj._priority = None
+        obj._request_timeout = None
         return obj
 
     def __init__(self, name: str, metadata: WiseAgentMetaData , transport: WiseAgentTransport,
-                 destination_agent_name: str):
+                 destination_agent_name: str, priority: Optional[int] = None,
+                 request_timeout: Optional[float] = None):
         """
         Initialize the agent.
 
@@ -38,9 +43,15 @@ class AssistantAgent(WiseAgent):
             metadata (WiseAgentMetaData): the metadata for the agent
             transport (WiseAgentTransport): the transport to use for communication
             destination_agent_name (str): the name of the agent to send requests to
+            priority (Optional[int]): the priority of the requests sent, from 0 (lowest) to 9 (highest), e.g. to have
+            the interactive chats handled before the batch jobs sent to the same agents
+            request_timeout (Optional[float]): the number of seconds to wait for a response, the requests are
+            sent with a matching deadline so they are dropped instead of being handled once it has passed
         """
         self._name = name
         self._destination_agent_name = destination_agent_name
+        self._priority = priority
+        self._request_timeout = request_timeout
         super().__init__(name=name, metadata=metadata, transport=transport, llm=None)
 
     def __repr__(self):
@@ -62,9 +73,17 @@ class AssistantAgent(WiseAgent):
 
     def slow_echo(self, message, history):
             with self._cond:
-                self.handle_request(WiseAgentMessage(message=message, sender=self.name, context_name=self._ctx))
-                self._cond.wait()
-                return self._response.message
+                deadline = time.time() + self.request_timeout if self.request_timeout is not None else None
+                self._response = None
+                self._pending_request = WiseAgentMessage(message=message, sender=self.name, context_name=self._ctx,
+                                                         priority=self.priority, deadline=deadline)
+                try:
+                    self.handle_request(self._pending_request)
+                    if not self._cond.wait_for(lambda: self._response is not None, self.request_timeout):
+                        return "No response was received in time, please try again."
+                    return self._response.message
+                finally:
+                    self._pending_request = None
 
     def process_request(self, request: WiseAgentMessage,
                         conversation_history: List[ChatCompletionMessageParam]) -> Optional[str]:
@@ -87,9 +106,15 @@ class AssistantAgent(WiseAgent):
         return None
 
     def process_response(self, response : WiseAgentMessage):
-        """Process a response message just sending it back to the client."""
+        """Process a response message just sending it back to the client. The responses carry the deadline of
+        the request they answer, so a late response to a request which timed out isn't returned for the next one."""
         logging.getLogger(self.name).info(f"AssistantAgent: process_response: {response}")
         with self._cond:
+            pending_request = self._pending_request
+            if (pending_request is None
+                    or (response.deadline is not None and response.deadline != pending_request.deadline)):
+                logging.getLogger(self.name).info(f"AssistantAgent: dropping stale response: {response}")
+                return True
             self._response = response
             self._cond.notify()
         return True
@@ -116,6 +141,16 @@ class AssistantAgent(WiseAgent):
         """Get the name of the agent to send requests to."""
         return self._destination_agent_name
 
+    @property
+    def priority(self) -> Optional[int]:
+        """Get the priority of the requests sent."""
+        return self._priority
+
+    @property
+    def request_timeout(self) -> Optional[float]:
+        """Get the number of seconds to wait for a response."""
+        return self._request_timeout
+
     @property
     def response_delivery(self) -> Optional[Callable[[], WiseAgentMessage]]:
         """Get the function to deliver the response to the client.
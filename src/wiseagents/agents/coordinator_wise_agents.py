@@ -47,11 +47,11 @@ class SequentialCoordinatorWiseAgent(WiseAgent):
         # Generate a chat ID that will be used to collaborate on this query
         sub_ctx_name = f'{self.name}.{str(uuid.uuid4())}'
 
-        ctx = WiseAgentRegistry.create_sub_context(request.context_name, sub_ctx_name)
-        ctx.set_collaboration_type(WiseAgentCollaborationType.SEQUENTIAL)
-        ctx.set_agents_sequence(self._agents)
-        ctx.set_route_response_to(request.sender)
-        self.send_request(WiseAgentMessage(message=request.message, sender=self.name, context_name=ctx.name), self._agents[0])
+        ctx = WiseAgentRegistry.create_sub_context(request.context_name, sub_ctx_name,
+                                                   collaboration_type=WiseAgentCollaborationType.SEQUENTIAL,
+                                                   agents_sequence=self._agents, route_response_to=request.sender)
+        self.send_request(WiseAgentMessage(message=request.message, sender=self.name, context_name=ctx.name,
+                                           priority=request.priority, deadline=request.deadline), self._agents[0])
 
     def process_response(self, response):
         """
@@ -135,15 +135,15 @@ class SequentialMemoryCoordinatorWiseAgent(WiseAgent):
         # Generate a chat ID that will be used to collaborate on this query
         sub_ctx_name = f'{self.name}.{str(uuid.uuid4())}'
 
-        ctx = WiseAgentRegistry.create_sub_context(request.context_name, sub_ctx_name)
-        ctx.set_collaboration_type(WiseAgentCollaborationType.SEQUENTIAL_MEMORY)
+        chat_completion = []
         if self.metadata.system_message:
-            ctx.append_chat_completion(messages={"role": "system", "content": self.metadata.system_message})
-
-        ctx.set_agents_sequence(self._agents)
-        ctx.set_route_response_to(request.sender)
-        ctx.add_query(request.message)
-        self.send_request(WiseAgentMessage(message=request.message, sender=self.name, context_name=ctx.name), self._agents[0])
+            chat_completion.append({"role": "system", "content": self.metadata.system_message})
+        ctx = WiseAgentRegistry.create_sub_context(request.context_name, sub_ctx_name,
+                                                   collaboration_type=WiseAgentCollaborationType.SEQUENTIAL_MEMORY,
+                                                   llm_chat_completion=chat_completion, agents_sequence=self._agents,
+                                                   route_response_to=request.sender, queries=[request.message])
+        self.send_request(WiseAgentMessage(message=request.message, sender=self.name, context_name=ctx.name,
+                                           priority=request.priority, deadline=request.deadline), self._agents[0])
 
 
 class PhasedCoordinatorWiseAgent(WiseAgent):
@@ -217,24 +217,24 @@ class PhasedCoordinatorWiseAgent(WiseAgent):
         # Generate a chat ID that will be used to collaborate on this query
         sub_ctx_name = f'{self.name}.{str(uuid.uuid4())}'
 
-        ctx = WiseAgentRegistry.create_sub_context(request.context_name, sub_ctx_name)
-        ctx.set_collaboration_type(WiseAgentCollaborationType.PHASED)
-        ctx.set_route_response_to(request.sender)
-        logging.debug(f"Registred context: {WiseAgentRegistry.get_context(ctx.name)}")
         # Determine the agents required to answer the query
         agent_selection_prompt = ("Given the following query and a description of the agents that are available," +
                                   " determine all of the agents that could be required to solve the query." +
                                   " Format the response as a space separated list of agent names and don't include " +
                                   " anything else in the response.\n" +
                                   " Query: " + request.message + "\n" + "Available agents:\n" +
-                                  "\n".join(WiseAgentRegistry.get_agent_names_and_descriptions()) + "\n")
+                                  WiseAgentRegistry.get_agent_catalog() + "\n")
+        chat_completion = []
         if self.metadata.system_message or self.llm.system_message:
-            ctx.append_chat_completion(messages={"role": "system", "content": self.metadata.system_message or self.llm.system_message})
-        ctx.append_chat_completion(messages={"role": "user", "content": agent_selection_prompt})
+            chat_completion.append({"role": "system", "content": self.metadata.system_message or self.llm.system_message})
+        chat_completion.append({"role": "user", "content": agent_selection_prompt})
+        ctx = WiseAgentRegistry.create_sub_context(request.context_name, sub_ctx_name,
+                                                   collaboration_type=WiseAgentCollaborationType.PHASED,
+                                                   route_response_to=request.sender, llm_chat_completion=chat_completion)
+        logging.debug(f"Registred context: {ctx}")
 
         logging.debug(f"messages: {ctx.llm_chat_completion}")
         llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, tools=[])
-        ctx.append_chat_completion(messages=llm_response.choices[0].message)
 
         # Assign the agents to phases
         agent_assignment_prompt = ("Assign each of the agents that will be required to solve the query to one of the following phases:\n" +
@@ -243,18 +243,21 @@ class PhasedCoordinatorWiseAgent(WiseAgent):
                                    " Format the response as a space separated list of agents for each phase, where the first"
                                    " line contains the list of agents for the first phase and second line contains the list of"
                                    " agents for the second phase and so on. Don't include anything else in the response.\n")
-        ctx.append_chat_completion(messages={"role": "user", "content": agent_assignment_prompt})
+        with ctx.batch():
+            ctx.append_chat_completion(messages=llm_response.choices[0].message)
+            ctx.append_chat_completion(messages={"role": "user", "content": agent_assignment_prompt})
         llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, tools=[])
-        ctx.append_chat_completion(messages=llm_response.choices[0].message)     
         phases = [phase.split() for phase in llm_response.choices[0].message.content.splitlines()]
-        ctx.set_agent_phase_assignments(phases)
-        ctx.set_current_phase(0)
-        ctx.add_query(request.message)
+        with ctx.batch():
+            ctx.append_chat_completion(messages=llm_response.choices[0].message)
+            ctx.set_agent_phase_assignments(phases)
+            ctx.set_current_phase(0)
+            ctx.add_query(request.message)
 
         # Kick off the first phase
-        for agent in phases[0]:
-            self.send_request(WiseAgentMessage(message=request.message, sender=self.name,
-                                               context_name=ctx.name), agent)
+        self.send_requests([(WiseAgentMessage(message=request.message, sender=self.name, context_name=ctx.name,
+                                              priority=request.priority, deadline=request.deadline), agent)
+                            for agent in phases[0]])
 
     def process_response(self, response : WiseAgentMessage):
         """
@@ -271,11 +274,11 @@ class PhasedCoordinatorWiseAgent(WiseAgent):
             raise ValueError(f"Unexpected response message_type: {response.message_type} with message: {response.message}")
 
         # Remove the agent from the required agents for this phase
-        ctx.remove_required_agent_for_current_phase(response.sender)
+        remaining_agents = ctx.remove_required_agent_for_current_phase(response.sender)
 
-        # If there are no more agents remaining in this phase, move on to the next phase,
+        # If this was the last agent remaining in this phase, move on to the next phase,
         # return the final answer, or iterate
-        if len(ctx.get_required_agents_for_current_phase()) == 0:
+        if remaining_agents == 0:
             next_phase = ctx.get_agents_for_next_phase()
             if next_phase is None:
                 # Determine the final answer
@@ -298,10 +301,12 @@ class PhasedCoordinatorWiseAgent(WiseAgent):
                 # Determine if we should return the final answer or iterate
                 if score >= self.confidence_score_threshold:
                     self.send_response(WiseAgentMessage(message=final_answer, sender=self.name,
-                                                        context_name=response.context_name), ctx.get_route_response_to())
+                                                        context_name=response.context_name, priority=response.priority,
+                                                        deadline=response.deadline), ctx.get_route_response_to())
                 elif len(ctx.get_queries()) == self.max_iterations:
                     self.send_response(WiseAgentMessage(message=CANNOT_ANSWER, message_type=WiseAgentMessageType.CANNOT_ANSWER,
-                                                        sender=self.name, context_name=response.context_name),
+                                                        sender=self.name, context_name=response.context_name,
+                                                        priority=response.priority, deadline=response.deadline),
                                        ctx.get_route_response_to())
                 else:
                     # Rephrase the query and iterate
@@ -316,18 +321,21 @@ class PhasedCoordinatorWiseAgent(WiseAgent):
                         # Note that llm_chat_completion is being used here so we have the full history
                         llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, tools=[])
                         rephrased_query = llm_response.choices[0].message.content
-                        ctx.append_chat_completion(messages=llm_response.choices[0].message)
-                        ctx.set_current_phase(0)
-                        ctx.add_query(rephrased_query)
-                        for agent in ctx.get_required_agents_for_current_phase():
-                            self.send_request(WiseAgentMessage(message=rephrased_query, sender=self.name,
-                                                               context_name=response.context_name),
-                                              agent)
+                        with ctx.batch():
+                            ctx.append_chat_completion(messages=llm_response.choices[0].message)
+                            ctx.set_current_phase(0)
+                            ctx.add_query(rephrased_query)
+                        self.send_requests([(WiseAgentMessage(message=rephrased_query, sender=self.name,
+                                                              context_name=response.context_name,
+                                                              priority=response.priority, deadline=response.deadline), agent)
+                                            for agent in ctx.get_required_agents_for_current_phase()])
             else:
                 # Kick off the next phase
-                for agent in next_phase:
-                    self.send_request(WiseAgentMessage(message=ctx.get_current_query(), sender=self.name,
-                                                       context_name=response.context_name), agent)
+                current_query = ctx.get_current_query()
+                self.send_requests([(WiseAgentMessage(message=current_query, sender=self.name,
+                                                      context_name=response.context_name,
+                                                      priority=response.priority, deadline=response.deadline), agent)
+                                    for agent in next_phase])
         return True
 
     def process_event(self, event):
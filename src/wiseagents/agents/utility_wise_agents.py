@@ -228,12 +228,12 @@ class LLMWiseAgentWithTools(WiseAgent):
             ctx.append_chat_completion(messages= {"role": "system", "content": self.llm.system_message})
         ctx.append_chat_completion(messages= {"role": "user", "content": request.message})
         
-        for tool in self._tools:
-            ctx.append_available_tool_in_chat(tools=WiseAgentRegistry.get_tool(tool).get_tool_OpenAI_format())
+        # the schemas of the tools are cached by the registry, they are passed as is to the LLM
+        tools = WiseAgentRegistry.get_tools_OpenAI_format(self._tools)
             
-        logging.debug(f"messages: {ctx.llm_chat_completion}, Tools: {ctx.llm_available_tools_in_chat}")
+        logging.debug(f"messages: {ctx.llm_chat_completion}, Tools: {tools}")
         # TODO: https://github.com/wise-agents/wise-agents/issues/205
-        llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, ctx.llm_available_tools_in_chat)
+        llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, tools)
         
         ##calling tool
         response_message = llm_response.choices[0].message
@@ -258,7 +258,8 @@ class LLMWiseAgentWithTools(WiseAgent):
                     #call the agent with correlation ID and complete the chat on response
                     self.send_request(WiseAgentMessage(message=tool_call.function.arguments, sender=self.name, 
                                                        tool_id=tool_call.id, context_name=ctx.name,
-                                                       route_response_to=request.sender), 
+                                                       route_response_to=request.sender, priority=request.priority,
+                                                       deadline=request.deadline), 
                                       dest_agent_name=function_name)
                 else:
                     function_args = json.loads(tool_call.function.arguments)
@@ -277,8 +278,7 @@ class LLMWiseAgentWithTools(WiseAgent):
         
         #SEND THE RESPONSE IF NOT ASYNC, OTHERWISE WE WILL DO LATER IN PROCESS_RESPONSE
         if ctx.llm_required_tool_call == []: # if all tool calls have been completed (no asynch needed)
-            llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, 
-                                                            ctx.llm_available_tools_in_chat)
+            llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, tools)
             response_message = llm_response.choices[0].message
             logging.debug(f"sending response {response_message.content} to: {request.sender}")
             WiseAgentRegistry.remove_context(context_name=ctx.name, merge_chat_to_parent=False)
@@ -307,11 +307,12 @@ class LLMWiseAgentWithTools(WiseAgent):
             
         if ctx.llm_required_tool_call == []: # if all tool calls have been completed (no asynch needed)
             llm_response = self.llm.process_chat_completion(ctx.llm_chat_completion, 
-                                                            ctx.llm_available_tools_in_chat)
+                                                            WiseAgentRegistry.get_tools_OpenAI_format(self._tools))
             response_message = llm_response.choices[0].message
             logging.getLogger(self.name).info(f"sending response {response_message.content} to: {response.route_response_to}")
             parent_context = WiseAgentRegistry.remove_context(context_name=response.context_name, merge_chat_to_parent=True)
-            self.send_response(WiseAgentMessage(message=response_message.content, sender=self.name, context_name=parent_context.name), response.route_response_to )
+            self.send_response(WiseAgentMessage(message=response_message.content, sender=self.name, context_name=parent_context.name,
+                                                priority=response.priority, deadline=response.deadline), response.route_response_to )
             return True
 
     def stop(self):
@@ -1,12 +1,20 @@
 import copy
+import importlib
 import json
 import logging
 import os
 import pickle
+import random
+import threading
+import time
+import uuid
 
 from abc import abstractmethod
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager
 from enum import StrEnum, auto
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import yaml
 from openai.types.chat import ChatCompletionToolParam, ChatCompletionMessageParam
@@ -16,6 +24,7 @@ import redis
 from wiseagents import enforce_no_abstract_class_instances
 from wiseagents.graphdb import WiseAgentGraphDB
 from wiseagents.llm import OpenaiAPIWiseAgentLLM, WiseAgentLLM
+from wiseagents.registry_codec import REGISTRY_SCHEMA_VERSION, WiseAgentRegistryCodec, decode_registry_payload, get_registry_codec
 from wiseagents.yaml import WiseAgentsYAMLObject
 from wiseagents.vectordb import WiseAgentVectorDB
 from wiseagents.wise_agent_messaging import WiseAgentMessage, WiseAgentMessageType, WiseAgentTransport, WiseAgentEvent
@@ -88,6 +97,41 @@ class WiseAgentTool(WiseAgentsYAMLObject):
         """Get the agent tool of the tool."""
         return self._agent_tool
        
+    def to_dict(self) -> dict:
+        '''Return the tool as a dictionary made of plain types only, used by the registry codecs. The callback is
+        stored as a reference to a module level function.'''
+        call_back = None
+        if self.call_back is not None:
+            if "<" in self.call_back.__qualname__:
+                raise ValueError(f"The callback of the tool {self.name} can't be stored in the registry, "
+                                 "it must be a module level function")
+            call_back = f"{self.call_back.__module__}:{self.call_back.__qualname__}"
+        return {"name": self.name,
+                "description": self.description,
+                "agent_tool": self.is_agent_tool,
+                "parameters_json_schema": self.json_schema,
+                "call_back": call_back}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'WiseAgentTool':
+        '''Create a tool from a dictionary returned by to_dict, without registering it.
+
+        Args:
+            d (dict): the dictionary representation of the tool'''
+        call_back = None
+        if d.get("call_back") is not None:
+            module_name, qualname = d["call_back"].split(":")
+            call_back = importlib.import_module(module_name)
+            for name in qualname.split("."):
+                call_back = getattr(call_back, name)
+        tool = cls.__new__(cls)
+        tool._name = d.get("name")
+        tool._description = d.get("description")
+        tool._agent_tool = d.get("agent_tool")
+        tool._parameters_json_schema = d.get("parameters_json_schema")
+        tool._call_back = call_back
+        return tool
+
     def get_tool_OpenAI_format(self) -> ChatCompletionToolParam:
         '''The tool should be able to return itself in the form of a ChatCompletionToolParam
         
@@ -112,69 +156,308 @@ class WiseAgentTool(WiseAgentsYAMLObject):
         return self.call_back(**kwargs)
 
 
-class WiseAgentContext():
-    
-    ''' A WiseAgentContext is a class that represents a context in which agents can communicate with each other.
-    '''
-    
-    _message_trace : List[str] = []
-    
-    # A list of chat completion messages
-    _llm_chat_completion : List[ChatCompletionMessageParam] = []
-    
-    # A list of tool names that need to be executed
-    _llm_required_tool_call : List[str] = []
-    
-    # A list of available tools in chat
-    _llm_available_tools_in_chat : List[ChatCompletionToolParam] = []
+# The redis connection pools of this process, by connection settings
+_redis_pools : Dict[Tuple, redis.ConnectionPool] = {}
+_redis_pools_lock = threading.Lock()
+
+def _redis_client(config: Dict[str, Any]) -> redis.Redis:
+    '''Return a redis client for the given registry configuration. The clients of all the contexts and of the
+    registry share a single connection pool per process and connection settings.
+
+    Args:
+        config (Dict[str, Any]): the registry configuration'''
+    settings = {"host": config["redis_host"], "port": config["redis_port"],
+                "max_connections": config.get("redis_max_connections", 50),
+                "timeout": config.get("redis_pool_timeout", 20),
+                "socket_timeout": config.get("redis_socket_timeout"),
+                "socket_connect_timeout": config.get("redis_socket_connect_timeout"),
+                "health_check_interval": config.get("redis_health_check_interval", 0)}
+    if (config.get("redis_ssl") is True):
+        settings.update({"connection_class": redis.SSLConnection,
+                         "username": config["redis_username"], # use your Redis user. More info https://redis.io/docs/latest/operate/oss_and_stack/management/security/acl/
+                         "password": config["redis_password"], # use your Redis password
+                         "ssl_certfile": config["redis_ssl_certfile"],
+                         "ssl_keyfile": config["redis_ssl_keyfile"],
+                         "ssl_ca_certs": config["redis_ssl_ca_certs"]})
+    # the pid is part of the key so a forked process doesn't use the connections of its parent
+    key = (os.getpid(),) + tuple(sorted((name, str(value)) for name, value in settings.items()))
+    with _redis_pools_lock:
+        pool = _redis_pools.get(key)
+        if pool is None:
+            pool = redis.BlockingConnectionPool(**settings)
+            _redis_pools[key] = pool
+    return redis.Redis(connection_pool=pool)
+
+def _redis_namespace(config: Mapping[str, Any]) -> str:
+    '''Return the prefix of the redis keys of the registry and the contexts, set with the redis_db entry of the
+    registry configuration so several deployments can share a redis server.
+
+    Args:
+        config (Mapping[str, Any]): the registry configuration'''
+    redis_db = config.get("redis_db")
+    return f"{redis_db}:" if redis_db else ""
+
+def _encode_registry_object(codec: WiseAgentRegistryCodec, value: Any) -> bytes:
+    '''Encode an object stored in the registry (e.g. an agent metadata or a tool). Unless the codec preserves
+    objects, the object is stored as a dictionary giving the name and version of its schema and its data.
+
+    Args:
+        codec (WiseAgentRegistryCodec): the codec to use
+        value (Any): the object to encode'''
+    if codec.preserves_objects:
+        return codec.encode(value)
+    return codec.encode({"schema": value.__class__.__name__, "version": REGISTRY_SCHEMA_VERSION,
+                         "data": value.to_dict()})
+
+def _decode_registry_object(payload: bytes) -> Any:
+    '''Decode an object stored in the registry, whatever the codec it was encoded with.
+
+    Args:
+        payload (bytes): the payload to decode'''
+    value = decode_registry_payload(payload)
+    if not isinstance(value, dict):
+        return value
+    schemas = {"WiseAgentMetaData": WiseAgentMetaData, "WiseAgentTool": WiseAgentTool}
+    if value.get("schema") not in schemas:
+        raise ValueError(f"Unknown registry schema {value.get('schema')}")
+    if value.get("version", 0) > REGISTRY_SCHEMA_VERSION:
+        raise ValueError(f"Version {value.get('version')} of the {value.get('schema')} schema isn't supported, "
+                         f"it was stored by a newer version of Wise Agents")
+    return schemas[value["schema"]].from_dict(value["data"])
+
+# The Lua scripts registered by this process, by source
+_redis_scripts : Dict[str, Any] = {}
+
+def _run_redis_script(redis_db: redis.Redis, script: str, keys: List[str], args: List[Any]) -> Any:
+    '''Run a Lua script on the redis server, the scripts are loaded once per process.
+
+    Args:
+        redis_db (redis.Redis): the redis client
+        script (str): the source of the script
+        keys (List[str]): the keys accessed by the script
+        args (List[Any]): the arguments of the script'''
+    redis_script = _redis_scripts.get(script)
+    if redis_script is None:
+        redis_script = redis_db.register_script(script)
+        _redis_scripts[script] = redis_script
+    return redis_script(keys=keys, args=args, client=redis_db)
+
+
+class _RedisListCache():
+    '''A per process cache of redis lists which are only ever appended to (e.g. the chat completion of the contexts).
+    It remembers the elements already read from each list and only fetches the new ones. The epoch of the context
+    is checked on each read, so a list is fetched again in full if the context was removed and created again.'''
+
+    def __init__(self, max_size: int):
+        '''Initialize the cache.
+
+        Args:
+            max_size (int): the maximum number of lists kept in the cache, the least recently read are evicted first'''
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries : OrderedDict[str, Tuple[bytes, List]] = OrderedDict()
+
+    def get(self, redis_db: redis.Redis, key: str, state_key: str) -> List:
+        '''Get the elements of a list, fetching only the ones added since the last read.
+
+        Args:
+            redis_db (redis.Redis): the redis client
+            key (str): the key of the list
+            state_key (str): the key of the state hash of the context owning the list'''
+        with self._lock:
+            epoch, items = self._entries.get(key, (None, []))
+        pipe = redis_db.pipeline(transaction=True)
+        pipe.hget(state_key, "epoch")
+        pipe.llen(key)
+        pipe.lrange(key, len(items), -1)
+        current_epoch, length, tail = pipe.execute()
+        if current_epoch is None or current_epoch != epoch or length != len(items) + len(tail):
+            items = []
+            tail = redis_db.lrange(key, 0, -1)
+        items = items + [decode_registry_payload(value) for value in tail]
+        if current_epoch is not None:
+            with self._lock:
+                self._entries[key] = (current_epoch, items)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+        return list(items)
+
+    def invalidate(self, key: str):
+        '''Remove a list from the cache.
 
-    # A list of agent names that need to be executed in sequence
-    # Used by a sequential coordinator
-    _agents_sequence : List[str] = []
+        Args:
+            key (str): the key of the list'''
+        with self._lock:
+            self._entries.pop(key, None)
 
-    # The agent where the final response should be routed to
-    # Used by both a sequential coordinator and a phased coordinator
-    _route_response_to : str = None
 
-    # A list that contains a list of agent names to be executed for each phase
-    # Used by a phased coordinator
-    _agent_phase_assignments : List[List[str]] = []
+_chat_completion_cache = _RedisListCache(max_size=256)
 
-    # Maps a chat uuid to the current phase. Used by a phased coordinator.
-    _current_phase :  int = None
+class _InMemoryContextState():
+    '''The fields of a context stored in memory, each context having its own containers. The message trace and
+    the chat completion are bounded, the oldest elements being dropped first.'''
+    __slots__ = ("message_trace", "llm_chat_completion", "llm_required_tool_call", "llm_available_tools_in_chat",
+                 "agents_sequence", "route_response_to", "agent_phase_assignments", "current_phase",
+                 "required_agents_for_current_phase", "queries", "collaboration_type", "restart_sequence",
+                 "history_summary", "history_summarized_count", "llm_chat_completion_dropped",
+                 "dropped_chat_completion")
 
-    # A list of agent names that need to be executed for the current phase
-    # Used by a phased coordinator
-    _required_agents_for_current_phase : List[str] = []
+    def __init__(self, max_message_trace: Optional[int] = None, max_chat_completion: Optional[int] = None):
+        '''Initialize the fields of the context.
 
-    # A list containing the queries attempted for each iteration executed by
-    # the phased coordinator or sequential memory coordinator
-    _queries : List[str] = []
+        Args:
+            max_message_trace (Optional[int]): the maximum number of messages traced, unbounded if None
+            max_chat_completion (Optional[int]): the maximum number of chat completion messages, unbounded if None'''
+        self.message_trace : deque = deque(maxlen=max_message_trace)
+        # A list of chat completion messages
+        self.llm_chat_completion : deque = deque(maxlen=max_chat_completion)
+        # A list of tool names that need to be executed
+        self.llm_required_tool_call : List[str] = []
+        # A list of available tools in chat
+        self.llm_available_tools_in_chat : List[ChatCompletionToolParam] = []
+        # A list of agent names that need to be executed in sequence
+        # Used by a sequential coordinator
+        self.agents_sequence : List[str] = []
+        # The agent where the final response should be routed to
+        # Used by both a sequential coordinator and a phased coordinator
+        self.route_response_to : Optional[str] = None
+        # A list that contains a list of agent names to be executed for each phase
+        # Used by a phased coordinator
+        self.agent_phase_assignments : List[List[str]] = []
+        # The current phase. Used by a phased coordinator.
+        self.current_phase : Optional[int] = None
+        # A list of agent names that need to be executed for the current phase
+        # Used by a phased coordinator
+        self.required_agents_for_current_phase : List[str] = []
+        # A list containing the queries attempted for each iteration executed by
+        # the phased coordinator or sequential memory coordinator
+        self.queries : List[str] = []
+        # The collaboration type
+        self.collaboration_type : Optional[WiseAgentCollaborationType] = None
+        # A boolean value indicating whether to restart a sequence of agents
+        self.restart_sequence : bool = False
+        # The summary of the first history_summarized_count messages appended to the chat completion, including
+        # the ones dropped since
+        self.history_summary : Optional[str] = None
+        self.history_summarized_count : int = 0
+        # The number of messages dropped from the beginning of the chat completion
+        self.llm_chat_completion_dropped : int = 0
+        # The messages dropped from the chat completion before being summarized
+        self.dropped_chat_completion : deque = deque(maxlen=max_chat_completion)
 
-    # The collaboration type
-    _collaboration_type: WiseAgentCollaborationType = None
 
-    # A boolean value indicating whether to restart a sequence of agents
-    _restart_sequence: bool = False
+class WiseAgentContext():
+    
+    ''' A WiseAgentContext is a class that represents a context in which agents can communicate with each other.
+    '''
+    
+    # The fields of the context when it is stored in memory
+    _state : '_InMemoryContextState' = None
+    # The pipeline of the current batch of updates, see batch()
+    _batch : redis.client.Pipeline = None
 
     _redis_db : redis.Redis = None
+    _redis_namespace : str = ""
+    _codec : WiseAgentRegistryCodec = None
     _use_redis : bool = False
     _config : Dict[str, Any] = {}
     _trace_enabled : bool = False
 
+    # The fields stored as redis lists, one item per element, and the fields stored in the state hash of the context
+    _REDIS_LIST_FIELDS = ("message_trace", "llm_chat_completion", "llm_required_tool_call", "llm_available_tools_in_chat",
+                          "agents_sequence", "agent_phase_assignments", "required_agents_for_current_phase", "queries")
+    _REDIS_STATE_FIELDS = ("route_response_to", "current_phase", "collaboration_type", "restart_sequence")
+    # The elements of the lists are encoded with the registry codec, except for the lists of agent names used by the phase scripts below,
+    # which must be readable from Lua, and the message trace, which is meant to be read by other tools
+    _REDIS_LIST_ENCODINGS = {"agent_phase_assignments": "json", "required_agents_for_current_phase": "str",
+                             "message_trace": "json"}
+
+    # Remove an agent from the required agents of the current phase, returning the number of agents still required,
+    # or nil if the agent wasn't required (e.g. its response was delivered twice)
+    _REMOVE_REQUIRED_AGENT_SCRIPT = """
+        if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 0 then
+            return false
+        end
+        return redis.call('LLEN', KEYS[1])
+    """
+    # Set the current phase, to the given phase or to the next one, and its required agents, returning the agents
+    # of the phase or nil if there is no such phase
+    _SET_CURRENT_PHASE_SCRIPT = """
+        local phase
+        if ARGV[1] == 'next' then
+            local current = redis.call('HGET', KEYS[2], 'current_phase')
+            if not current then
+                return false
+            end
+            phase = tonumber(current) + 1
+        else
+            phase = tonumber(ARGV[1])
+        end
+        local agents = redis.call('LINDEX', KEYS[1], phase)
+        if not agents then
+            return false
+        end
+        redis.call('HSET', KEYS[2], 'current_phase', phase)
+        redis.call('DEL', KEYS[3])
+        local names = cjson.decode(agents)
+        if #names > 0 then
+            redis.call('RPUSH', KEYS[3], unpack(names))
+        end
+        return agents
+    """
+
 
-    def __init__(self, name: str, config : Optional[Dict[str,Any]] = {"use_redis": False}):
+    def __init__(self, name: str, config : Optional[Dict[str,Any]] = None):
         ''' Initialize the context with the given name.
 
         Args:
-            name (str): the name of the context'''
+            name (str): the name of the context
+            config (Optional[Dict[str,Any]]): the registry configuration, the one of the WiseAgentRegistry if not set'''
+        if config is None:
+            config = WiseAgentRegistry.get_config()
+        self._setup(name, config)
+        # the registration and the initial state of the context are sent in a single transaction
+        with self.batch():
+            WiseAgentRegistry.register_context(self)
+            self._init_redis_state()
+
+    def _setup(self, name: str, config: Dict[str, Any]):
+        '''Set the fields of a new context, without registering it nor accessing redis.'''
         self._name = name
         self._config = config
-        WiseAgentRegistry.register_context(self)
-        if config.get("use_redis") == True and self._redis_db is None:
-            self._redis_db = redis.Redis(host=self._config["redis_host"], port=self._config["redis_port"])
+        self._connect()
+        if self._use_redis != True:
+            self._state = _InMemoryContextState(max_message_trace=config.get("context_max_message_trace", 1000),
+                                                max_chat_completion=config.get("context_max_chat_completion"))
+
+    def _init_redis_state(self):
+        '''Set the initial state of a new context in redis, as part of the current batch if any.'''
+        if self._use_redis == True:
+            self._redis_writer().hsetnx(self._redis_key("state"), "epoch", uuid.uuid4().hex)
+
+    @classmethod
+    def handle(cls, name: str, config: Dict[str, Any]) -> 'WiseAgentContext':
+        '''Return a handle on a context already registered in redis. Creating the handle doesn't access redis, the
+        fields of the context are read from redis when they are accessed.
+
+        Args:
+            name (str): the name of the context
+            config (Dict[str,Any]): the registry configuration'''
+        context = cls.__new__(cls)
+        context._name = name
+        context._config = config
+        context._connect()
+        return context
+
+    def _connect(self):
+        '''Get a redis client from the shared connection pool when the context is stored in redis.'''
+        if self._config.get("use_redis") == True and self._redis_db is None:
+            self._redis_db = _redis_client(self._config)
+            self._redis_namespace = _redis_namespace(self._config)
+            self._codec = get_registry_codec(self._config.get("registry_codec", "pickle"))
             self._use_redis = True
-        if (config.get("trace_enabled") == True):
+        if (self._config.get("trace_enabled") == True):
             self._trace_enabled = True
         
     
@@ -183,9 +466,9 @@ class WiseAgentContext():
         return (f"{self.__class__.__name__}(name={self.name}, message_trace={self.message_trace},"
                 f"llm_chat_completion={self.llm_chat_completion}, collaboration_type={self.collaboration_type},"
                 f"llm_required_tool_call={self.llm_required_tool_call}, llm_available_tools_in_chat={self.llm_available_tools_in_chat},"
-                f"agents_sequence={self._agents_sequence}, route_response_to={self._route_response_to},"
-                f"agent_phase_assignments={self._agent_phase_assignments}, current_phase={self._current_phase},"
-                f"required_agents_for_current_phase={self._required_agents_for_current_phase}, queries={self._queries})")
+                f"agents_sequence={self.get_agents_sequence()}, route_response_to={self.get_route_response_to()},"
+                f"agent_phase_assignments={self.get_agent_phase_assignments()}, current_phase={self.get_current_phase()},"
+                f"required_agents_for_current_phase={self.get_required_agents_for_current_phase()}, queries={self.get_queries()})")
     def __eq__(self, value: object) -> bool:
         return isinstance(value, WiseAgentContext) and self.__repr__() == value.__repr__()
     
@@ -200,61 +483,163 @@ class WiseAgentContext():
     def __setstate__(self, state: object):
         '''Set the state of the context.'''
         self.__dict__.update(state)
-        if self._config.get("use_redis") == True and self._redis_db is None:
-            self._redis_db = redis.Redis(host=self._config["redis_host"], port=self._config["redis_port"])
-            self._use_redis = True
+        self._connect()
+
+    @staticmethod
+    def redis_key(context_name: str, field: str, namespace: Optional[str] = None) -> str:
+        '''Return the name of the redis key storing the given field of the context. The context name is used as a
+        hash tag so all the keys of a context are stored in the same slot of a redis cluster.
+
+        Args:
+            context_name (str): the name of the context
+            field (str): the name of the field
+            namespace (Optional[str]): the prefix of the key, the one of the registry configuration if None'''
+        if namespace is None:
+            namespace = WiseAgentRegistry.get_config().redis_namespace
+        return f"{namespace}context:{{{context_name}}}:{field}"
+
+    @classmethod
+    def redis_keys(cls, context_name: str, namespace: Optional[str] = None) -> List[str]:
+        '''Return the names of all the redis keys storing the fields of the context.
+
+        Args:
+            context_name (str): the name of the context
+            namespace (Optional[str]): the prefix of the keys, the one of the registry configuration if None'''
+        if namespace is None:
+            namespace = WiseAgentRegistry.get_config().redis_namespace
+        return [cls.redis_key(context_name, field, namespace) for field in cls._REDIS_LIST_FIELDS + ("state",)]
+
+    def _redis_key(self, field: str) -> str:
+        return WiseAgentContext.redis_key(self.name, field, self._redis_namespace)
+
+    def _encode_list_item(self, key: str, value: Any) -> Any:
+        '''Encode an element of a list stored in redis.'''
+        encoding = self._REDIS_LIST_ENCODINGS.get(key)
+        if encoding == "json":
+            return json.dumps(value)
+        elif encoding == "str":
+            return value
+        return self._codec.encode(value)
+
+    def _decode_list_item(self, key: str, value: bytes) -> Any:
+        '''Decode an element of a list stored in redis.'''
+        encoding = self._REDIS_LIST_ENCODINGS.get(key)
+        if encoding == "json":
+            return json.loads(value)
+        elif encoding == "str":
+            return value.decode("utf-8")
+        return decode_registry_payload(value)
+
+    def _redis_writer(self) -> redis.Redis:
+        '''Return the pipeline of the current batch, or the redis client when there is no batch.'''
+        return self._batch if self._batch is not None else self._redis_db
+
+    def _redis_pipeline(self) -> redis.client.Pipeline:
+        '''Return the pipeline of the current batch, or a new transactional pipeline when there is no batch.'''
+        return self._batch if self._batch is not None else self._redis_db.pipeline(transaction=True)
+
+    def _execute(self, pipe: redis.client.Pipeline, *fields: str) -> Optional[List[Any]]:
+        '''Execute a pipeline returned by _redis_pipeline, unless it is the one of the current batch. The expiration
+        of the keys of the given fields, written by the pipeline, is refreshed in the same round trip.
+
+        Returns:
+            Optional[List[Any]]: the results of the pipeline, or None if it is the one of the current batch'''
+        WiseAgentRegistry._get_backend().refresh_context_keys(pipe, self.name,
+                                                               [self._redis_key(field) for field in fields])
+        if pipe is not self._batch:
+            return pipe.execute()
+        return None
+
+    @contextmanager
+    def batch(self):
+        '''Batch the updates of the context made in a with block: with redis, they are sent in a single transaction
+        at the end of the block, or not at all if an exception is raised. The fields read in the block don't include
+        the updates of the block. Setting a phase which isn't assigned doesn't raise an error in a batch.
+
+        Batches can be nested, the updates being sent at the end of the outermost one.'''
+        if self._use_redis != True or self._batch is not None:
+            yield self
+            return
+        self._batch = self._redis_db.pipeline(transaction=True)
+        try:
+            yield self
+            self._batch.execute()
+        finally:
+            self._batch = None
 
     def _append_to_redis_list(self, key: str, value: Any):
         '''Append a value to a list in redis.'''
-        pipe = self._redis_db.pipeline(transaction=True)
-        while True:
-            pipe.watch(self.name)
-            try:
-                if(pipe.hexists(self.name, key) == False):
-                    pipe.multi()
-                    pipe.hset(self.name, key, value=pickle.dumps([value]))
-                    pipe.execute()
-                    return
-                else:
-                    redis_stored_messages = pipe.hget(self.name, key)
-                    stored_messages : List  = pickle.loads(redis_stored_messages)
-                    stored_messages.append(value)
-                    pipe.multi()
-                    pipe.hset(self.name, key, value=pickle.dumps(stored_messages))
-                    pipe.execute()
-                    return
-            except redis.WatchError:
-                logging.debug("WatchError in append_to_redis_list for {key}")
-                continue
+        pipe = self._redis_pipeline()
+        pipe.rpush(self._redis_key(key), self._encode_list_item(key, value))
+        self._execute(pipe, key)
+
     def _remove_from_redis_list(self, key: str, value: Any):
-        '''Remove a value to a list in redis.'''
+        '''Remove the first occurrence of a value from a list in redis. The elements are compared once decoded,
+        since they may have been encoded by processes using another registry codec (e.g. during a rolling upgrade).'''
+        for item in self._redis_db.lrange(self._redis_key(key), 0, -1):
+            if self._decode_list_item(key, item) == value:
+                pipe = self._redis_pipeline()
+                pipe.lrem(self._redis_key(key), 1, item)
+                self._execute(pipe, key)
+                return
+
+    def _get_list_from_redis(self, key: str) -> List:
+        '''Get a list from redis.'''
+        return [self._decode_list_item(key, value) for value in self._redis_db.lrange(self._redis_key(key), 0, -1)]
+
+    def _set_redis_list(self, pipe: redis.client.Pipeline, key: str, values: List):
+        '''Replace the content of a list in redis, as part of the given pipeline.'''
+        pipe.delete(self._redis_key(key))
+        if values:
+            pipe.rpush(self._redis_key(key), *[self._encode_list_item(key, value) for value in values])
+
+    def _get_redis_state(self, field: str) -> Optional[str]:
+        '''Get a scalar field of the context from redis.'''
+        value = self._redis_db.hget(self._redis_key("state"), field)
+        if value is not None:
+            return value.decode("utf-8")
+        return None
+
+    def _set_redis_state(self, field: str, value: Any):
+        '''Set a scalar field of the context in redis.'''
+        pipe = self._redis_pipeline()
+        pipe.hset(self._redis_key("state"), field, value)
+        self._execute(pipe, "state")
+
+    def _migrate_legacy_redis_hash(self) -> bool:
+        '''Move the fields of the context stored by older versions of Wise Agents, as pickled values of a hash
+        named after the context, to their own keys. See WiseAgentRegistry.migrate_legacy_contexts.
+
+        Returns:
+            bool: True if the context was stored with the legacy layout'''
         pipe = self._redis_db.pipeline(transaction=True)
         while True:
-            pipe.watch(self.name)
             try:
-                if(pipe.hexists(self.name, key) == False):
+                pipe.watch(self.name)
+                legacy = pipe.hgetall(self.name) if pipe.type(self.name) == b"hash" else {}
+                fields = {field.decode("utf-8"): value for field, value in legacy.items()}
+                if not fields or not set(fields).issubset(self._REDIS_LIST_FIELDS + self._REDIS_STATE_FIELDS):
                     pipe.unwatch()
-                    return
-                else:
-                    redis_stored_messages = pipe.hget(self.name, key)
-                    stored_messages : List  = pickle.loads(redis_stored_messages)
-                    stored_messages.remove(value)
-                    pipe.multi()
-                    pipe.hset(self.name, key, value=pickle.dumps(stored_messages))
-                    pipe.execute()
-                    return
+                    return False
+                pipe.multi()
+                for field, value in fields.items():
+                    if field in self._REDIS_LIST_FIELDS:
+                        self._set_redis_list(pipe, field, pickle.loads(value))
+                    elif field in ("route_response_to", "collaboration_type"):
+                        pipe.hset(self._redis_key("state"), field, value)
+                    elif field == "current_phase" and pickle.loads(value) is not None:
+                        pipe.hset(self._redis_key("state"), field, pickle.loads(value))
+                    elif field == "restart_sequence":
+                        pipe.hset(self._redis_key("state"), field, int(pickle.loads(value)))
+                pipe.delete(self.name)
+                pipe.hsetnx(self._redis_key("state"), "epoch", uuid.uuid4().hex)
+                pipe.execute()
+                logging.info(f"Migrated context {self.name} to the per field redis layout")
+                return True
             except redis.WatchError:
-                logging.debug("WatchError in remove_from_redis_list for {key}")
+                logging.debug(f"WatchError in migrate_legacy_redis_hash for {self.name}")
                 continue
 
-    def _get_list_from_redis(self, key: str) -> List:
-        '''Get a list from redis.'''
-        redis_return =  self._redis_db.hget(self.name, key)
-        if (redis_return is not None):
-            return pickle.loads(redis_return)
-        else:
-            return []
-
     @property   
     def name(self) -> str:
         """Get the name of the context."""
@@ -271,24 +656,55 @@ class WiseAgentContext():
         if (self._use_redis == True):
             return self._get_list_from_redis("message_trace")
         else:
-            return self._message_trace
+            return list(self._state.message_trace)
 
     def trace(self, message : WiseAgentMessage):
-        '''Trace the message.'''
+        '''Trace the message. Only the last context_max_message_trace messages are kept and, when trace_sample_rate
+        is set, only this fraction of the messages is traced. With trace_format set to record, a compact record of
+        the message is traced instead of its representation.
+
+        Args:
+            message (WiseAgentMessage): the message to trace'''
         if (self.trace_enabled):
+            sample_rate = self._config.get("trace_sample_rate", 1.0)
+            if sample_rate < 1.0 and random.random() >= sample_rate:
+                return
+            if self._config.get("trace_format") == "record":
+                entry = self._trace_record(message)
+            elif (self._use_redis == True):
+                entry = message.__repr__()
+            else:
+                entry = message
             if (self._use_redis == True):
-                self._append_to_redis_list("message_trace", message.__repr__())
+                key = self._redis_key("message_trace")
+                max_message_trace = self._config.get("context_max_message_trace", 1000)
+                pipe = self._redis_pipeline()
+                pipe.rpush(key, self._encode_list_item("message_trace", entry))
+                if max_message_trace is not None:
+                    pipe.ltrim(key, -max_message_trace, -1)
+                self._execute(pipe, "message_trace")
             else:
-                self._message_trace.append(message)   
+                self._state.message_trace.append(entry)
+
+    @staticmethod
+    def _trace_record(message : WiseAgentMessage) -> Dict[str, Any]:
+        '''Return the compact record of a message traced with trace_format set to record.'''
+        return {"time": time.time(),
+                "sender": message.sender,
+                "message_type": message.message_type.value if message.message_type is not None else None,
+                "tool_id": message.tool_id,
+                "route_response_to": message.route_response_to,
+                "length": len(message.message) if isinstance(message.message, str) else None}
                 
     
     @property
     def llm_chat_completion(self) -> List[ChatCompletionMessageParam]:
-        """Get the LLM chat completion of the context."""
+        """Get the LLM chat completion of the context. With redis, only the messages added since the last read in
+        this process are fetched, the messages must not be modified."""
         if (self._use_redis == True):
-            return self._get_list_from_redis("llm_chat_completion")
+            return _chat_completion_cache.get(self._redis_db, self._redis_key("llm_chat_completion"), self._redis_key("state"))
         else:
-            return self._llm_chat_completion   
+            return list(self._state.llm_chat_completion)
             
     
     def append_chat_completion(self, messages: Iterable[ChatCompletionMessageParam]):
@@ -300,7 +716,14 @@ class WiseAgentContext():
         if (self._use_redis == True):
             self._append_to_redis_list("llm_chat_completion", messages)
         else:
-            self._llm_chat_completion.append(messages)
+            state = self._state
+            chat_completion = state.llm_chat_completion
+            if chat_completion and len(chat_completion) == chat_completion.maxlen:
+                # the oldest message is dropped, it is kept until a WiseAgentHistoryPolicy summarizes it
+                if state.history_summarized_count <= state.llm_chat_completion_dropped:
+                    state.dropped_chat_completion.append(chat_completion[0])
+                state.llm_chat_completion_dropped += 1
+            chat_completion.append(messages)
 
 
     @property
@@ -310,7 +733,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             return self._get_list_from_redis("llm_required_tool_call")
         else:
-            return self._llm_required_tool_call
+            return list(self._state.llm_required_tool_call)
     
     def append_required_tool_call(self, tool_name: str):
         '''Append required tool call to the context.
@@ -320,7 +743,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             self._append_to_redis_list("llm_required_tool_call", tool_name)
         else:
-            self._llm_required_tool_call.append(tool_name)
+            self._state.llm_required_tool_call.append(tool_name)
     
     def remove_required_tool_call(self, tool_name: str):
         '''Remove required tool call from the context.
@@ -330,7 +753,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             self._remove_from_redis_list("llm_required_tool_call", tool_name) #remove first occurence of tool_name
         else:
-            self._llm_required_tool_call.remove(tool_name) #remove first occurence of tool_name
+            self._state.llm_required_tool_call.remove(tool_name) #remove first occurence of tool_name
         
     @property
     def llm_available_tools_in_chat(self) -> List[ChatCompletionToolParam]:
@@ -338,7 +761,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             return self._get_list_from_redis("llm_available_tools_in_chat")
         else:
-            return self._llm_available_tools_in_chat
+            return list(self._state.llm_available_tools_in_chat)
     
     def append_available_tool_in_chat(self, tools: Iterable[ChatCompletionToolParam]):
         '''Append available tool in chat to the context.
@@ -348,7 +771,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             self._append_to_redis_list("llm_available_tools_in_chat", tools)
         else:
-            self._llm_available_tools_in_chat.append(tools)
+            self._state.llm_available_tools_in_chat.append(tools)
     
     def get_agents_sequence(self) -> List[str]:
         """
@@ -363,7 +786,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             return self._get_list_from_redis("agents_sequence")
         else:
-            return self._agents_sequence
+            return list(self._state.agents_sequence)
 
     def set_agents_sequence(self, agents_sequence: List[str]):
         """
@@ -375,9 +798,11 @@ class WiseAgentContext():
             agents_sequence (List[str]): the sequence of agent names
         """
         if (self._use_redis == True):
-            self._redis_db.hset(self.name, "agents_sequence", pickle.dumps(agents_sequence))
+            pipe = self._redis_pipeline()
+            self._set_redis_list(pipe, "agents_sequence", agents_sequence)
+            self._execute(pipe, "agents_sequence")
         else:
-            self._agents_sequence = agents_sequence
+            self._state.agents_sequence = list(agents_sequence)
 
     def get_route_response_to(self) -> Optional[str]:
         """
@@ -388,9 +813,9 @@ class WiseAgentContext():
             Optional[str]: the name of the agent where the final response should be routed to or None if no agent is set
         """
         if (self._use_redis == True):
-            return self._redis_db.hget(self.name, "route_response_to").decode("utf-8")
+            return self._get_redis_state("route_response_to")
         else: 
-            return self._route_response_to
+            return self._state.route_response_to
             
     def set_route_response_to(self, agent: str):
         """
@@ -401,9 +826,9 @@ class WiseAgentContext():
             agent (str): the name of the agent where the final response should be routed to
         """
         if (self._use_redis == True):
-            self._redis_db.hset(self.name, "route_response_to", agent)
+            self._set_redis_state("route_response_to", agent)
         else:
-            self._route_response_to = agent
+            self._state.route_response_to = agent
 
     def get_next_agent_in_sequence(self, current_agent: str):
         """
@@ -441,7 +866,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             return self._get_list_from_redis("agent_phase_assignments")
         else:
-            return self._agent_phase_assignments
+            return list(self._state.agent_phase_assignments)
 
 
     def set_agent_phase_assignments(self, agent_phase_assignments: List[List[str]]):
@@ -455,9 +880,11 @@ class WiseAgentContext():
             in the list is a list of agent names for that phase.
         """
         if (self._use_redis == True):
-            self._redis_db.hset(self.name, "agent_phase_assignments", value=pickle.dumps(agent_phase_assignments))
+            pipe = self._redis_pipeline()
+            self._set_redis_list(pipe, "agent_phase_assignments", agent_phase_assignments)
+            self._execute(pipe, "agent_phase_assignments")
         else:
-            self._agent_phase_assignments = agent_phase_assignments
+            self._state.agent_phase_assignments = copy.deepcopy(agent_phase_assignments)
 
     def get_current_phase(self) -> int:
         """
@@ -470,13 +897,13 @@ class WiseAgentContext():
             int: the current phase, represented as an integer in the zero-indexed list of phases
         """
         if (self._use_redis == True):
-            redis_return = self._redis_db.hget(self.name, "current_phase")
-            if redis_return is not None:
-                return pickle.loads(redis_return)
+            current_phase = self._get_redis_state("current_phase")
+            if current_phase is not None:
+                return int(current_phase)
             else:
                 return None
         else:
-            return self._current_phase
+            return self._state.current_phase
 
     def set_current_phase(self, phase: int):
         """
@@ -487,13 +914,11 @@ class WiseAgentContext():
             phase (int): the current phase, represented as an integer in the zero-indexed list of phases
         """
         if (self._use_redis == True):
-            pipeline=self._redis_db.pipeline(transaction=True)
-            pipeline.hset(self.name, "current_phase", pickle.dumps(phase))
-            pipeline.hset(self.name, "required_agents_for_current_phase", value=pickle.dumps(self.get_agent_phase_assignments()[phase]))
-            pipeline.execute()
+            if self._set_redis_current_phase(str(phase)) is None and self._batch is None:
+                raise IndexError(f"Phase {phase} is not assigned in context {self.name}")
         else:
-            self._current_phase = phase
-            self._required_agents_for_current_phase = copy.deepcopy(self._agent_phase_assignments[phase])
+            self._state.current_phase = phase
+            self._state.required_agents_for_current_phase = copy.deepcopy(self._state.agent_phase_assignments[phase])
 
     def get_agents_for_next_phase(self) -> Optional[List]:
         """
@@ -505,6 +930,8 @@ class WiseAgentContext():
         Returns:
             Optional[List[str]]: the list of agent names for the next phase or None if there are no more phases
         """
+        if (self._use_redis == True):
+            return self._set_redis_current_phase("next")
         current_phase = self.get_current_phase()
         next_phase = current_phase + 1
         if next_phase < len(self.get_agent_phase_assignments()):
@@ -512,6 +939,22 @@ class WiseAgentContext():
             return self.get_agent_phase_assignments()[next_phase]
         return None
 
+    def _set_redis_current_phase(self, phase: str) -> Optional[List[str]]:
+        '''Set the current phase and its required agents in a single round trip, returning the agents of the phase
+        or None if there is no such phase.
+
+        Args:
+            phase (str): the phase, or "next" for the phase following the current one'''
+        pipe = self._redis_pipeline()
+        _run_redis_script(pipe, self._SET_CURRENT_PHASE_SCRIPT,
+                          keys=[self._redis_key("agent_phase_assignments"), self._redis_key("state"),
+                                self._redis_key("required_agents_for_current_phase")],
+                          args=[phase])
+        results = self._execute(pipe, "state", "required_agents_for_current_phase")
+        if results is None or results[0] is None:
+            return None
+        return json.loads(results[0])
+
     def get_required_agents_for_current_phase(self) -> List[str]:
         """
         Get the list of agents that still need to be executed for the current phase for this
@@ -526,21 +969,34 @@ class WiseAgentContext():
         if (self._use_redis == True):
             return self._get_list_from_redis("required_agents_for_current_phase")
         else:
-            return self._required_agents_for_current_phase
+            return list(self._state.required_agents_for_current_phase)
 
-    def remove_required_agent_for_current_phase(self, agent_name: str):
+    def remove_required_agent_for_current_phase(self, agent_name: str) -> Optional[int]:
         """
         Remove the given agent from the list of required agents for the current phase for this
-        context. This is used by a phased coordinator.
+        context. This is used by a phased coordinator. The agent is removed and the remaining agents
+        are counted atomically, so when the responses of the agents of a phase are processed concurrently,
+        only the last one sees that no agents remain.
 
         Args:
-            chat_uuid (str): the chat uuid
             agent_name (str): the name of the agent to remove
+
+        Returns:
+            Optional[int]: the number of agents still required for the current phase, or None if the agent wasn't
+            required (e.g. because its response was delivered twice)
         """
         if (self._use_redis == True):
-            self._remove_from_redis_list("required_agents_for_current_phase", agent_name)
+            # not part of the current batch, if any, since the result is needed
+            pipe = self._redis_db.pipeline(transaction=True)
+            _run_redis_script(pipe, self._REMOVE_REQUIRED_AGENT_SCRIPT,
+                              keys=[self._redis_key("required_agents_for_current_phase")],
+                              args=[agent_name])
+            return self._execute(pipe, "required_agents_for_current_phase")[0]
         else:
-            self._required_agents_for_current_phase.remove(agent_name)
+            if agent_name not in self._state.required_agents_for_current_phase:
+                return None
+            self._state.required_agents_for_current_phase.remove(agent_name)
+            return len(self._state.required_agents_for_current_phase)
 
     def get_current_query(self) -> Optional[str]:
         """
@@ -553,11 +1009,15 @@ class WiseAgentContext():
             Optional[str]: the current query or None if there is no current query
         """
         if (self._use_redis == True):
-            return self._get_list_from_redis("queries")[0]
+            query = self._redis_db.lindex(self._redis_key("queries"), -1)
+            if query is not None:
+                return self._decode_list_item("queries", query)
+            else:
+                return None
         else:
-            if self._queries:
+            if self._state.queries:
                 # return the last query
-                return self._queries[-1]
+                return self._state.queries[-1]
             else:
                 return None
 
@@ -572,7 +1032,7 @@ class WiseAgentContext():
         if (self._use_redis == True):
             self._append_to_redis_list("queries", query)
         else:
-            self._queries.append(query)
+            self._state.queries.append(query)
 
     def get_queries(self) -> List[str]:
         """
@@ -585,19 +1045,19 @@ class WiseAgentContext():
         if (self._use_redis == True):
             return self._get_list_from_redis("queries")
         else:
-            return self._queries
+            return list(self._state.queries)
         
     @property
     def collaboration_type(self) -> WiseAgentCollaborationType:
         """Get the collaboration type for this context."""
         if (self._use_redis == True):
-            collaboration_type = self._redis_db.hget(self.name, "collaboration_type")
+            collaboration_type = self._get_redis_state("collaboration_type")
             if (collaboration_type is not None):
-                return WiseAgentCollaborationType(collaboration_type.decode("utf-8"))
+                return WiseAgentCollaborationType(collaboration_type)
             else:
                 return WiseAgentCollaborationType.INDEPENDENT   
         else:
-            return self._collaboration_type
+            return self._state.collaboration_type
 
     def set_collaboration_type(self, collaboration_type: WiseAgentCollaborationType):
         """
@@ -608,9 +1068,9 @@ class WiseAgentContext():
         """
             
         if (self._use_redis == True):
-            self._redis_db.hset(self.name, "collaboration_type", value=collaboration_type.value)
+            self._set_redis_state("collaboration_type", collaboration_type.value)
         else:
-            self._collaboration_type = collaboration_type
+            self._state.collaboration_type = collaboration_type
     
     def set_restart_sequence(self, restart_sequence: bool):
         """
@@ -621,9 +1081,9 @@ class WiseAgentContext():
             restart_sequence(bool): whether to restart a sequence of agents
         """
         if (self._use_redis == True):
-            self._redis_db.hset(self.name, "restart_sequence", value=pickle.dumps(restart_sequence))
+            self._set_redis_state("restart_sequence", int(restart_sequence))
         else:
-            self._restart_sequence = restart_sequence
+            self._state.restart_sequence = restart_sequence
     
     def get_restart_sequence(self) -> bool:
         """
@@ -636,14 +1096,178 @@ class WiseAgentContext():
             bool: whether to restart the sequence for the chat uuid for this context
         """
         if (self._use_redis == True):
-            restart = self._redis_db.hget(self.name, "restart_sequence")
-            if restart is not None:
-                return pickle.loads(restart)
-            else:
-                return False
+            return self._get_redis_state("restart_sequence") == "1"
         else:
-            return self._restart_sequence
-        
+            return self._state.restart_sequence
+
+    def get_history_summary(self) -> Tuple[Optional[str], int]:
+        """
+        Get the summary of the beginning of the chat completion, made by a WiseAgentHistoryPolicy.
+
+        Returns:
+            Tuple[Optional[str], int]: the summary, or None if there is no summary yet, and the number of
+            messages of the current chat completion it summarizes
+        """
+        if (self._use_redis == True):
+            pipe = self._redis_db.pipeline(transaction=True)
+            pipe.hget(self._redis_key("state"), "history_summary")
+            pipe.hget(self._redis_key("state"), "history_summarized_count")
+            summary, summarized_count = pipe.execute()
+            return (summary.decode("utf-8") if summary is not None else None,
+                    int(summarized_count) if summarized_count is not None else 0)
+        else:
+            state = self._state
+            return state.history_summary, max(0, state.history_summarized_count - state.llm_chat_completion_dropped)
+
+    def get_dropped_chat_completion(self) -> List[ChatCompletionMessageParam]:
+        """
+        Get the messages dropped from the beginning of the chat completion, once context_max_chat_completion
+        messages are kept, before being summarized by a WiseAgentHistoryPolicy. They are kept, up to
+        context_max_chat_completion of them, until the next summary. The chat completion isn't bounded with redis.
+
+        Returns:
+            List[ChatCompletionMessageParam]: the messages dropped and not summarized yet
+        """
+        if (self._use_redis == True):
+            return []
+        else:
+            return list(self._state.dropped_chat_completion)
+
+    def set_history_summary(self, summary: str, summarized_count: int):
+        """
+        Set the summary of the beginning of the chat completion, made by a WiseAgentHistoryPolicy. The summary
+        covers the messages dropped from the chat completion as well.
+
+        Args:
+            summary (str): the summary
+            summarized_count (int): the number of messages of the current chat completion it summarizes
+        """
+        if (self._use_redis == True):
+            pipe = self._redis_pipeline()
+            pipe.hset(self._redis_key("state"), mapping={"history_summary": summary,
+                                                         "history_summarized_count": summarized_count})
+            self._execute(pipe, "state")
+        else:
+            state = self._state
+            state.history_summary = summary
+            state.history_summarized_count = state.llm_chat_completion_dropped + summarized_count
+            state.dropped_chat_completion.clear()
+
+
+class WiseAgentHistoryPolicy(WiseAgentsYAMLObject):
+    ''' A WiseAgentHistoryPolicy limits the conversation history sent to the LLM of an agent, so the prompts don't
+    grow without limit in long conversations. Only the last messages of the history are kept, up to last_n messages
+    and up to max_tokens tokens. When a summary_llm is set, the older messages are replaced by a summary, made by this
+    LLM and updated with the messages leaving the window as the conversation goes on.
+    '''
+    yaml_tag = u"!wiseagents.WiseAgentHistoryPolicy"
+
+    SUMMARY_PROMPT = ("Update the summary of a conversation with its new messages. Keep the facts, the decisions and"
+                      " the open questions, and answer with the updated summary only.")
+
+    def __new__(cls, *args, **kwargs):
+        '''Create a new instance of the class, setting default values for the instance variables.'''
+        obj = super().__new__(cls)
+        obj._last_n = None
+        obj._max_tokens = None
+        obj._summary_llm = None
+        return obj
+
+    def __init__(self, last_n: Optional[int] = None, max_tokens: Optional[int] = None,
+                 summary_llm: Optional[WiseAgentLLM] = None):
+        ''' Initialize the history policy.
+
+        Args:
+            last_n (Optional[int]): the maximum number of messages of the history to keep, unbounded if None
+            max_tokens (Optional[int]): the maximum number of tokens of the messages of the history to keep, estimated
+            from their length, unbounded if None
+            summary_llm (Optional[WiseAgentLLM]): the LLM used to summarize the messages which are not kept, or None
+            to drop them
+        '''
+        self._last_n = last_n
+        self._max_tokens = max_tokens
+        self._summary_llm = summary_llm
+
+    def __repr__(self):
+        '''Return a string representation of the history policy.'''
+        return (f"{self.__class__.__name__}(last_n={self.last_n}, max_tokens={self.max_tokens},"
+                f"summary_llm={self.summary_llm})")
+
+    @property
+    def last_n(self) -> Optional[int]:
+        """Get the maximum number of messages of the history to keep."""
+        return self._last_n
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        """Get the maximum number of tokens of the messages of the history to keep."""
+        return self._max_tokens
+
+    @property
+    def summary_llm(self) -> Optional[WiseAgentLLM]:
+        """Get the LLM used to summarize the messages which are not kept."""
+        return self._summary_llm
+
+    @staticmethod
+    def _message_field(message: ChatCompletionMessageParam, field: str) -> Any:
+        if isinstance(message, dict):
+            return message.get(field)
+        return getattr(message, field, None)
+
+    @classmethod
+    def estimate_tokens(cls, message: ChatCompletionMessageParam) -> int:
+        '''Estimate the number of tokens of a message, counting 4 characters per token.
+
+        Args:
+            message (ChatCompletionMessageParam): the message'''
+        return len(str(cls._message_field(message, "content") or "")) // 4 + 4
+
+    def apply(self, context: WiseAgentContext) -> List[ChatCompletionMessageParam]:
+        '''Get the conversation history of the context to send to the LLM.
+
+        Args:
+            context (WiseAgentContext): the context
+
+        Returns:
+            List[ChatCompletionMessageParam]: the last messages of the chat completion of the context, preceded by
+            the summary of the previous ones if there is a summary_llm
+        '''
+        history = context.llm_chat_completion
+        start = 0
+        if self.last_n is not None:
+            start = max(0, len(history) - self.last_n)
+        if self.max_tokens is not None:
+            tokens = 0
+            index = len(history)
+            while index > start:
+                message_tokens = self.estimate_tokens(history[index - 1])
+                if tokens + message_tokens > self.max_tokens:
+                    break
+                tokens += message_tokens
+                index -= 1
+            start = index
+        # the tool messages must follow the assistant message calling the tool
+        while start < len(history) and self._message_field(history[start], "role") == "tool":
+            start += 1
+        window = history[start:]
+        if self.summary_llm is None:
+            return window
+        summary, summarized_count = context.get_history_summary()
+        # the messages dropped from a bounded chat completion (see context_max_chat_completion) are summarized too
+        dropped = context.get_dropped_chat_completion()
+        if summarized_count > start:
+            # the summary already covers the first messages of the window, don't send them twice
+            window = history[summarized_count:]
+        elif summarized_count < start or dropped:
+            new_messages = "\n".join(f"{self._message_field(message, 'role')}: {self._message_field(message, 'content')}"
+                                     for message in dropped + history[summarized_count:start])
+            prompt = f"{self.SUMMARY_PROMPT}\n\nSummary:\n{summary or ''}\n\nNew messages:\n{new_messages}"
+            summary = self.summary_llm.process_single_prompt(prompt).content
+            context.set_history_summary(summary, start)
+        if summary is None:
+            return window
+        return [{"role": "system", "content": f"Summary of the beginning of the conversation: {summary}"}] + window
+
 
 class WiseAgentMetaData(WiseAgentsYAMLObject):
     ''' A WiseAgentMetaData is a class that represents metadata associated with an agent.
@@ -683,6 +1307,22 @@ class WiseAgentMetaData(WiseAgentsYAMLObject):
     def __eq__(self, value: object) -> bool:
         return self.__repr__() == value.__repr__()
 
+    def to_dict(self) -> dict:
+        '''Return the metadata as a dictionary made of plain types only, used by the registry codecs.'''
+        return {"description": self.description,
+                "system_message": self.system_message,
+                "pre_user_messages": self.pre_user_messages,
+                "post_user_messages": self.post_user_messages}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'WiseAgentMetaData':
+        '''Create the metadata from a dictionary returned by to_dict.
+
+        Args:
+            d (dict): the dictionary representation of the metadata'''
+        return cls(description=d.get("description"), system_message=d.get("system_message"),
+                   pre_user_messages=d.get("pre_user_messages"), post_user_messages=d.get("post_user_messages"))
+
     @property
     def description(self) -> str:
         """Get a description of what the agent does."""
@@ -716,14 +1356,18 @@ class WiseAgent(WiseAgentsYAMLObject):
         obj._vector_db = None
         obj._graph_db = None
         obj._collection_name = "wise-agent-collection"
+        obj._history_policy = None
+        obj._replica_id = None
         return obj
 
     def __init__(self, name: str, metadata: WiseAgentMetaData, transport: WiseAgentTransport, llm: Optional[WiseAgentLLM] = None,
                  vector_db: Optional[WiseAgentVectorDB] = None,
                  collection_name: Optional[str] = "wise-agent-collection",
-                 graph_db: Optional[WiseAgentGraphDB] = None):
+                 graph_db: Optional[WiseAgentGraphDB] = None,
+                 history_policy: Optional[WiseAgentHistoryPolicy] = None):
         ''' 
-        Initialize the agent with the given name, metadata, transport, LLM, vector DB, collection name, and graph DB.
+        Initialize the agent with the given name, metadata, transport, LLM, vector DB, collection name, graph DB
+        and history policy.
 
 
         Args:
@@ -734,6 +1378,8 @@ class WiseAgent(WiseAgentsYAMLObject):
             vector_db (Optional[WiseAgentVectorDB]): the vector DB associated with the agent
             collection_name (Optional[str]) = "wise-agent-collection": the vector DB collection name associated with the agent
             graph_db (Optional[WiseAgentGraphDB]): the graph DB associated with the agent
+            history_policy (Optional[WiseAgentHistoryPolicy]): the policy limiting the conversation history sent to
+            the LLM, None to send the whole history
         '''
         self._name = name
         self._metadata = metadata
@@ -741,23 +1387,26 @@ class WiseAgent(WiseAgentsYAMLObject):
         self._vector_db = vector_db
         self._collection_name = collection_name
         self._graph_db = graph_db
+        self._history_policy = history_policy
         self._transport = transport
         self.start_agent()
 
     def start_agent(self):
         if self._llm is not None:
             self._llm.set_agent_name(self._name)
+        if self._history_policy is not None and self._history_policy.summary_llm is not None:
+            self._history_policy.summary_llm.set_agent_name(self._name)
 
         ''' Start the agent by setting the call backs and starting the transport.'''
         self.transport.set_call_backs(self.handle_request, self.process_event, self.process_error,
                                       self.process_response)
         self.transport.start()
-        WiseAgentRegistry.register_agent(self.name, self.metadata)
+        self._replica_id = WiseAgentRegistry.register_agent(self.name, self.metadata)
 
     def stop_agent(self):
         ''' Stop the agent by stopping the transport and removing the agent from the registry.'''
         self.transport.stop()
-        WiseAgentRegistry.unregister_agent(self.name)
+        WiseAgentRegistry.unregister_agent(self.name, self._replica_id)
 
     def __repr__(self):
         '''Return a string representation of the agent.'''
@@ -782,6 +1431,21 @@ class WiseAgent(WiseAgentsYAMLObject):
         """Get the LLM associated with the agent."""
         return self._llm
 
+    @property
+    def history_policy(self) -> Optional[WiseAgentHistoryPolicy]:
+        """Get the policy limiting the conversation history sent to the LLM, or None to send the whole history."""
+        return self._history_policy
+
+    @history_policy.setter
+    def history_policy(self, history_policy: Optional[WiseAgentHistoryPolicy]):
+        '''Set the policy limiting the conversation history sent to the LLM.
+
+        Args:
+            history_policy (Optional[WiseAgentHistoryPolicy]): the policy, None to send the whole history'''
+        self._history_policy = history_policy
+        if history_policy is not None and history_policy.summary_llm is not None:
+            history_policy.summary_llm.set_agent_name(self._name)
+
     @property
     def vector_db(self) -> Optional[WiseAgentVectorDB]:
         """Get the vector DB associated with the agent."""
@@ -816,6 +1480,21 @@ class WiseAgent(WiseAgentsYAMLObject):
         else:
             logging.warning(f"Context {message.context_name} not found")
 
+    def send_requests(self, requests: List[Tuple[WiseAgentMessage, str]]):
+        '''Send several request messages at once, letting the transport send them in a single batch.
+
+        Args:
+            requests (List[Tuple[WiseAgentMessage, str]]): the messages to send, with the name of their destination agent'''
+        for message, _ in requests:
+            message.sender = self.name
+        self.transport.send_requests(requests)
+        for message, _ in requests:
+            context = WiseAgentRegistry.get_context(message.context_name)
+            if context is not None:
+                context.trace(message)
+            else:
+                logging.warning(f"Context {message.context_name} not found")
+
     def send_response(self, message: WiseAgentMessage, dest_agent_name):
         '''Send a response message to the destination agent with the given name.
 
@@ -874,6 +1553,8 @@ class WiseAgent(WiseAgentsYAMLObject):
                 or collaboration_type == WiseAgentCollaborationType.CHAT
                 or collaboration_type == WiseAgentCollaborationType.SEQUENTIAL_MEMORY):
             # this agent is involved in phased collaboration or a chat, so it needs the conversation history
+            if self.history_policy is not None:
+                return self.history_policy.apply(context)
             return context.llm_chat_completion
         # for sequential collaboration and independent agents, the shared history is not needed
         return []
@@ -921,7 +1602,8 @@ class WiseAgent(WiseAgentsYAMLObject):
                 # let the sender know that this agent has finished processing the request
                 self.send_response(
                     WiseAgentMessage(message=response_str, message_type=WiseAgentMessageType.ACK, sender=self.name,
-                                     context_name=context.name), request.sender)
+                                     context_name=context.name, priority=request.priority,
+                                     deadline=request.deadline), request.sender)
             elif (collaboration_type == WiseAgentCollaborationType.SEQUENTIAL 
                     or collaboration_type == WiseAgentCollaborationType.SEQUENTIAL_MEMORY):
                 if collaboration_type == WiseAgentCollaborationType.SEQUENTIAL_MEMORY:
@@ -935,23 +1617,27 @@ class WiseAgent(WiseAgentsYAMLObject):
                         logging.debug(f"Sequential coordination restarting")
                         self.send_request(
                             WiseAgentMessage(message=context.get_current_query(), sender=self.name,
-                                             context_name=context.name), next_agent)
+                                             context_name=context.name, priority=request.priority,
+                                             deadline=request.deadline), next_agent)
                         # clear the restart state for the context
                         context.set_restart_sequence(False)
                     else:
                         logging.debug(f"Sequential coordination complete - sending response from " + self.name + " to "
                                       + context.get_route_response_to())
                         self.send_response(WiseAgentMessage(message=response_str, sender=self.name,
-                                                            context_name=context.name),
+                                                            context_name=context.name, priority=request.priority,
+                                                            deadline=request.deadline),
                                            context.get_route_response_to())
                 else:
                     logging.debug(f"Sequential coordination continuing - sending response from " + self.name
                                   + " to " + next_agent)
                     self.send_request(
-                        WiseAgentMessage(message=response_str, sender=self.name, context_name=context.name), next_agent)
+                        WiseAgentMessage(message=response_str, sender=self.name, context_name=context.name,
+                                         priority=request.priority, deadline=request.deadline), next_agent)
             else:
                 self.send_response(WiseAgentMessage(message=response_str, sender=self.name,
-                                                    context_name=context.name),
+                                                    context_name=context.name, priority=request.priority,
+                                                    deadline=request.deadline),
                                    request.sender)
         return True
 
@@ -999,18 +1685,757 @@ class WiseAgent(WiseAgentsYAMLObject):
 
 
 
+class WiseAgentRegistrySettings(Mapping):
+    '''The configuration of the registry, read once from the registry_config.yaml file. The settings are
+    immutable, WiseAgentRegistry.reload_config must be used to change them.'''
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, source: Optional[str] = None):
+        '''Initialize the settings with the given configuration values.
+
+        Args:
+            config (Optional[Dict[str, Any]]): the configuration values
+            source (Optional[str]): the file the configuration values were read from, if any'''
+        self._values = dict(config or {})
+        self._source = source
+
+    @classmethod
+    def load(cls, file_name: str) -> 'WiseAgentRegistrySettings':
+        '''Read the settings from the given YAML file.
+
+        Args:
+            file_name (str): the path of the registry_config.yaml file'''
+        with open(file_name) as file:
+            return cls(yaml.load(file, Loader=yaml.FullLoader), source=file_name)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(source={self._source}, config={self._values})"
+
+    @property
+    def source(self) -> Optional[str]:
+        """Get the file the settings were read from, or None if they were given directly."""
+        return self._source
+
+    @property
+    def use_redis(self) -> bool:
+        """Get whether the registry and the contexts are stored in redis."""
+        return self._values.get("use_redis") == True
+
+    @property
+    def redis_namespace(self) -> str:
+        """Get the prefix of the redis keys, set with the redis_db entry."""
+        return _redis_namespace(self._values)
+
+    @property
+    def registry_codec(self) -> str:
+        """Get the name of the codec used to store the agents, tools and contexts in redis."""
+        return self._values.get("registry_codec", "pickle")
+
+    @property
+    def context_ttl(self) -> Optional[float]:
+        """Get the number of seconds after which an idle context is removed, or None if the contexts never expire."""
+        return self._values.get("context_ttl")
+
+    @property
+    def context_sweep_interval(self) -> float:
+        """Get the number of seconds between two removals of the expired contexts."""
+        return self._values.get("context_sweep_interval", 60)
+
+    @property
+    def agent_replica_ttl(self) -> float:
+        """Get the number of seconds after which a replica of an agent which stopped sending heartbeats (e.g. because
+        it crashed) is removed from the registry."""
+        return self._values.get("agent_replica_ttl", 30)
+
+
+class _AgentCatalog():
+    '''A snapshot of the agents registered, with their descriptions rendered once for the prompts.'''
+    __slots__ = ("version", "metadata", "descriptions", "text")
+
+    def __init__(self, version: int, metadata: Dict[str, WiseAgentMetaData]):
+        '''Initialize the snapshot.
+
+        Args:
+            version (int): the version of the agents registered, incremented each time an agent is (un)registered
+            metadata (Dict[str, WiseAgentMetaData]): the metadata of the agents, by name'''
+        self.version = version
+        self.metadata = metadata
+        self.descriptions = tuple(f"Agent Name: {agent_name} Agent Description: {agent_metadata.description}"
+                                  for agent_name, agent_metadata in metadata.items())
+        self.text = "\n".join(self.descriptions)
+
+
+class _ToolCatalog():
+    '''A snapshot of the tools registered, with their OpenAI schemas computed once. The schemas are shared by all
+    the agents, they must not be modified.'''
+    __slots__ = ("version", "tools", "schemas", "_tools_in_chat")
+
+    def __init__(self, version: int, tools: Dict[str, WiseAgentTool]):
+        '''Initialize the snapshot.
+
+        Args:
+            version (int): the version of the tools registered, incremented each time a tool is registered
+            tools (Dict[str, WiseAgentTool]): the tools, by name'''
+        self.version = version
+        self.tools = tools
+        self.schemas = {tool_name: tool.get_tool_OpenAI_format() for tool_name, tool in tools.items()}
+        self._tools_in_chat : Dict[Tuple[str, ...], Tuple[ChatCompletionToolParam, ...]] = {}
+
+    def get_tools_in_chat(self, tool_names: Tuple[str, ...]) -> Tuple[ChatCompletionToolParam, ...]:
+        '''Get the OpenAI schemas of the given tools, the tuple being built once per list of tools.'''
+        tools_in_chat = self._tools_in_chat.get(tool_names)
+        if tools_in_chat is None:
+            for tool_name in tool_names:
+                if tool_name not in self.schemas:
+                    raise NameError(f"Tool with name {tool_name} is not registered")
+            tools_in_chat = tuple(self.schemas[tool_name] for tool_name in tool_names)
+            self._tools_in_chat[tool_names] = tools_in_chat
+        return tools_in_chat
+
+
+class _RegistryBackend():
+    '''The storage of the agents, contexts and tools of the registry, selected once when the settings are loaded.'''
+
+    def __init__(self, settings: WiseAgentRegistrySettings):
+        self.settings = settings
+
+    @abstractmethod
+    def register_agent(self, agent_name: str, agent_metadata: WiseAgentMetaData, replica_id: str):
+        ...
+
+    @abstractmethod
+    def unregister_agent(self, agent_name: str, replica_id: str):
+        ...
+
+    def send_agent_heartbeats(self, replicas: Dict[str, Tuple[str, WiseAgentMetaData]]):
+        '''Record that the given replicas, running in this process, are alive.
+
+        Args:
+            replicas (Dict[str, Tuple[str, WiseAgentMetaData]]): the name and metadata of the agent of each replica id'''
+        pass
+
+    def remove_dead_agent_replicas(self) -> List[str]:
+        '''Remove the replicas which didn't send a heartbeat for agent_replica_ttl seconds, returning the names of
+        the agents removed since none of their replicas is alive anymore.'''
+        return []
+
+    @abstractmethod
+    def fetch_agents_metadata_dict(self) -> Dict[str, WiseAgentMetaData]:
+        ...
+
+    @abstractmethod
+    def get_agent_metadata(self, agent_name: str) -> Optional[WiseAgentMetaData]:
+        ...
+
+    @abstractmethod
+    def get_agent_catalog(self) -> _AgentCatalog:
+        '''Get the snapshot of the agents registered, cached until an agent is (un)registered.'''
+        ...
+
+    def close(self):
+        '''Release the resources of the backend when the registry settings are reloaded.'''
+        pass
+
+    def refresh_context_keys(self, pipe: redis.client.Pipeline, context_name: str, keys: Iterable[str]):
+        '''Refresh the expiration of the given redis keys of a context, written as part of the given pipeline.'''
+        pass
+
+    @abstractmethod
+    def register_context(self, context: WiseAgentContext):
+        ...
+
+    @abstractmethod
+    def get_context(self, context_name: str) -> Optional[WiseAgentContext]:
+        '''Get the context with the given name, recording the access when the contexts expire.'''
+        ...
+
+    @abstractmethod
+    def get_contexts(self) -> Dict[str, WiseAgentContext]:
+        ...
+
+    @abstractmethod
+    def iter_context_names(self) -> Iterable[str]:
+        ...
+
+    @abstractmethod
+    def does_context_exist(self, context_name: str) -> bool:
+        ...
+
+    def do_contexts_exist(self, context_names: List[str]) -> List[bool]:
+        '''Check whether each of the given contexts exists.'''
+        return [self.does_context_exist(context_name) for context_name in context_names]
+
+    @abstractmethod
+    def remove_context(self, context_name: str):
+        ...
+
+    @abstractmethod
+    def get_live_context_count(self) -> int:
+        ...
+
+    @abstractmethod
+    def remove_expired_contexts(self, expired_before: float) -> List[str]:
+        '''Remove the contexts which haven't been accessed since the given time, returning their names.'''
+        ...
+
+    def migrate_legacy_contexts(self) -> List[str]:
+        '''Migrate the contexts stored by older versions of Wise Agents, returning their names.'''
+        return []
+
+    @abstractmethod
+    def register_tool(self, tool: WiseAgentTool):
+        ...
+
+    @abstractmethod
+    def get_tools(self) -> Dict[str, WiseAgentTool]:
+        ...
+
+    @abstractmethod
+    def get_tool(self, tool_name: str) -> Optional[WiseAgentTool]:
+        ...
+
+    @abstractmethod
+    def get_tool_catalog(self) -> _ToolCatalog:
+        '''Get the snapshot of the tools registered, cached until a tool is registered.'''
+        ...
+
+
+class _InMemoryRegistryBackend(_RegistryBackend):
+    '''The registry backend keeping the agents, contexts and tools in the dictionaries of the WiseAgentRegistry.'''
+
+    def __init__(self, settings: WiseAgentRegistrySettings, agents_metadata_dict: Dict[str, WiseAgentMetaData],
+                 agents_replicas: Dict[str, Set[str]], contexts: Dict[str, WiseAgentContext], tools: Dict[str, WiseAgentTool],
+                 contexts_last_access: Dict[str, float]):
+        super().__init__(settings)
+        self.agents_metadata_dict = agents_metadata_dict
+        self.agents_replicas = agents_replicas
+        self.contexts = contexts
+        self.tools = tools
+        self.contexts_last_access = contexts_last_access
+        self._agents_version = 0
+        self._agent_catalog : Optional[_AgentCatalog] = None
+        self._tools_version = 0
+        self._tool_catalog : Optional[_ToolCatalog] = None
+
+    def _touch_context(self, context_name: str):
+        if self.settings.context_ttl is not None:
+            self.contexts_last_access[context_name] = time.time()
+
+    def register_agent(self, agent_name: str, agent_metadata: WiseAgentMetaData, replica_id: str):
+        registered_metadata = self.agents_metadata_dict.get(agent_name)
+        if registered_metadata is not None and registered_metadata != agent_metadata:
+            raise NameError(f"Agent with name {agent_name} already exists")
+        self.agents_metadata_dict[agent_name] = agent_metadata
+        self.agents_replicas.setdefault(agent_name, set()).add(replica_id)
+        self._agents_version += 1
+
+    def unregister_agent(self, agent_name: str, replica_id: str):
+        # the replicas are all in this process, they can't crash without the registry
+        replicas = self.agents_replicas.get(agent_name, set())
+        replicas.discard(replica_id)
+        if not replicas:
+            self.agents_replicas.pop(agent_name, None)
+            self.agents_metadata_dict.pop(agent_name, None)
+        self._agents_version += 1
+
+    def fetch_agents_metadata_dict(self) -> Dict[str, WiseAgentMetaData]:
+        return self.agents_metadata_dict
+
+    def get_agent_metadata(self, agent_name: str) -> Optional[WiseAgentMetaData]:
+        return self.agents_metadata_dict.get(agent_name)
+
+    def get_agent_catalog(self) -> _AgentCatalog:
+        catalog = self._agent_catalog
+        if catalog is None or catalog.version != self._agents_version:
+            catalog = _AgentCatalog(self._agents_version, dict(self.agents_metadata_dict))
+            self._agent_catalog = catalog
+        return catalog
+
+    def register_context(self, context: WiseAgentContext):
+        self.contexts[context.name] = context
+        self._touch_context(context.name)
+
+    def get_context(self, context_name: str) -> Optional[WiseAgentContext]:
+        context = self.contexts.get(context_name)
+        if context is not None:
+            self._touch_context(context_name)
+        return context
+
+    def get_contexts(self) -> Dict[str, WiseAgentContext]:
+        return self.contexts
+
+    def iter_context_names(self) -> Iterable[str]:
+        yield from list(self.contexts)
+
+    def does_context_exist(self, context_name: str) -> bool:
+        return self.contexts.get(context_name) is not None
+
+    def remove_context(self, context_name: str):
+        # the context may have been removed by the sweeper meanwhile
+        self.contexts.pop(context_name, None)
+        self.contexts_last_access.pop(context_name, None)
+
+    def get_live_context_count(self) -> int:
+        return len(self.contexts)
+
+    def remove_expired_contexts(self, expired_before: float) -> List[str]:
+        removed = []
+        for context_name, last_access in list(self.contexts_last_access.items()):
+            if last_access <= expired_before:
+                self.contexts.pop(context_name, None)
+                self.contexts_last_access.pop(context_name, None)
+                removed.append(context_name)
+        return removed
+
+    def register_tool(self, tool: WiseAgentTool):
+        self.tools[tool.name] = tool
+        self._tools_version += 1
+
+    def get_tools(self) -> Dict[str, WiseAgentTool]:
+        return self.tools
+
+    def get_tool(self, tool_name: str) -> Optional[WiseAgentTool]:
+        return self.tools.get(tool_name)
+
+    def get_tool_catalog(self) -> _ToolCatalog:
+        catalog = self._tool_catalog
+        if catalog is None or catalog.version != self._tools_version:
+            catalog = _ToolCatalog(self._tools_version, dict(self.tools))
+            self._tool_catalog = catalog
+        return catalog
+
+
+class _RedisRegistryBackend(_RegistryBackend):
+    '''The registry backend storing the agents, contexts and tools in redis, shared by all the processes. The keys
+    are prefixed with the redis_db entry of the configuration, and the registered contexts are indexed by name only,
+    their fields being stored in their own keys.'''
+
+    # The number of elements read by each SCAN like command
+    _SCAN_COUNT = 500
+    # The accesses to a context are recorded by a process at most once every context_ttl / _TOUCH_INTERVAL_RATIO seconds
+    _TOUCH_INTERVAL_RATIO = 10
+    # The maximum number of contexts whose last recorded access is remembered by the process
+    touch_cache_size : int = 10000
+
+    # Remove a context if it wasn't accessed since the given time, returning 1 if it was removed.
+    # KEYS are the context names set, the last access sorted set and the keys of the context, ARGV the context name and the time
+    _REMOVE_EXPIRED_CONTEXT_SCRIPT = """
+        local last_access = redis.call('ZSCORE', KEYS[2], ARGV[1])
+        if last_access and tonumber(last_access) > tonumber(ARGV[2]) then
+            return 0
+        end
+        redis.call('SREM', KEYS[1], ARGV[1])
+        redis.call('ZREM', KEYS[2], ARGV[1])
+        for i = 3, #KEYS do
+            redis.call('DEL', KEYS[i])
+        end
+        return 1
+    """
+
+    # Remove the given replica, if any, and the dead replicas of an agent, then the agent if none of its replicas
+    # is alive anymore, returning 1 if the agent was removed. The agents registered by older versions of Wise Agents,
+    # which have no replicas, are only removed when a replica is given.
+    # KEYS are the replicas of the agent, the agents hash and the agents version, ARGV the agent name, the time,
+    # the channel on which the removal is published and the replica
+    _REMOVE_AGENT_REPLICAS_SCRIPT = """
+        if ARGV[4] == '' and redis.call('EXISTS', KEYS[1]) == 0 then
+            return 0
+        end
+        if ARGV[4] ~= '' then
+            redis.call('ZREM', KEYS[1], ARGV[4])
+        end
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+        if redis.call('ZCARD', KEYS[1]) > 0 or redis.call('HDEL', KEYS[2], ARGV[1]) == 0 then
+            return 0
+        end
+        redis.call('INCR', KEYS[3])
+        redis.call('PUBLISH', ARGV[3], ARGV[1])
+        return 1
+    """
+
+    def __init__(self, settings: WiseAgentRegistrySettings, redis_db: redis.Redis):
+        super().__init__(settings)
+        self.redis_db = redis_db
+        self.namespace = settings.redis_namespace
+        self.codec = get_registry_codec(settings.registry_codec)
+        # The channels on which a message is published each time an agent is (un)registered or a tool is registered
+        self._agents_channel = self._key("agents_changed")
+        self._tools_channel = self._key("tools_changed")
+        # The agent and tool catalogs are cached while this process is subscribed to the channels above, the
+        # generation being incremented on each change so a catalog read while it was changed isn't cached
+        self._agent_catalog : Optional[_AgentCatalog] = None
+        self._tool_catalog : Optional[_ToolCatalog] = None
+        self._generation = 0
+        self._listening = False
+        self._cache_lock = threading.Lock()
+        self._listener : Optional[threading.Thread] = None
+        self._closed = threading.Event()
+        # The time of the last access recorded by this process for each context, the least recently recorded
+        # entries are evicted once touch_cache_size is reached
+        self._last_touches : OrderedDict = OrderedDict()
+        self._touches_lock = threading.Lock()
+
+    def _key(self, name: str) -> str:
+        return f"{self.namespace}{name}"
+
+    def _context_keys(self, context_name: str) -> List[str]:
+        return WiseAgentContext.redis_keys(context_name, self.namespace)
+
+    def _replicas_key(self, agent_name: str) -> str:
+        '''The sorted set of the replicas of the agent, scored by the time their last heartbeat expires.'''
+        return self._key(f"agent_replicas:{agent_name}")
+
+    def _invalidate(self, channel: Optional[str] = None, listening: Optional[bool] = None):
+        '''Drop the catalog changed according to the channel, or both catalogs if the channel is None.'''
+        with self._cache_lock:
+            self._generation += 1
+            if channel is None or channel == self._agents_channel:
+                self._agent_catalog = None
+            if channel is None or channel == self._tools_channel:
+                self._tool_catalog = None
+            if listening is not None:
+                self._listening = listening
+
+    def _start_listener(self):
+        '''Start the thread invalidating the catalogs when they change, if it isn't running yet.'''
+        with self._cache_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen_registry_changes, daemon=True,
+                                                  name="wiseagents-registry-listener")
+                self._listener.start()
+
+    def _listen_registry_changes(self):
+        while not self._closed.is_set():
+            pubsub = self.redis_db.pubsub()
+            try:
+                pubsub.subscribe(self._agents_channel, self._tools_channel)
+                while not self._closed.is_set():
+                    # the confirmations of the subscriptions are received first, the catalogs can be cached from then on
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "message":
+                        self._invalidate(message["channel"].decode("utf-8"))
+                    else:
+                        self._invalidate(listening=True)
+            except Exception as e:
+                logging.warning(f"Error while listening to the changes of the registry: {e}")
+                self._invalidate(listening=False)
+                self._closed.wait(1)
+            finally:
+                pubsub.close()
+        self._invalidate(listening=False)
+
+    def _cache_catalog(self, generation: int, attribute: str, catalog: Any):
+        '''Cache a catalog read from redis, unless it changed while it was read or this process isn't listening.'''
+        with self._cache_lock:
+            if self._listening and generation == self._generation:
+                setattr(self, attribute, catalog)
+
+    def close(self):
+        self._closed.set()
+
+    def _touch_interval(self) -> float:
+        '''The minimum time between two accesses to a context recorded by this process.'''
+        return self.settings.context_ttl / self._TOUCH_INTERVAL_RATIO
+
+    def _is_touch_due(self, context_name: str) -> bool:
+        '''Whether an access to the context must be recorded, i.e. this process didn't record one in the last touch interval.'''
+        with self._touches_lock:
+            last_touch = self._last_touches.get(context_name)
+        return last_touch is None or time.time() - last_touch >= self._touch_interval()
+
+    def _forget_touches(self, context_names: Iterable[str]):
+        with self._touches_lock:
+            for context_name in context_names:
+                self._last_touches.pop(context_name, None)
+
+    def _touch_context(self, pipe: redis.client.Pipeline, context_name: str):
+        '''Record an access to the context as part of the given pipeline. The keys of the context expire in redis
+        once it has been idle for context_ttl seconds and the sweeper had a chance to remove it.'''
+        ttl = self.settings.context_ttl
+        if ttl is None:
+            return
+        now = time.time()
+        with self._touches_lock:
+            self._last_touches[context_name] = now
+            self._last_touches.move_to_end(context_name)
+            while len(self._last_touches) > self.touch_cache_size:
+                self._last_touches.popitem(last=False)
+        pipe.zadd(self._key("contexts_last_access"), {context_name: now})
+        for key in self._context_keys(context_name):
+            pipe.expire(key, self._context_keys_ttl())
+
+    def _context_keys_ttl(self) -> int:
+        '''The expiration time of the keys of a context, long enough for the sweeper to remove the context first.'''
+        return int(self.settings.context_ttl + self.settings.context_sweep_interval + self._touch_interval())
+
+    def refresh_context_keys(self, pipe: redis.client.Pipeline, context_name: str, keys: Iterable[str]):
+        # the writes through a handle count as accesses to the context, and the keys they write expire even if the
+        # context was removed in the meantime
+        if self.settings.context_ttl is None:
+            return
+        if self._is_touch_due(context_name):
+            self._touch_context(pipe, context_name)
+        else:
+            for key in keys:
+                pipe.expire(key, self._context_keys_ttl())
+
+    def register_agent(self, agent_name: str, agent_metadata: WiseAgentMetaData, replica_id: str):
+        pipe = self.redis_db.pipeline(transaction=True)
+        while True:
+            pipe.watch(self._key("agents"), self._replicas_key(agent_name))
+            try:
+                now = time.time()
+                registered_metadata = pipe.hget(self._key("agents"), agent_name)
+                if registered_metadata is not None and _decode_registry_object(registered_metadata) != agent_metadata:
+                    # the agent is replaced once all its replicas are dead
+                    if pipe.zcount(self._replicas_key(agent_name), now, "+inf") > 0:
+                        pipe.unwatch()
+                        raise NameError(f"Agent with name {agent_name} already exists")
+                    registered_metadata = None
+                pipe.multi()
+                if registered_metadata is None:
+                    pipe.hset(self._key("agents"), key=agent_name, value=_encode_registry_object(self.codec, agent_metadata))
+                    pipe.incr(self._key("agents_version"))
+                    pipe.publish(self._agents_channel, agent_name)
+                pipe.zadd(self._replicas_key(agent_name), {replica_id: now + self.settings.agent_replica_ttl})
+                pipe.execute()
+                self._invalidate(self._agents_channel)
+                return
+            except redis.WatchError:
+                logging.debug("WatchError in register_agent")
+                continue
+
+    def _remove_agent_replicas(self, redis_db: redis.Redis, agent_name: str, replica_id: str = "") -> Any:
+        return _run_redis_script(redis_db, self._REMOVE_AGENT_REPLICAS_SCRIPT,
+                                 keys=[self._replicas_key(agent_name), self._key("agents"), self._key("agents_version")],
+                                 args=[agent_name, time.time(), self._agents_channel, replica_id])
+
+    def unregister_agent(self, agent_name: str, replica_id: str):
+        # the replicas which crashed are removed too, so the agent is removed once its last live replica stops
+        self._remove_agent_replicas(self.redis_db, agent_name, replica_id)
+        self._invalidate(self._agents_channel)
+
+    def send_agent_heartbeats(self, replicas: Dict[str, Tuple[str, WiseAgentMetaData]]):
+        pipe = self.redis_db.pipeline(transaction=False)
+        expires = time.time() + self.settings.agent_replica_ttl
+        for replica_id, (agent_name, _) in replicas.items():
+            pipe.zadd(self._replicas_key(agent_name), {replica_id: expires}, xx=True, ch=True)
+        for (replica_id, (agent_name, agent_metadata)), updated in zip(replicas.items(), pipe.execute()):
+            if not updated:
+                # the replica couldn't send its heartbeats in time and was removed by another process
+                logging.warning(f"Replica {replica_id} of agent {agent_name} was removed from the registry, registering it again")
+                self.register_agent(agent_name, agent_metadata, replica_id)
+
+    def remove_dead_agent_replicas(self) -> List[str]:
+        agent_names = list(self.get_agent_catalog().metadata)
+        pipe = self.redis_db.pipeline(transaction=False)
+        for agent_name in agent_names:
+            self._remove_agent_replicas(pipe, agent_name)
+        removed = [agent_name for agent_name, result in zip(agent_names, pipe.execute()) if result == 1]
+        if removed:
+            self._invalidate(self._agents_channel)
+        return removed
+
+    def fetch_agents_metadata_dict(self) -> Dict[str, WiseAgentMetaData]:
+        return dict(self.get_agent_catalog().metadata)
+
+    def get_agent_metadata(self, agent_name: str) -> Optional[WiseAgentMetaData]:
+        catalog = self._agent_catalog
+        if catalog is not None:
+            return catalog.metadata.get(agent_name)
+        # don't read the whole catalog to look up a single agent while it isn't cached
+        value = self.redis_db.hget(self._key("agents"), agent_name)
+        return _decode_registry_object(value) if value is not None else None
+
+    def get_agent_catalog(self) -> _AgentCatalog:
+        catalog = self._agent_catalog
+        if catalog is not None:
+            return catalog
+        self._start_listener()
+        generation = self._generation
+        # the agents are read in chunks so the server isn't blocked, the catalog isn't cached if they changed meanwhile
+        version = self.redis_db.get(self._key("agents_version"))
+        return_dictionary : Dict[str, WiseAgentMetaData]= {}
+        for key, value in self.redis_db.hscan_iter(self._key("agents"), count=self._SCAN_COUNT):
+            return_dictionary[key.decode('utf-8')] = _decode_registry_object(value)
+        catalog = _AgentCatalog(int(version or 0), return_dictionary)
+        self._cache_catalog(generation, "_agent_catalog", catalog)
+        return catalog
+
+    def register_context(self, context: WiseAgentContext):
+        # the registration is part of the batch of the context, if any
+        pipe = context._batch if context._batch is not None else self.redis_db.pipeline(transaction=True)
+        pipe.sadd(self._key("context_names"), context.name)
+        self._touch_context(pipe, context.name)
+        if pipe is not context._batch:
+            pipe.execute()
+
+    def get_context(self, context_name: str) -> Optional[WiseAgentContext]:
+        # the accesses are only recorded once per touch interval, so most reads are a single SISMEMBER
+        if self.settings.context_ttl is not None and self._is_touch_due(context_name):
+            pipe = self.redis_db.pipeline(transaction=True)
+            pipe.sismember(self._key("context_names"), context_name)
+            self._touch_context(pipe, context_name)
+            exists = pipe.execute()[0]
+        else:
+            exists = self.does_context_exist(context_name)
+        if exists:
+            return WiseAgentContext.handle(context_name, self.settings)
+        return None
+
+    def get_contexts(self) -> Dict[str, WiseAgentContext]:
+        return {context_name: WiseAgentContext.handle(context_name, self.settings)
+                for context_name in self.iter_context_names()}
+
+    def iter_context_names(self) -> Iterable[str]:
+        for name in self.redis_db.sscan_iter(self._key("context_names"), count=self._SCAN_COUNT):
+            yield name.decode("utf-8")
+
+    def does_context_exist(self, context_name: str) -> bool:
+        return self.redis_db.sismember(self._key("context_names"), context_name)
+
+    def do_contexts_exist(self, context_names: List[str]) -> List[bool]:
+        pipe = self.redis_db.pipeline(transaction=False)
+        for context_name in context_names:
+            pipe.sismember(self._key("context_names"), context_name)
+        return [bool(exists) for exists in pipe.execute()]
+
+    def remove_context(self, context_name: str):
+        pipe = self.redis_db.pipeline(transaction=True)
+        pipe.srem(self._key("context_names"), context_name)
+        pipe.zrem(self._key("contexts_last_access"), context_name)
+        pipe.delete(*self._context_keys(context_name))
+        pipe.execute()
+        self._forget_touches([context_name])
+        _chat_completion_cache.invalidate(WiseAgentContext.redis_key(context_name, "llm_chat_completion", self.namespace))
+
+    def get_live_context_count(self) -> int:
+        return self.redis_db.scard(self._key("context_names"))
+
+    def remove_expired_contexts(self, expired_before: float) -> List[str]:
+        removed = []
+        # the recorded accesses may be up to a touch interval older than the last ones
+        expired_before -= self._touch_interval()
+        # the expired contexts are read in batches, each batch leaving the sorted set once removed
+        while True:
+            names = self.redis_db.zrangebyscore(self._key("contexts_last_access"), "-inf", expired_before,
+                                                start=0, num=self._SCAN_COUNT)
+            removed_in_batch = 0
+            for name in names:
+                context_name = name.decode("utf-8")
+                if _run_redis_script(self.redis_db, self._REMOVE_EXPIRED_CONTEXT_SCRIPT,
+                                     keys=[self._key("context_names"), self._key("contexts_last_access")] + self._context_keys(context_name),
+                                     args=[context_name, expired_before]) == 1:
+                    _chat_completion_cache.invalidate(WiseAgentContext.redis_key(context_name, "llm_chat_completion", self.namespace))
+                    removed.append(context_name)
+                    removed_in_batch += 1
+            if len(names) < self._SCAN_COUNT or removed_in_batch == 0:
+                self._forget_touches(removed)
+                return removed
+
+    def migrate_legacy_contexts(self) -> List[str]:
+        migrated = []
+        # older versions registered the contexts, without any prefix, in the contexts hash
+        for name, _ in self.redis_db.hscan_iter("contexts", count=self._SCAN_COUNT):
+            context_name = name.decode("utf-8")
+            if WiseAgentContext.handle(context_name, self.settings)._migrate_legacy_redis_hash():
+                migrated.append(context_name)
+            pipe = self.redis_db.pipeline(transaction=True)
+            pipe.sadd(self._key("context_names"), context_name)
+            self._touch_context(pipe, context_name)
+            pipe.hdel("contexts", context_name)
+            pipe.execute()
+        return migrated
+
+    def register_tool(self, tool: WiseAgentTool):
+        pipe = self.redis_db.pipeline(transaction=True)
+        pipe.hset(self._key("tools"), key=tool.name, value=_encode_registry_object(self.codec, tool))
+        pipe.incr(self._key("tools_version"))
+        pipe.publish(self._tools_channel, tool.name)
+        pipe.execute()
+        self._invalidate(self._tools_channel)
+
+    def get_tools(self) -> Dict[str, WiseAgentTool]:
+        return dict(self.get_tool_catalog().tools)
+
+    def get_tool(self, tool_name: str) -> Optional[WiseAgentTool]:
+        catalog = self._tool_catalog
+        if catalog is not None:
+            return catalog.tools.get(tool_name)
+        # don't read the whole catalog to look up a single tool while it isn't cached
+        value = self.redis_db.hget(self._key("tools"), tool_name)
+        return self._decode_tool(tool_name, value) if value is not None else None
+
+    @staticmethod
+    def _decode_tool(tool_name: str, value: bytes) -> Optional[WiseAgentTool]:
+        '''Decode a tool, or return None if it can't be decoded (e.g. its callback can't be imported in this
+        process) so the other tools remain usable.'''
+        try:
+            return _decode_registry_object(value)
+        except Exception as e:
+            logging.warning(f"Skipping tool {tool_name} which can't be decoded: {e}")
+            return None
+
+    def get_tool_catalog(self) -> _ToolCatalog:
+        catalog = self._tool_catalog
+        if catalog is not None:
+            return catalog
+        self._start_listener()
+        generation = self._generation
+        version = self.redis_db.get(self._key("tools_version"))
+        return_dictionary : Dict[str, WiseAgentTool]= {}
+        for key, value in self.redis_db.hscan_iter(self._key("tools"), count=self._SCAN_COUNT):
+            tool = self._decode_tool(key.decode('utf-8'), value)
+            if tool is not None:
+                return_dictionary[key.decode('utf-8')] = tool
+        catalog = _ToolCatalog(int(version or 0), return_dictionary)
+        self._cache_catalog(generation, "_tool_catalog", catalog)
+        return catalog
+
+
 class WiseAgentRegistry:
 
     """
     A Registry to get available agents and running contexts
     """
     agents_metadata_dict : dict[str, WiseAgentMetaData] = {}
+    # The ids of the replicas running for each agent name
+    agents_replicas : dict[str, set[str]] = {}
     contexts : dict[str, WiseAgentContext] = {}
     tools: dict[str, WiseAgentTool] = {}
     
-    config: dict[str, Any] = {}
+    # The settings of the registry, loaded by get_config the first time they are needed
+    config: Optional[WiseAgentRegistrySettings] = None
     
     redis_db : redis.Redis = None
+
+    # The storage of the registry, selected according to the settings when they are loaded
+    _backend : Optional[_RegistryBackend] = None
+    _config_lock = threading.Lock()
+
+    # The time of the last access to each context, used to remove the contexts idle for more than context_ttl seconds
+    contexts_last_access : dict[str, float] = {}
+    _context_sweeper : threading.Thread = None
+    _context_sweeper_lock = threading.Lock()
+    # Set when the settings are reloaded, so the sweeper checks them again
+    _context_sweeper_wakeup = threading.Event()
+
+    # The name and metadata of the agent of each replica registered by this process, by replica id
+    _agent_replicas : dict[str, Tuple[str, WiseAgentMetaData]] = {}
+    _agent_heartbeat : threading.Thread = None
+    _agent_heartbeat_lock = threading.Lock()
+    # Set when the settings are reloaded, so the heartbeat thread checks them again
+    _agent_heartbeat_wakeup = threading.Event()
     
     
     @classmethod
@@ -1033,125 +2458,247 @@ class WiseAgentRegistry:
         raise FileNotFoundError(f"File '{file_name}' not found in current directory, home directory, as '{config_directory}'/{file_name}.")
     
     @classmethod
-    def get_config(cls) -> dict[str, Any]:
+    def get_config(cls) -> WiseAgentRegistrySettings:
         """
-        Get the configuration and initialize the redis database
+        Get the configuration and initialize the redis database, the configuration is read the first time only,
+        use reload_config to read it again.
         for more information see 
         https://wise-agents.github.io/wise_agents_architecture/#distributed-architecture
         """
+        config = cls.config
+        if config is not None:
+            return config
         try: 
-            if cls.config is None or cls.config == {}:
-                file_name = cls.find_file(file_name="registry_config.yaml", config_directory=".wise-agents")
-                cls.config : Dict[str, Any] = yaml.load(open(file_name), Loader=yaml.FullLoader)
-            if cls.config.get("use_redis") == True and cls.redis_db is None:
-                if (cls.config.get("redis_ssl") is True):
-                    cls.redis_db = redis.Redis(
-                    host=cls.config["redis_host"], port=cls.config["redis_port"],
-                    username=cls.config["redis_username"], # use your Redis user. More info https://redis.io/docs/latest/operate/oss_and_stack/management/security/acl/
-                    password=cls.config["redis_password"], # use your Redis password
-                    ssl=True,
-                    ssl_certfile=cls.config["redis_ssl_certfile"],
-                    ssl_keyfile=cls.config["redis_ssl_keyfile"],
-                    ssl_ca_certs=cls.config["redis_ssl_ca_certs"])
-
-                else:
-                    cls.redis_db = redis.Redis(host=cls.config["redis_host"], port=cls.config["redis_port"])
+            with cls._config_lock:
+                if cls.config is None:
+                    cls._load_config(None)
             return cls.config
         except Exception as e:
             logging.error(e)
             exit(1)
-    
+
     @classmethod
-    def register_agent(cls, agent_name : str, agent_metadata :WiseAgentMetaData):
+    def reload_config(cls, config: Optional[Dict[str, Any]] = None) -> WiseAgentRegistrySettings:
         """
-        Register an agent with the registry
+        Read the configuration of the registry again, or replace it with the given one, and select the storage of
+        the registry accordingly. The agents, contexts and tools already registered in memory are kept, but they
+        are not copied to redis (or the other way around) when the storage changes.
+
+        Args:
+            config (Optional[Dict[str, Any]]): the configuration to use, read from the registry_config.yaml file if None
+        Returns:
+            WiseAgentRegistrySettings: the new settings of the registry
         """
-        if (cls.get_config().get("use_redis") == True):
-            pipe = cls.redis_db.pipeline(transaction=True)
-            while True:
-                pipe.watch("agents")
-                try:
-                    if(pipe.hexists("agents", agent_name) == True):
-                        pipe.unwatch()
-                        raise NameError(f"Agent with name {agent_name} already exists")
-                    else:
-                        pipe.multi()
-                        pipe.hset("agents", key=agent_name, value=pickle.dumps(agent_metadata))
-                        pipe.execute()
-                    return
-                except redis.WatchError:
-                    logging.debug("WatchError in register_agent")
-                    continue
+        with cls._config_lock:
+            cls._load_config(config)
+            return cls.config
+
+    @classmethod
+    def _load_config(cls, config: Optional[Dict[str, Any]]):
+        if cls._backend is not None:
+            cls._backend.close()
+        if config is None:
+            settings = WiseAgentRegistrySettings.load(cls.find_file(file_name="registry_config.yaml",
+                                                                    config_directory=".wise-agents"))
+        else:
+            settings = WiseAgentRegistrySettings(config)
+        if settings.use_redis:
+            cls.redis_db = _redis_client(settings)
+            cls._backend = _RedisRegistryBackend(settings, cls.redis_db)
         else:
-            if cls.agents_metadata_dict.get(agent_name) is not None:
-                raise NameError(f"Agent with name {agent_name} already exists")
-        cls.agents_metadata_dict[agent_name] = agent_metadata
+            cls.redis_db = None
+            cls._backend = _InMemoryRegistryBackend(settings, cls.agents_metadata_dict, cls.agents_replicas,
+                                                    cls.contexts, cls.tools, cls.contexts_last_access)
+        cls.config = settings
+        cls._context_sweeper_wakeup.set()
+        cls._agent_heartbeat_wakeup.set()
+
+    @classmethod
+    def _get_backend(cls) -> _RegistryBackend:
+        backend = cls._backend
+        if backend is None:
+            cls.get_config()
+            backend = cls._backend
+        return backend
+    
+    @classmethod
+    def register_agent(cls, agent_name : str, agent_metadata :WiseAgentMetaData, replica_id: Optional[str] = None) -> str:
+        """
+        Register an agent with the registry. Registering an agent name already registered with the same metadata
+        registers a new replica of the agent, the agent is kept in the registry until all its replicas are unregistered.
+        With redis, a background thread sends the heartbeats of the replicas registered by this process, so the
+        replicas which crashed are removed once they haven't sent one for agent_replica_ttl seconds.
+
+        Args:
+            agent_name (str): the name of the agent
+            agent_metadata (WiseAgentMetaData): the metadata of the agent
+            replica_id (Optional[str]): the id of the replica, generated if None
+
+        Returns:
+            str: the id of the replica registered
+        """
+        if replica_id is None:
+            replica_id = uuid.uuid4().hex
+        backend = cls._get_backend()
+        backend.register_agent(agent_name, agent_metadata, replica_id)
+        with cls._agent_heartbeat_lock:
+            cls._agent_replicas[replica_id] = (agent_name, agent_metadata)
+            if backend.settings.use_redis and (cls._agent_heartbeat is None or not cls._agent_heartbeat.is_alive()):
+                cls._agent_heartbeat = threading.Thread(target=cls._send_agent_heartbeats, daemon=True,
+                                                        name="wiseagents-agent-heartbeat")
+                cls._agent_heartbeat.start()
+        return replica_id
+
+    @classmethod
+    def _send_agent_heartbeats(cls):
+        while True:
+            with cls._agent_heartbeat_lock:
+                # the thread stops once the replicas of this process are unregistered
+                if not cls._agent_replicas:
+                    cls._agent_heartbeat = None
+                    return
+                replicas = dict(cls._agent_replicas)
+            try:
+                backend = cls._get_backend()
+                backend.send_agent_heartbeats(replicas)
+                removed = backend.remove_dead_agent_replicas()
+                if removed:
+                    logging.info(f"Removed the agents {removed}, none of their replicas is alive")
+            except Exception as e:
+                logging.error(f"Error while sending the heartbeats of the agents: {e}")
+            if cls._agent_heartbeat_wakeup.wait(cls.get_config().agent_replica_ttl / 3):
+                cls._agent_heartbeat_wakeup.clear()
+
+    @classmethod
+    def remove_dead_agent_replicas(cls) -> List[str]:
+        """
+        Remove the replicas of the agents which haven't sent a heartbeat for agent_replica_ttl seconds (set in the
+        registry configuration), e.g. because they crashed. This is done periodically by a background thread while
+        this process runs replicas, but can also be called directly.
+
+        Returns:
+            List[str]: the names of the agents removed, since none of their replicas is alive anymore
+        """
+        return cls._get_backend().remove_dead_agent_replicas()
+
     @classmethod    
     def register_context(cls, context : WiseAgentContext):
         """
         Register a context with the registry
         """
-        if (cls.does_context_exist(context.name) == True):
+        backend = cls._get_backend()
+        if (backend.does_context_exist(context.name) == True):
             raise NameError(f"Context with name {context.name} already exists")
-        if (cls.get_config().get("use_redis") == True):
-            cls.redis_db.hset("contexts", key=context.name, value=pickle.dumps(context))
-        else:
-            cls.contexts[context.name] = context
+        cls._add_context(backend, context)
+
+    @classmethod
+    def _add_context(cls, backend: _RegistryBackend, context: WiseAgentContext):
+        '''Register a context known not to exist yet, as part of the batch of the context if any.'''
+        backend.register_context(context)
+        if backend.settings.context_ttl is not None:
+            cls._start_context_sweeper()
+
+    @classmethod
+    def _start_context_sweeper(cls):
+        '''Start the thread removing the expired contexts, if it isn't running yet.'''
+        with cls._context_sweeper_lock:
+            if cls._context_sweeper is None or not cls._context_sweeper.is_alive():
+                cls._context_sweeper = threading.Thread(target=cls._sweep_contexts, daemon=True,
+                                                        name="wiseagents-context-sweeper")
+                cls._context_sweeper.start()
+
+    @classmethod
+    def _sweep_contexts(cls):
+        while True:
+            with cls._context_sweeper_lock:
+                # the contexts no longer expire once the settings have been reloaded without context_ttl
+                if cls.get_config().context_ttl is None:
+                    cls._context_sweeper = None
+                    return
+            if cls._context_sweeper_wakeup.wait(cls.get_config().context_sweep_interval):
+                cls._context_sweeper_wakeup.clear()
+                continue
+            try:
+                removed = cls.remove_expired_contexts()
+                if removed:
+                    logging.info(f"Removed {len(removed)} expired contexts, {cls.get_live_context_count()} contexts left")
+            except Exception as e:
+                logging.error(f"Error while removing the expired contexts: {e}")
+
+    @classmethod
+    def remove_expired_contexts(cls) -> List[str]:
+        """
+        Remove the contexts which haven't been accessed for more than context_ttl seconds (set in the registry
+        configuration). This is done periodically by a background thread once a context has been registered,
+        but can also be called directly.
+
+        Returns:
+            List[str]: the names of the contexts removed
+        """
+        backend = cls._get_backend()
+        ttl = backend.settings.context_ttl
+        if ttl is None:
+            return []
+        return backend.remove_expired_contexts(time.time() - ttl)
+
+    @classmethod
+    def migrate_legacy_contexts(cls) -> List[str]:
+        """
+        Migrate the contexts stored in redis by older versions of Wise Agents, as a hash of pickled values named
+        after the context, to the per field layout and register them. This is a one-shot step, to run once after
+        upgrading, before the agents use these contexts.
+
+        Returns:
+            List[str]: the names of the contexts migrated
+        """
+        return cls._get_backend().migrate_legacy_contexts()
+
+    @classmethod
+    def get_live_context_count(cls) -> int:
+        """
+        Get the number of contexts in the registry.
+
+        Returns:
+            int: the number of contexts
+        """
+        return cls._get_backend().get_live_context_count()
     @classmethod    
     def fetch_agents_metadata_dict(cls) -> dict [str, WiseAgentMetaData]:
         """
         Get the dict with the agent names as keys and metadata as values
         """
-        if (cls.get_config().get("use_redis") == True):
-            redis_dict = cls.redis_db.hgetall("agents")
-            return_dictionary : Dict[str, WiseAgentMetaData]= {}
-            for key in redis_dict:
-                return_dictionary[key.decode('utf-8')] = pickle.loads(redis_dict[key])
-            return return_dictionary
-        else:
-            return cls.agents_metadata_dict
+        return cls._get_backend().fetch_agents_metadata_dict()
     
     @classmethod
     def get_contexts(cls) -> dict [str, WiseAgentContext]:
         """
         Get the list of contexts
         """
-        if (cls.get_config().get("use_redis") == True):
-            dictionary = cls.redis_db.hgetall("contexts")
-            return_dictionary : Dict[str, WiseAgentContext]= {}
-            for key in dictionary:
-                 return_dictionary[key] = pickle.loads(dictionary.get(key))
-            return return_dictionary
-        else:
-            return cls.contexts
+        return cls._get_backend().get_contexts()
+    
+    @classmethod
+    def iter_context_names(cls) -> Iterable[str]:
+        """
+        Iterate over the names of the contexts. With redis, the names are read in batches with SSCAN instead of
+        being read at once, so the names of the contexts registered or removed meanwhile may or may not be returned.
+
+        Returns:
+            Iterable[str]: the names of the contexts
+        """
+        return cls._get_backend().iter_context_names()
     
     @classmethod
     def get_agent_metadata(cls, agent_name: str) -> WiseAgentMetaData:
         """
         Get the agent metadata for the agent with the given name
         """
-        if (cls.get_config().get("use_redis") == True):
-            return_byte = cls.redis_db.hget("agents", key=agent_name)
-            if return_byte is not None:
-                return pickle.loads(return_byte)
-            else:  
-                return None
-        else:
-            return cls.agents_metadata_dict.get(agent_name) 
+        return cls._get_backend().get_agent_metadata(agent_name)
     
     @classmethod
     def get_context(cls, context_name: str) -> WiseAgentContext:
-        """ Get the context with the given name """
-        context : WiseAgentContext = None
-        if (cls.get_config().get("use_redis") == True):
-            ctx = cls.redis_db.hget("contexts", key=context_name)
-            if ctx is not None:
-                context : WiseAgentContext = pickle.loads(ctx)
-            else:
-                context = None
-        else:
-            context = cls.contexts.get(context_name)
-        return context
+        """ Get the context with the given name. With redis, a handle reading the fields of the context from redis
+        when they are accessed is returned """
+        return cls._get_backend().get_context(context_name)
 
     @classmethod
     def create_context(cls, context_name: str) -> WiseAgentContext:
@@ -1159,27 +2706,56 @@ class WiseAgentRegistry:
         if ('_' in context_name):
             raise NameError(f"First level Context name {context_name} cannot contain an underscore. If you are trying to create a sub context, use create_sub_context method")
         if (cls.does_context_exist(context_name) == False):
-            return WiseAgentContext(context_name, cls.config)
+            return WiseAgentContext(context_name, cls.get_config())
         else:
             raise NameError(f"Context with name {context_name} already exists")
-    
+
     @classmethod
-    def create_sub_context(cls, parent_context_name: str, sub_context_name: str) -> WiseAgentContext:
-        """
-        Create a sub context with the given name under the parent context with the given name
+    def create_sub_context(cls, parent_context_name: str, sub_context_name: str,
+                           collaboration_type: Optional[WiseAgentCollaborationType] = None,
+                           route_response_to: Optional[str] = None,
+                           agents_sequence: Optional[List[str]] = None,
+                           llm_chat_completion: Optional[List[ChatCompletionMessageParam]] = None,
+                           queries: Optional[List[str]] = None) -> WiseAgentContext:
+        """
+        Create a sub context with the given name under the parent context with the given name.
+        The initial state of the sub context can be given, it is then set in the same batch of updates as the
+        registration of the sub context: with redis, creating the sub context takes two round trips, one checking
+        the contexts exist and one transaction.
         Args:
             parent_context_name (str): the name of the parent context
             sub_context_name (str): the name of the sub context
+            collaboration_type (Optional[WiseAgentCollaborationType]): the collaboration type of the sub context
+            route_response_to (Optional[str]): the name of the agent where the final response should be routed to
+            agents_sequence (Optional[List[str]]): the sequence of agent names
+            llm_chat_completion (Optional[List[ChatCompletionMessageParam]]): the first chat completion messages
+            queries (Optional[List[str]]): the first queries
         Returns:
             WiseAgentContext: the sub context
         """
         if ('_' in sub_context_name):
             raise NameError(f"Sub Context name {sub_context_name} cannot contain an underscore")
-        if cls.does_context_exist(parent_context_name):
-            logging.debug(f"set_collaboration_type (0.0) cls.config: {cls.config}")
-            sub_context = WiseAgentContext(f'{parent_context_name}_{sub_context_name}', cls.config)
-            logging.debug(f"set_collaboration_type (0.1) sub_context: {sub_context} _use_redis: {sub_context._use_redis}")
-    
+        context_name = f'{parent_context_name}_{sub_context_name}'
+        backend = cls._get_backend()
+        parent_exists, sub_context_exists = backend.do_contexts_exist([parent_context_name, context_name])
+        if parent_exists:
+            if sub_context_exists:
+                raise NameError(f"Context with name {context_name} already exists")
+            sub_context = WiseAgentContext.__new__(WiseAgentContext)
+            sub_context._setup(context_name, backend.settings)
+            with sub_context.batch():
+                cls._add_context(backend, sub_context)
+                sub_context._init_redis_state()
+                if collaboration_type is not None:
+                    sub_context.set_collaboration_type(collaboration_type)
+                if route_response_to is not None:
+                    sub_context.set_route_response_to(route_response_to)
+                if agents_sequence is not None:
+                    sub_context.set_agents_sequence(agents_sequence)
+                for message in llm_chat_completion or []:
+                    sub_context.append_chat_completion(message)
+                for query in queries or []:
+                    sub_context.add_query(query)
             return sub_context
         else:
             message = f"Parent context with name {parent_context_name} does not exist"
@@ -1209,10 +2785,7 @@ class WiseAgentRegistry:
             else:
                 raise NameError(f"Parent context with name {parent_context_name} or context with name {context_name} does not exist")
         logging.info(f"Removing context {context_name}")    
-        if (cls.get_config().get("use_redis") == True):
-            cls.redis_db.hdel("contexts", context_name)
-        else:
-            cls.contexts.pop(context_name)
+        cls._get_backend().remove_context(context_name)
         return parent_context
     
     @classmethod
@@ -1220,63 +2793,58 @@ class WiseAgentRegistry:
         """
         Get the context with the given name
         """
-        if (cls.get_config().get("use_redis") == True):
-            return cls.redis_db.hexists("contexts", key=context_name)
-        else:
-            if  cls.contexts.get(context_name) is None:
-                return False
-            else:
-                return True
+        return cls._get_backend().does_context_exist(context_name)
     
     @classmethod
-    def unregister_agent(cls, agent_name: str):
+    def unregister_agent(cls, agent_name: str, replica_id: Optional[str] = None):
         """
-        Remove the agent from the registry this should be used only on agents which already stopped transport connection
-        """
-        if (cls.get_config().get("use_redis") == True):
-            cls.redis_db.hdel("agents", agent_name)
-        else:
-            if cls.agents_metadata_dict.get(agent_name) is not None:
-                cls.agents_metadata_dict.pop(agent_name)
+        Remove a replica of the agent from the registry, the agent is removed once its last replica is unregistered.
+        This should be used only on agents which already stopped transport connection
+
+        Args:
+            agent_name (str): the name of the agent
+            replica_id (Optional[str]): the id returned by register_agent, any replica of the agent registered by
+            this process if None
+        """
+        with cls._agent_heartbeat_lock:
+            if replica_id is None:
+                replica_id = next((replica for replica, (name, _) in cls._agent_replicas.items() if name == agent_name), "")
+            cls._agent_replicas.pop(replica_id, None)
+        cls._get_backend().unregister_agent(agent_name, replica_id)
         
     @classmethod
     def register_tool(cls, tool : WiseAgentTool):
         """
         Register a tool with the registry
         """
-        if (cls.get_config().get("use_redis") == True):
-            cls.redis_db.hset("tools", key=tool.name, value=pickle.dumps(tool))
-        else:
-            cls.tools[tool.name] = tool
+        cls._get_backend().register_tool(tool)
     
     @classmethod
     def get_tools(cls) -> dict[str, WiseAgentTool]:
         """
         Get the list of tools
         """
-        if (cls.get_config().get("use_redis") == True):
-            dictionary = cls.redis_db.hgetall("tools")
-            return_dictionary : Dict[str, WiseAgentTool]= {}
-            for key in dictionary:
-                 return_dictionary[key] = pickle.loads(dictionary.get(key))
-            return return_dictionary
-        else:
-            return cls.tools
+        return cls._get_backend().get_tools()
     
     @classmethod
     def get_tool(cls, tool_name: str) -> WiseAgentTool:
         """
         Get the tool with the given name
         """
-        if (cls.get_config().get("use_redis") == True):
-            pipe = cls.redis_db.pipeline(transaction=True)
-            piped_res= pipe.hexists("tools", key=tool_name).hget("tools", key=tool_name).execute()
-            if piped_res[0]:
-                return pickle.loads(piped_res[1])
-            else:
-                return None
-        else:
-            return cls.tools.get(tool_name)
+        return cls._get_backend().get_tool(tool_name)
+
+    @classmethod
+    def get_tools_OpenAI_format(cls, tool_names: List[str]) -> Tuple[ChatCompletionToolParam, ...]:
+        """
+        Get the tools with the given names in the format expected by the LLM. The schemas are computed once and
+        cached until a tool is registered, they must not be modified.
+
+        Args:
+            tool_names (List[str]): the names of the tools
+        Returns:
+            Tuple[ChatCompletionToolParam, ...]: the tools in the OpenAI format
+        """
+        return cls._get_backend().get_tool_catalog().get_tools_in_chat(tuple(tool_names))
 
     @classmethod
     def get_agent_names_and_descriptions(cls) -> List[str]:
@@ -1286,10 +2854,17 @@ class WiseAgentRegistry:
         Returns:
             List[str]: the list of agent descriptions
         """
-        agent_descriptions = []
-        for agent_name, agent_metadata in cls.fetch_agents_metadata_dict().items():
-            agent_descriptions.append(f"Agent Name: {agent_name} Agent Description: {agent_metadata.description}")
+        return list(cls._get_backend().get_agent_catalog().descriptions)
+
+    @classmethod
+    def get_agent_catalog(cls) -> str:
+        """
+        Get the names and descriptions of the agents, one agent per line, ready to be included in a prompt.
+        The catalog is rendered once and cached until an agent is registered or unregistered.
 
-        return agent_descriptions
+        Returns:
+            str: the catalog of the agents
+        """
+        return cls._get_backend().get_agent_catalog().text
 
 
@@ -0,0 +1,142 @@
+import json
+import pickle
+from abc import abstractmethod
+from typing import Any, Dict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Version of the schema of the objects stored in the registry with the JSON and msgpack codecs,
+# i.e. of the dictionaries returned by the to_dict methods of WiseAgentMetaData and WiseAgentTool
+REGISTRY_SCHEMA_VERSION = 1
+# The first byte of the payloads encoded with msgpack, which is never used by msgpack itself,
+# nor by pickle or a UTF-8 JSON document, so the codec of a payload can be detected
+_MSGPACK_MARKER = b"\xc1"
+
+
+def _plain_value(value: Any) -> Any:
+    '''Convert the values which aren't plain types, e.g. the chat completion messages returned by the
+    openai client, into plain types.'''
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    raise TypeError(f"Object of type {value.__class__.__name__} can't be stored in the registry")
+
+
+class WiseAgentRegistryCodec:
+    '''A codec encoding the values stored in redis by the registry and the contexts, and decoding them back.
+    The codec of a stored value is detected when it is decoded, so values stored with different codecs
+    (e.g. during a rolling upgrade) can be read whatever the codec configured.'''
+
+    name : str = None
+    # Whether the codec stores objects as they are, or only plain types (dictionaries, lists, strings, numbers)
+    preserves_objects : bool = False
+
+    @abstractmethod
+    def encode(self, value: Any) -> bytes:
+        '''Encode the given value.
+
+        Args:
+            value (Any): the value to encode'''
+        ...
+
+    @abstractmethod
+    def decode(self, payload: bytes) -> Any:
+        '''Decode the given payload into a value.
+
+        Args:
+            payload (bytes): the payload to decode'''
+        ...
+
+
+class PickleWiseAgentRegistryCodec(WiseAgentRegistryCodec):
+    '''A codec using pickle. This is the format used by the older versions of Wise Agents.'''
+
+    name = "pickle"
+    preserves_objects = True
+
+    def encode(self, value: Any) -> bytes:
+        return pickle.dumps(value)
+
+    def decode(self, payload: bytes) -> Any:
+        return pickle.loads(payload)
+
+
+class JSONWiseAgentRegistryCodec(WiseAgentRegistryCodec):
+    '''A codec using JSON, which can be read by tools not written in Python.'''
+
+    name = "json"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(',', ':'), default=_plain_value).encode("utf-8")
+
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload)
+
+
+class MsgpackWiseAgentRegistryCodec(WiseAgentRegistryCodec):
+    '''A codec using msgpack. It requires the optional msgpack package.'''
+
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("The msgpack codec requires the msgpack package, install it with 'pip install msgpack'")
+
+    def encode(self, value: Any) -> bytes:
+        return _MSGPACK_MARKER + msgpack.packb(value, default=_plain_value)
+
+    def decode(self, payload: bytes) -> Any:
+        return msgpack.unpackb(payload[len(_MSGPACK_MARKER):])
+
+
+_CODECS : Dict[str, type] = {"pickle": PickleWiseAgentRegistryCodec,
+                             "json": JSONWiseAgentRegistryCodec,
+                             "msgpack": MsgpackWiseAgentRegistryCodec}
+
+_codec_instances : Dict[str, WiseAgentRegistryCodec] = {}
+
+
+def get_registry_codec(name: str) -> WiseAgentRegistryCodec:
+    '''Get the codec with the given name.
+
+    Args:
+        name (str): the name of the codec, one of pickle, json or msgpack
+
+    Returns:
+        WiseAgentRegistryCodec: the codec'''
+    codec = _codec_instances.get(name)
+    if codec is None:
+        if name not in _CODECS:
+            raise ValueError(f"Unknown registry codec {name}, supported codecs are {', '.join(_CODECS.keys())}")
+        codec = _CODECS[name]()
+        _codec_instances[name] = codec
+    return codec
+
+
+def get_registry_codec_for_payload(payload: bytes) -> WiseAgentRegistryCodec:
+    '''Get the codec to decode the given payload, according to its first bytes.
+
+    Args:
+        payload (bytes): the payload to decode
+
+    Returns:
+        WiseAgentRegistryCodec: the codec'''
+    # pickle payloads start with the PROTO opcode followed by the protocol version (2 or more)
+    if len(payload) > 1 and payload[0] == 0x80 and 2 <= payload[1] <= pickle.HIGHEST_PROTOCOL:
+        return get_registry_codec("pickle")
+    if payload[:len(_MSGPACK_MARKER)] == _MSGPACK_MARKER:
+        return get_registry_codec("msgpack")
+    return get_registry_codec("json")
+
+
+def decode_registry_payload(payload: bytes) -> Any:
+    '''Decode the given payload with the codec it was encoded with.
+
+    Args:
+        payload (bytes): the payload to decode
+
+    Returns:
+        Any: the value decoded'''
+    return get_registry_codec_for_payload(payload).decode(payload)
@@ -5,7 +5,9 @@
 # Define any necessary initialization code here
 
 from wiseagents.transports.stomp import StompWiseAgentTransport
+from wiseagents.transports.in_memory import InMemoryWiseAgentTransport
+from wiseagents.transports.redis_streams import RedisStreamsWiseAgentTransport
 
 
 # Optionally, you can define __all__ to specify the public interface of the package
-__all__ = ['StompWiseAgentTransport']
+__all__ = ['StompWiseAgentTransport', 'InMemoryWiseAgentTransport', 'RedisStreamsWiseAgentTransport']
@@ -0,0 +1,160 @@
+import json
+import zlib
+from abc import abstractmethod
+from typing import Dict, Optional, Tuple, Union
+
+import yaml
+
+from wiseagents import WiseAgentMessage
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Version of the schema of the messages encoded with the JSON and msgpack codecs,
+# i.e. of the dictionary returned by WiseAgentMessage.to_dict
+MESSAGE_SCHEMA_VERSION = 1
+_MESSAGE_CONTENT_TYPE_PREFIX = "application/vnd.wiseagents.message"
+# The content encoding of the compressed bodies
+DEFLATE_CONTENT_ENCODING = "deflate"
+
+
+class WiseAgentMessageCodec:
+    '''A codec encoding WiseAgentMessage objects into the body of the messages sent by a transport,
+    and decoding them back. The content type identifies the codec (and the schema version) on the wire.'''
+
+    content_type : str = None
+
+    @abstractmethod
+    def encode(self, message: WiseAgentMessage) -> Union[str, bytes]:
+        '''Encode the given message.
+
+        Args:
+            message (WiseAgentMessage): the message to encode'''
+        ...
+
+    @abstractmethod
+    def decode(self, body: Union[str, bytes]) -> WiseAgentMessage:
+        '''Decode the given body into a message.
+
+        Args:
+            body (Union[str, bytes]): the body to decode'''
+        ...
+
+
+class JSONWiseAgentMessageCodec(WiseAgentMessageCodec):
+    '''A codec using JSON.'''
+
+    content_type = f"{_MESSAGE_CONTENT_TYPE_PREFIX}.v{MESSAGE_SCHEMA_VERSION}+json"
+
+    def encode(self, message: WiseAgentMessage) -> bytes:
+        return json.dumps(message.to_dict(), separators=(',', ':')).encode("utf-8")
+
+    def decode(self, body: Union[str, bytes]) -> WiseAgentMessage:
+        return WiseAgentMessage.from_dict(json.loads(body))
+
+
+class MsgpackWiseAgentMessageCodec(WiseAgentMessageCodec):
+    '''A codec using msgpack. It requires the optional msgpack package.'''
+
+    content_type = f"{_MESSAGE_CONTENT_TYPE_PREFIX}.v{MESSAGE_SCHEMA_VERSION}+msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("The msgpack codec requires the msgpack package, install it with 'pip install msgpack'")
+
+    def encode(self, message: WiseAgentMessage) -> bytes:
+        return msgpack.packb(message.to_dict())
+
+    def decode(self, body: Union[str, bytes]) -> WiseAgentMessage:
+        return WiseAgentMessage.from_dict(msgpack.unpackb(body))
+
+
+class YAMLWiseAgentMessageCodec(WiseAgentMessageCodec):
+    '''A codec using a YAML dump of the message. This is the format used by the peers which don't send a
+    content type, it is the default of the StompWiseAgentTransport so they can read the messages sent.'''
+
+    content_type = "application/x-yaml"
+
+    def encode(self, message: WiseAgentMessage) -> str:
+        return yaml.dump(message)
+
+    def decode(self, body: Union[str, bytes]) -> WiseAgentMessage:
+        return yaml.load(body, yaml.Loader)
+
+
+_CODECS : Dict[str, type] = {"json": JSONWiseAgentMessageCodec,
+                             "msgpack": MsgpackWiseAgentMessageCodec,
+                             "yaml": YAMLWiseAgentMessageCodec}
+
+_codec_instances : Dict[str, WiseAgentMessageCodec] = {}
+
+
+def get_codec(name: str) -> WiseAgentMessageCodec:
+    '''Get the codec with the given name.
+
+    Args:
+        name (str): the name of the codec, one of json, msgpack or yaml
+
+    Returns:
+        WiseAgentMessageCodec: the codec'''
+    codec = _codec_instances.get(name)
+    if codec is None:
+        if name not in _CODECS:
+            raise ValueError(f"Unknown message codec {name}, supported codecs are {', '.join(_CODECS.keys())}")
+        codec = _CODECS[name]()
+        _codec_instances[name] = codec
+    return codec
+
+
+def get_codec_for_content_type(content_type: Optional[str]) -> WiseAgentMessageCodec:
+    '''Get the codec to decode a body with the given content type. The YAML codec is returned when no
+    content type is given, since this is what the peers which don't set it send.
+
+    Args:
+        content_type (Optional[str]): the content type of the body
+
+    Returns:
+        WiseAgentMessageCodec: the codec'''
+    if content_type is None or not content_type.startswith(_MESSAGE_CONTENT_TYPE_PREFIX):
+        return get_codec("yaml")
+    content_type = content_type.split(";")[0].strip()
+    for name, codec_class in _CODECS.items():
+        if codec_class.content_type == content_type:
+            return get_codec(name)
+    raise ValueError(f"Unsupported message content type {content_type}")
+
+
+def compress_body(body: Union[str, bytes], threshold: Optional[int]) -> Tuple[Union[str, bytes], Optional[str]]:
+    '''Compress the given encoded message with zlib if it is at least threshold bytes long.
+
+    Args:
+        body (Union[str, bytes]): the body to compress
+        threshold (Optional[int]): the minimum size of the bodies to compress, None to never compress them
+
+    Returns:
+        Tuple[Union[str, bytes], Optional[str]]: the body to send, and its content encoding if it has been compressed'''
+    if threshold is None:
+        return body, None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if len(body) < threshold:
+        return body, None
+    return zlib.compress(body), DEFLATE_CONTENT_ENCODING
+
+
+def decompress_body(body: Union[str, bytes], content_encoding: Optional[str]) -> Union[str, bytes]:
+    '''Decompress the given body according to its content encoding.
+
+    Args:
+        body (Union[str, bytes]): the body received
+        content_encoding (Optional[str]): the content encoding of the body, None if it isn't compressed
+
+    Returns:
+        Union[str, bytes]: the encoded message'''
+    if content_encoding is None:
+        return body
+    if content_encoding != DEFLATE_CONTENT_ENCODING:
+        raise ValueError(f"Unsupported message content encoding {content_encoding}")
+    return zlib.decompress(body)
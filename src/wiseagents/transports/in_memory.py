@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+from typing import Dict, Optional
+
+from wiseagents import WiseAgentMessage, WiseAgentTransport
+
+_STOP = object()
+
+
+class InMemoryWiseAgentTransport(WiseAgentTransport):
+    '''A transport for sending messages between agents living in the same process.
+
+    Messages are handed over by reference through per-agent request and response queues, so there is
+    no serialization and no broker round trip. Messages sent to an agent which has not started yet are
+    kept in its queue and delivered once it starts. Since the receiver gets the very same WiseAgentMessage
+    object, a message must not be modified once it has been sent.'''
+
+    yaml_tag = u'!wiseagents.transports.InMemoryWiseAgentTransport'
+
+    # Maps an agent name to the queue holding the requests (or responses) sent to it
+    _request_queues : Dict[str, queue.Queue] = {}
+    _response_queues : Dict[str, queue.Queue] = {}
+    _queues_lock = threading.Lock()
+
+    def __init__(self, agent_name: str):
+        '''Initialize the transport.
+
+        Args:
+            agent_name (str): the agent name'''
+        self._agent_name = agent_name
+
+    def __repr__(self) -> str:
+        return f"agent_name={self._agent_name}"
+
+    def __getstate__(self) -> object:
+        '''Return the state of the transport. Removing the dispatcher threads to avoid they are serialized/deserialized by pyyaml.'''
+        state = super().__getstate__()
+        state.pop('request_thread', None)
+        state.pop('response_thread', None)
+        return state
+
+    @classmethod
+    def _get_queue(cls, queues: Dict[str, queue.Queue], agent_name: str) -> queue.Queue:
+        '''Get the queue for the given agent, creating it if needed.'''
+        with cls._queues_lock:
+            agent_queue = queues.get(agent_name)
+            if agent_queue is None:
+                agent_queue = queue.Queue()
+                queues[agent_name] = agent_queue
+            return agent_queue
+
+    def _dispatch(self, agent_queue: queue.Queue, receiver_name: str):
+        '''Deliver the messages put in the given queue to the receiver callback with the given name until the transport is stopped.'''
+        while True:
+            message = agent_queue.get()
+            if message is _STOP:
+                return
+            if receiver_name == 'request_receiver' and message.is_expired():
+                logging.getLogger(__name__).info(f"Dropping expired request {message} for agent {self.agent_name}")
+                continue
+            try:
+                getattr(self, receiver_name)(message)
+            except Exception as e:
+                logging.getLogger(__name__).exception(f"Error processing {message} for agent {self.agent_name}")
+                if self.error_receiver is not None:
+                    self.error_receiver(e)
+
+    def start(self):
+        '''Start the transport, delivering the messages sent to this agent on two dispatcher threads.'''
+        if getattr(self, '_request_thread', None) is not None and self._request_thread.is_alive():
+            return
+        self._request_thread = threading.Thread(target=self._dispatch, daemon=True,
+                                                name=f"InMemoryTransport-request-{self.agent_name}",
+                                                args=(self._get_queue(self._request_queues, self.agent_name), 'request_receiver'))
+        self._response_thread = threading.Thread(target=self._dispatch, daemon=True,
+                                                 name=f"InMemoryTransport-response-{self.agent_name}",
+                                                 args=(self._get_queue(self._response_queues, self.agent_name), 'response_receiver'))
+        self._request_thread.start()
+        self._response_thread.start()
+
+    def send_request(self, message: WiseAgentMessage, dest_agent_name: str):
+        '''Send a request message to an agent.
+
+        Args:
+            message (WiseAgentMessage): the message to send
+            dest_agent_name (str): the destination agent name'''
+        logging.getLogger(__name__).debug(f"Sending request {message} to {dest_agent_name}")
+        self._get_queue(self._request_queues, dest_agent_name).put(message)
+
+    def send_response(self, message: WiseAgentMessage, dest_agent_name: str):
+        '''Send a response message to an agent.
+
+        Args:
+            message (WiseAgentMessage): the message to send
+            dest_agent_name (str): the destination agent name'''
+        self._get_queue(self._response_queues, dest_agent_name).put(message)
+
+    def stop(self):
+        '''Stop the transport. Messages already queued for this agent are delivered before the dispatcher threads exit.'''
+        request_thread : Optional[threading.Thread] = getattr(self, '_request_thread', None)
+        response_thread : Optional[threading.Thread] = getattr(self, '_response_thread', None)
+        if request_thread is not None and request_thread.is_alive():
+            self._get_queue(self._request_queues, self.agent_name).put(_STOP)
+            if request_thread is not threading.current_thread():
+                request_thread.join()
+        if response_thread is not None and response_thread.is_alive():
+            self._get_queue(self._response_queues, self.agent_name).put(_STOP)
+            if response_thread is not threading.current_thread():
+                response_thread.join()
+        self._request_thread = None
+        self._response_thread = None
+
+    @property
+    def agent_name(self) -> str:
+        '''Get the agent name.'''
+        return self._agent_name
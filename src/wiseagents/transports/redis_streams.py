@@ -0,0 +1,414 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from wiseagents import WiseAgentMessage, WiseAgentRegistry, WiseAgentTransport
+from wiseagents.core import _redis_client
+from wiseagents.transports.codec import WiseAgentMessageCodec, get_codec, get_codec_for_content_type
+from wiseagents.transports.worker_pool import OrderedWorkerPool
+
+
+class RedisStreamsWiseAgentTransport(WiseAgentTransport):
+    '''A transport for sending messages between agents using Redis streams, for deployments already running Redis
+    which don't want to run a STOMP broker.
+
+    Each agent reads its requests from the <redis_db>:wiseagents:request:<agent name> stream and its responses from
+    the <redis_db>:wiseagents:response:<agent name> stream, where redis_db is the one of the registry configuration,
+    through a consumer group named after the agent: the replicas of an agent are competing consumers of its
+    streams. Like with the StompWiseAgentTransport, each replica also reads the responses to the requests it sent
+    from its own reply stream. The entries are read in batches and acknowledged once handled, and a replica
+    regularly resets the idle time of the entries it is handling. The requests and responses left pending by a
+    replica which hasn't read its streams for reclaim_idle_time seconds (e.g. because it crashed) are claimed by
+    the other replicas, which then remove it from the consumer groups and delete its reply stream. The connection
+    settings other than the host and port (e.g. SSL and authentication) and the connection pool are the ones of
+    the registry.'''
+
+    yaml_tag = u'!wiseagents.transports.RedisStreamsWiseAgentTransport'
+    _redis : redis.Redis = None
+    _reader : threading.Thread = None
+    _keeper : threading.Thread = None
+    # Maps each stream to the ids of the entries this replica has read and not acknowledged yet
+    _in_flight : Dict[str, set] = None
+    _in_flight_lock : threading.Lock = None
+    _request_pool : OrderedWorkerPool = None
+    _stopping : threading.Event = None
+    _instance_id : str = None
+    # Maps (context name, agent name) to the reply stream of the replica of the agent which sent the last request
+    # received for the context, the least recently used entries are evicted once reply_to_cache_size is reached
+    _reply_to : OrderedDict = None
+    _reply_to_lock : threading.Lock = None
+    reply_to_cache_size : int = 1000
+
+    def __new__(cls, *args, **kwargs):
+        '''Create a new instance of the class, setting default values for the optional instance variables.'''
+        obj = super().__new__(cls)
+        obj._request_workers = 1
+        obj._batch_size = 10
+        obj._codec = "json"
+        obj._reclaim_idle_time = 60
+        obj._max_stream_length = 10000
+        return obj
+
+    def __init__(self, host: str, port: int, agent_name: str, request_workers: Optional[int] = 1,
+                 batch_size: Optional[int] = 10, codec: Optional[str] = "json",
+                 reclaim_idle_time: Optional[float] = 60, max_stream_length: Optional[int] = 10000):
+        '''Initialize the transport.
+
+        Args:
+            host (str): the host of the Redis server
+            port (int): the port of the Redis server
+            agent_name (str): the agent name
+            request_workers (Optional[int]): the number of threads handling the received requests, requests for
+            the same context are always handled in order by the same thread
+            batch_size (Optional[int]): the maximum number of entries read at once, a new batch is read once all
+            the requests of the previous one have been handed over to the request workers
+            codec (Optional[str]): the codec used to encode the messages sent, one of json, msgpack or yaml
+            reclaim_idle_time (Optional[float]): the number of seconds after which the requests and responses read
+            but not acknowledged by another replica which hasn't read its streams since (e.g. because it crashed)
+            are claimed by this one
+            max_stream_length (Optional[int]): the approximate maximum number of entries kept in the streams'''
+        self._host = host
+        self._port = port
+        self._agent_name = agent_name
+        self._request_workers = request_workers
+        self._batch_size = batch_size
+        self._codec = codec
+        self._reclaim_idle_time = reclaim_idle_time
+        self._max_stream_length = max_stream_length
+
+    def __repr__(self) -> str:
+        return f"host={self._host}, port={self._port}, agent_name={self._agent_name}"
+
+    def __getstate__(self) -> object:
+        '''Return the state of the transport. Removing the runtime instance variables to avoid they are serialized/deserialized by pyyaml.'''
+        state = super().__getstate__()
+        for key in ('redis', 'reader', 'keeper', 'in_flight', 'in_flight_lock', 'request_pool', 'stopping',
+                    'instance_id', 'reply_to', 'reply_to_lock'):
+            state.pop(key, None)
+        return state
+
+    def start(self):
+        '''Start the transport, creating the consumer groups if needed and starting the thread reading the streams.'''
+        if self._redis is not None:
+            return
+        # fail early if the codec is unknown or not available
+        self.message_codec
+        self._instance_id = uuid.uuid4().hex
+        self._reply_to = OrderedDict()
+        self._reply_to_lock = threading.Lock()
+        self._in_flight = {self.request_stream: set(), self.response_stream: set(), self.reply_stream: set()}
+        self._in_flight_lock = threading.Lock()
+        # use the authentication, SSL and pool settings of the registry, with the host and port of the transport
+        self._redis = _redis_client(dict(WiseAgentRegistry.get_config(), redis_host=self.host, redis_port=self.port))
+        for stream in (self.request_stream, self.response_stream, self.reply_stream):
+            try:
+                # read from the beginning, so the messages sent before the agent started are delivered
+                self._redis.xgroup_create(stream, self.agent_name, id='0', mkstream=True)
+            except redis.ResponseError as e:
+                if not str(e).startswith("BUSYGROUP"):
+                    raise
+        self._request_pool = OrderedWorkerPool(workers=self.request_workers, max_in_flight=self.batch_size,
+                                               name=f"RedisStreamsTransport-{self.agent_name}")
+        self._stopping = threading.Event()
+        self._reader = threading.Thread(target=self._read, daemon=True, name=f"RedisStreamsTransport-{self.agent_name}")
+        self._reader.start()
+        self._keeper = threading.Thread(target=self._keep_in_flight, daemon=True,
+                                        name=f"RedisStreamsTransport-{self.agent_name}-keeper")
+        self._keeper.start()
+
+    def _read(self):
+        '''Read the entries of the streams of the agent in batches until the transport is stopped.'''
+        streams = {self.request_stream: '>', self.response_stream: '>', self.reply_stream: '>'}
+        last_reclaim = time.monotonic()
+        # the other replicas consider this one dead once it hasn't read its streams for reclaim_idle_time seconds
+        block = max(1, min(1000, int(self.reclaim_idle_time * 500)))
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - last_reclaim >= self.reclaim_idle_time:
+                    self._reclaim()
+                    last_reclaim = time.monotonic()
+                batches = [(stream.decode("utf-8"), entries) for stream, entries in
+                           self._redis.xreadgroup(self.agent_name, self.instance_id, streams,
+                                                  count=self.batch_size, block=block) or []]
+                # the entries of the batch waiting for a request worker are pending too
+                for stream, entries in batches:
+                    self._add_in_flight(stream, [entry_id for entry_id, _ in entries])
+                for stream, entries in batches:
+                    for entry_id, fields in entries:
+                        self._dispatch(stream, entry_id, fields)
+            except Exception as e:
+                if self._stopping.is_set():
+                    return
+                logging.getLogger(__name__).exception(f"Error reading the streams of agent {self.agent_name}")
+                if self.error_receiver is not None:
+                    self.error_receiver(e)
+                self._stopping.wait(1)
+
+    def _keep_in_flight(self):
+        '''Reset the idle time of the entries this replica is handling until the transport is stopped, so the other
+        replicas don't claim them even when handling them takes longer than reclaim_idle_time.'''
+        while not self._stopping.wait(self.reclaim_idle_time / 3):
+            try:
+                with self._in_flight_lock:
+                    in_flight = [(stream, list(entry_ids)) for stream, entry_ids in self._in_flight.items() if entry_ids]
+                for stream, entry_ids in in_flight:
+                    self._redis.xclaim(stream, self.agent_name, self.instance_id, min_idle_time=0,
+                                       message_ids=entry_ids, justid=True)
+            except Exception:
+                if self._stopping.is_set():
+                    return
+                logging.getLogger(__name__).exception(f"Error refreshing the entries handled by agent {self.agent_name}")
+
+    def _dead_consumers(self, stream: str) -> Dict[str, int]:
+        '''Get the other replicas which haven't read the given stream for reclaim_idle_time seconds.
+
+        Returns:
+            Dict[str, int]: the number of entries left pending by each of them'''
+        return {consumer['name'].decode("utf-8"): consumer['pending']
+                for consumer in self._redis.xinfo_consumers(stream, self.agent_name)
+                if consumer['name'].decode("utf-8") != self.instance_id and consumer['idle'] >= self.reclaim_idle_time * 1000}
+
+    def _reclaim(self):
+        '''Claim the requests and responses left pending by the replicas which haven't read their streams for
+        reclaim_idle_time seconds, then remove the dead replicas which have no pending entry left and their reply
+        streams. The live replicas keep reading their streams and resetting the idle time of the entries they are
+        handling, so their entries are never claimed. The reply streams aren't reclaimed: they are only read by the
+        replica they belong to.'''
+        min_idle_time = int(self.reclaim_idle_time * 1000)
+        dead_consumers = {stream: self._dead_consumers(stream) for stream in (self.request_stream, self.response_stream)}
+        for stream, consumers in dead_consumers.items():
+            for consumer, pending in consumers.items():
+                if pending == 0:
+                    continue
+                entry_ids = [entry['message_id'] for entry in
+                             self._redis.xpending_range(stream, self.agent_name, min='-', max='+', count=self.batch_size,
+                                                        consumername=consumer, idle=min_idle_time)]
+                if len(entry_ids) == 0:
+                    continue
+                claimed = self._redis.xclaim(stream, self.agent_name, self.instance_id, min_idle_time=min_idle_time,
+                                             message_ids=entry_ids)
+                self._add_in_flight(stream, [entry_id for entry_id, _ in claimed])
+                for entry_id, fields in claimed:
+                    # entries deleted by the trimming of the stream are returned without fields
+                    if fields:
+                        logging.getLogger(__name__).info(f"Agent {self.agent_name} reclaimed entry {entry_id} of stream {stream}")
+                        self._dispatch(stream, entry_id, fields)
+                    else:
+                        self._ack(stream, entry_id)
+        # a replica reads all its streams at once, it is dead once idle on all of them
+        request_consumers, response_consumers = dead_consumers.values()
+        for consumer in request_consumers.keys() & response_consumers.keys():
+            if request_consumers[consumer] == 0 and response_consumers[consumer] == 0:
+                logging.getLogger(__name__).info(f"Agent {self.agent_name} removes dead replica {consumer}")
+                pipe = self._redis.pipeline(transaction=False)
+                pipe.xgroup_delconsumer(self.request_stream, self.agent_name, consumer)
+                pipe.xgroup_delconsumer(self.response_stream, self.agent_name, consumer)
+                pipe.delete(self._reply_stream(consumer))
+                pipe.execute()
+
+    def _add_in_flight(self, stream: str, entry_ids: List[bytes]):
+        '''Remember the given entries of the given stream are being handled by this replica.'''
+        with self._in_flight_lock:
+            self._in_flight[stream].update(entry_ids)
+
+    def _ack(self, stream: str, entry_id: bytes):
+        '''Acknowledge the given entry of the given stream once handled.'''
+        self._redis.xack(stream, self.agent_name, entry_id)
+        with self._in_flight_lock:
+            self._in_flight[stream].discard(entry_id)
+
+    def _dispatch(self, stream: str, entry_id: bytes, fields: Dict[bytes, bytes]):
+        '''Deliver the given entry to the request or response receiver, acknowledging it once handled.'''
+        try:
+            message = get_codec_for_content_type(self._field(fields, 'content_type')).decode(fields[b'body'])
+        except Exception as e:
+            # acknowledge the entries which can't be decoded, they would be claimed again and again otherwise
+            logging.getLogger(__name__).exception(f"Dropping entry {entry_id} of stream {stream} which can't be decoded")
+            self._ack(stream, entry_id)
+            if self.error_receiver is not None:
+                self.error_receiver(e)
+            return
+        if stream != self.request_stream:
+            try:
+                self.response_receiver(message)
+            finally:
+                self._ack(stream, entry_id)
+            return
+        self._remember_reply_to(message, self._field(fields, 'reply_to'))
+        def handle():
+            try:
+                if message.is_expired():
+                    logging.getLogger(__name__).info(f"Dropping expired request {message} for agent {self.agent_name}")
+                    return
+                self.request_receiver(message)
+            finally:
+                self._ack(stream, entry_id)
+        self._request_pool.submit(message.context_name, handle)
+
+    @staticmethod
+    def _field(fields: Dict[bytes, bytes], name: str) -> Optional[str]:
+        '''Get the value of the field with the given name of an entry, None if the entry doesn't have it.'''
+        value = fields.get(name.encode("utf-8"))
+        return value.decode("utf-8") if value is not None else None
+
+    def _remember_reply_to(self, message: WiseAgentMessage, reply_to: Optional[str]):
+        '''Remember the reply stream of the replica which sent the given request, to route the response to it.'''
+        if reply_to is None or message.sender is None:
+            return
+        with self._reply_to_lock:
+            key = (message.context_name, message.sender)
+            self._reply_to[key] = reply_to
+            self._reply_to.move_to_end(key)
+            while len(self._reply_to) > self.reply_to_cache_size:
+                self._reply_to.popitem(last=False)
+
+    def _get_reply_to(self, context_name: str, dest_agent_name: str) -> Optional[str]:
+        '''Get the reply stream of the replica of the given agent which sent the last request received for the given context.'''
+        with self._reply_to_lock:
+            return self._reply_to.get((context_name, dest_agent_name))
+
+    def _forget_reply_to(self, context_name: str, dest_agent_name: str):
+        '''Forget the reply stream of the given agent for the given context, once its replica is gone.'''
+        with self._reply_to_lock:
+            self._reply_to.pop((context_name, dest_agent_name), None)
+
+    def _entry(self, message: WiseAgentMessage, **fields: str) -> Dict[str, bytes]:
+        '''Encode the given message into the fields of a stream entry.'''
+        codec = self.message_codec
+        entry = {'body': codec.encode(message), 'content_type': codec.content_type}
+        entry.update(fields)
+        return entry
+
+    def send_request(self, message: WiseAgentMessage, dest_agent_name: str):
+        '''Send a request message to an agent.
+
+        Args:
+            message (WiseAgentMessage): the message to send
+            dest_agent_name (str): the destination agent name'''
+        self.send_requests([(message, dest_agent_name)])
+
+    def send_requests(self, requests: List[Tuple[WiseAgentMessage, str]]):
+        '''Send several request messages at once, in a single round trip to Redis.
+
+        Args:
+            requests (List[Tuple[WiseAgentMessage, str]]): the messages to send, with their destination agent name'''
+        if self._redis is None:
+            self.start()
+        pipe = self._redis.pipeline(transaction=False)
+        for message, dest_agent_name in requests:
+            logging.getLogger(__name__).debug(f"Sending request {message} to {dest_agent_name}")
+            pipe.xadd(self._stream('request', dest_agent_name), self._entry(message, reply_to=self.reply_stream),
+                      maxlen=self.max_stream_length, approximate=True)
+        pipe.execute()
+
+    def send_response(self, message: WiseAgentMessage, dest_agent_name: str):
+        '''Send a response message to an agent. The response is sent to the reply stream of the replica of the agent
+        which sent the last request received for the context of the message if any and if this replica is still
+        running, otherwise to the response stream of the agent.
+
+        Args:
+            message (WiseAgentMessage): the message to send
+            dest_agent_name (str): the destination agent name'''
+        if self._redis is None:
+            self.start()
+        entry = self._entry(message)
+        reply_to = self._get_reply_to(message.context_name, dest_agent_name)
+        # the reply stream is deleted with its consumer group once the replica is stopped or dead, don't recreate it
+        if reply_to is not None and self._redis.xadd(reply_to, entry, maxlen=self.max_stream_length, approximate=True,
+                                                     nomkstream=True) is not None:
+            return
+        if reply_to is not None:
+            self._forget_reply_to(message.context_name, dest_agent_name)
+        self._redis.xadd(self._stream('response', dest_agent_name), entry, maxlen=self.max_stream_length, approximate=True)
+
+    def stop(self):
+        '''Stop the transport, waiting for the requests being handled to be acknowledged.'''
+        if self._redis is None:
+            return
+        self._stopping.set()
+        for thread in (self._reader, self._keeper):
+            if thread is not threading.current_thread():
+                thread.join()
+        self._request_pool.shutdown()
+        # leave the consumer groups unless entries are still pending, they are then claimed by the other replicas
+        # which remove this replica once done
+        pipe = self._redis.pipeline(transaction=False)
+        for stream in (self.request_stream, self.response_stream):
+            pipe.xpending_range(stream, self.agent_name, min='-', max='+', count=1, consumername=self.instance_id)
+        if not any(pipe.execute()):
+            pipe.xgroup_delconsumer(self.request_stream, self.agent_name, self.instance_id)
+            pipe.xgroup_delconsumer(self.response_stream, self.agent_name, self.instance_id)
+        # nobody else reads the reply stream of this replica
+        pipe.delete(self.reply_stream)
+        pipe.execute()
+        # the connection pool is shared with the registry, close only this client
+        self._redis.close()
+        self._redis = None
+
+    @staticmethod
+    def _stream(kind: str, agent_name: str) -> str:
+        '''Get the name of the stream of the given kind (request or response) of the given agent, prefixed like the
+        other redis keys with the redis_db of the registry configuration.'''
+        return f"{WiseAgentRegistry.get_config().redis_namespace}wiseagents:{kind}:{agent_name}"
+
+    def _reply_stream(self, instance_id: str) -> str:
+        '''Get the reply stream of the replica of the agent with the given id.'''
+        return f"{self.response_stream}.{instance_id}"
+
+    @property
+    def host(self) -> str:
+        '''Get the host.'''
+        return self._host
+    @property
+    def port(self) -> int:
+        '''Get the port.'''
+        return self._port
+    @property
+    def agent_name(self) -> str:
+        '''Get the agent name.'''
+        return self._agent_name
+    @property
+    def request_workers(self) -> int:
+        '''Get the number of threads handling the received requests.'''
+        return self._request_workers
+    @property
+    def batch_size(self) -> int:
+        '''Get the maximum number of entries read at once.'''
+        return self._batch_size
+    @property
+    def codec(self) -> str:
+        '''Get the name of the codec used to encode the messages sent.'''
+        return self._codec
+    @property
+    def message_codec(self) -> WiseAgentMessageCodec:
+        '''Get the codec used to encode the messages sent.'''
+        return get_codec(self.codec)
+    @property
+    def reclaim_idle_time(self) -> float:
+        '''Get the number of seconds after which the requests left pending by another replica are claimed.'''
+        return self._reclaim_idle_time
+    @property
+    def max_stream_length(self) -> int:
+        '''Get the approximate maximum number of entries kept in the streams.'''
+        return self._max_stream_length
+    @property
+    def instance_id(self) -> Optional[str]:
+        '''Get the id of this replica of the agent, generated when the transport is started.'''
+        return self._instance_id
+    @property
+    def request_stream(self) -> str:
+        '''Get the request stream.'''
+        return self._stream('request', self.agent_name)
+    @property
+    def response_stream(self) -> str:
+        '''Get the response stream.'''
+        return self._stream('response', self.agent_name)
+    @property
+    def reply_stream(self) -> str:
+        '''Get the reply stream of this replica of the agent.'''
+        return self._reply_stream(self.instance_id)
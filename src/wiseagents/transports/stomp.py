@@ -1,34 +1,44 @@
+import itertools
 import logging
 import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
 
 import stomp
 import stomp.utils
-import yaml
 
 from wiseagents import WiseAgentMessage, WiseAgentTransport
+from wiseagents.transports.codec import (WiseAgentMessageCodec, compress_body, decompress_body, get_codec,
+                                         get_codec_for_content_type)
+from wiseagents.transports.worker_pool import OrderedWorkerPool
 
 
 class WiseAgentRequestQueueListener(stomp.ConnectionListener):
     '''A listener for the request queue.'''
-    
+
     def __init__(self, transport: WiseAgentTransport):
         '''Initialize the listener.
 
         Args:
             '''
         self.transport = transport
-    
+
     def on_event(self, event):
         '''Handle an event.'''
         self.transport.event_receiver(event)
-        
+
     def on_error(self, error):
         '''Handle an error.'''
         self.transport.error_receiver(error)
 
     def on_message(self, message: stomp.utils.Frame):
-        '''Handle a message.'''
-        self.transport.request_receiver(yaml.load(message.body, yaml.Loader))
+        '''Handle a message, passing it to the dispatcher of the transport.'''
+        self.transport._receive_request(message, self.transport._decode(message))
 
 class WiseAgentResponseQueueListener(stomp.ConnectionListener):
     '''A listener for the response queue.'''
@@ -38,34 +48,400 @@ class WiseAgentResponseQueueListener(stomp.ConnectionListener):
         Args:
             transport (WiseAgentTransport): the transport'''
         self.transport = transport
-            
+
     def on_error(self, error):
         '''Handle an error.'''
         self.transport.error_receiver(error)
 
     def on_message(self, message: stomp.utils.Frame):
         '''Handle a message.'''
-        self.transport.response_receiver(yaml.load(message.body, yaml.Loader))
+        self.transport.response_receiver(self.transport._decode(message))
+
+
+class StompSubscription:
+    '''A subscription made through a StompConnectionPool.'''
+
+    def __init__(self, subscription_id: str, destination: str, connection: stomp.Connection,
+                 listener: stomp.ConnectionListener, ack: str, headers: Dict[str, str]):
+        self.subscription_id = subscription_id
+        self.destination = destination
+        self.connection = connection
+        self.listener = listener
+        self.ack = ack
+        self.headers = headers
+
+
+class StompDispatchingListener(stomp.ConnectionListener):
+    '''The listener of a pooled connection, dispatching the frames received to the listener of their subscription.'''
+
+    def __init__(self, pool: 'StompConnectionPool', connection: stomp.Connection):
+        self.pool = pool
+        self.connection = connection
+
+    def on_message(self, frame: stomp.utils.Frame):
+        '''Dispatch the message to the listener of its subscription, or of the subscription to its destination
+        when the broker doesn't send the subscription header.'''
+        subscription = self.pool.get_subscription(frame.headers.get('subscription'))
+        if subscription is None:
+            subscription = self.pool.get_subscription_for_destination(self.connection, frame.headers.get('destination'))
+        if subscription is None:
+            logging.getLogger(__name__).warning(f"Dropping message received for unknown subscription {frame.headers}")
+            return
+        subscription.listener.on_message(frame)
+
+    def on_error(self, frame: stomp.utils.Frame):
+        '''Dispatch the error to the listeners of all the subscriptions made on this connection.'''
+        for subscription in self.pool.get_subscriptions(self.connection):
+            subscription.listener.on_error(frame)
+
+    def on_receipt(self, frame: stomp.utils.Frame):
+        '''Notify the pool of the receipt.'''
+        self.pool._receipt_received(frame.headers.get('receipt-id'))
+
+    def on_disconnected(self):
+        '''Notify the pool that the connection has been lost.'''
+        self.pool._connection_lost(self.connection)
+
+
+class StompConnectionUnavailable(ConnectionError):
+    '''Raised when sending a message while all the connections of a StompConnectionPool are being re-established.'''
+
+
+class StompConnectionPool:
+    '''A small pool of STOMP connections to a broker, shared by all the StompWiseAgentTransport of the process
+    connecting to it. The subscriptions of the transports are spread over the connections, and the messages
+    received on a connection are dispatched to the listener of their subscription.
+
+    A connection is opened when first used. When a connection is lost, it is re-established in the background,
+    waiting reconnect_initial_delay seconds before the first attempt and doubling the delay after each failed attempt
+    up to reconnect_max_delay, and its subscriptions are made again once it is back. In the meantime the messages
+    are sent on the other connections of the pool, if none is connected sending fails immediately with
+    StompConnectionUnavailable.
+
+    The size of the pools is set with the STOMP_POOL_SIZE environment variable (2 by default).
+    Require the environment variables STOMP_USER and STOMP_PASSWORD to be set'''
+
+    # States of the connections of the pool
+    DISCONNECTED = "disconnected"
+    CONNECTED = "connected"
+    RECONNECTING = "reconnecting"
+
+    reconnect_initial_delay : float = 0.5
+    reconnect_max_delay : float = 30.0
+
+    _pools : Dict[Tuple[str, int], 'StompConnectionPool'] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, host: str, port: int, size: int):
+        '''Initialize the pool, the connections are opened when first used.
+
+        Args:
+            host (str): the host of the broker
+            port (int): the port of the broker
+            size (int): the number of connections'''
+        self._host = host
+        self._port = port
+        self._connections : List[Optional[stomp.Connection]] = [None] * size
+        self._states : List[str] = [self.DISCONNECTED] * size
+        self._subscriptions : Dict[str, StompSubscription] = {}
+        self._subscription_ids = itertools.count()
+        # Identifies this process in the subscription ids, telling the replicas of an agent apart on the broker
+        self._instance_id = uuid.uuid4().hex[:8]
+        self._send_index = itertools.count()
+        self._receipt_ids = itertools.count()
+        # Maps the id of a receipt requested to the broker to the event set when it is received
+        self._receipts : Dict[str, threading.Event] = {}
+        self._lock = threading.RLock()
+        # Notified when a connection has been re-established
+        self._reconnected = threading.Condition(self._lock)
+        self._closed = False
+        self._users = 0
+
+    @classmethod
+    def acquire(cls, host: str, port: int) -> 'StompConnectionPool':
+        '''Get the pool of connections to the given broker, creating it if needed. Each call must be matched by a call to release.
+
+        Args:
+            host (str): the host of the broker
+            port (int): the port of the broker'''
+        with cls._pools_lock:
+            pool = cls._pools.get((host, port))
+            if pool is None:
+                pool = StompConnectionPool(host, port, int(os.getenv("STOMP_POOL_SIZE", "2")))
+                cls._pools[(host, port)] = pool
+            pool._users += 1
+            return pool
+
+    def release(self):
+        '''Release the pool, disconnecting it once it is no longer used by any transport.'''
+        with self._pools_lock:
+            self._users -= 1
+            if self._users > 0:
+                return
+            self._pools.pop((self._host, self._port), None)
+        with self._lock:
+            self._closed = True
+            for connection in self._connections:
+                if connection is not None and connection.is_connected():
+                    connection.disconnect()
+            self._reconnected.notify_all()
+
+    def _connection(self, index: int) -> stomp.Connection:
+        '''Get the connection with the given index, connecting it if it has never been connected.
+        The connection returned may be being re-established, see _connected_connection.'''
+        with self._lock:
+            connection = self._connections[index]
+            if connection is None:
+                connection = stomp.Connection(host_and_ports=[(self._host, self._port)], heartbeats=(60000, 60000),
+                                              auto_decode=False)
+                connection.set_listener('StompDispatchingListener', StompDispatchingListener(self, connection))
+                self._connections[index] = connection
+            if self._states[index] == self.DISCONNECTED:
+                connection.connect(os.getenv("STOMP_USER"), os.getenv("STOMP_PASSWORD"), wait=True)
+                self._states[index] = self.CONNECTED
+            return connection
+
+    def _connected_connection(self) -> stomp.Connection:
+        '''Get the next connection to send a message on, skipping the connections being re-established.'''
+        size = len(self._connections)
+        start = next(self._send_index)
+        for i in range(size):
+            index = (start + i) % size
+            if self._states[index] != self.RECONNECTING:
+                return self._connection(index)
+        raise StompConnectionUnavailable(f"All the connections to {self._host}:{self._port} are being re-established")
+
+    def wait_until_connected(self, timeout: Optional[float] = None) -> bool:
+        '''Wait until at least one of the connections of the pool can be used to send messages.
+
+        Args:
+            timeout (Optional[float]): the maximum number of seconds to wait, None to wait forever
+
+        Returns:
+            bool: True if a connection can be used, False if the timeout expired or the pool has been closed'''
+        with self._lock:
+            return self._reconnected.wait_for(lambda: self._closed or any(state != self.RECONNECTING for state in self._states),
+                                              timeout) and not self._closed
+
+    def _connection_lost(self, connection: stomp.Connection):
+        '''Start re-establishing the given connection in the background, unless the pool has been closed.'''
+        with self._lock:
+            if self._closed or connection not in self._connections:
+                return
+            index = self._connections.index(connection)
+            if self._states[index] != self.CONNECTED:
+                return
+            self._states[index] = self.RECONNECTING
+        logging.getLogger(__name__).warning(f"Lost connection {index} to {self._host}:{self._port}, reconnecting")
+        threading.Thread(target=self._reconnect, args=(index, connection), daemon=True,
+                         name=f"StompConnectionPool-{self._host}:{self._port}-reconnect-{index}").start()
+
+    def _reconnect(self, index: int, connection: stomp.Connection):
+        '''Re-establish the given connection with an exponential backoff, then make its subscriptions again.'''
+        delay = self.reconnect_initial_delay
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+            time.sleep(delay * random.uniform(0.8, 1.2))
+            try:
+                connection.connect(os.getenv("STOMP_USER"), os.getenv("STOMP_PASSWORD"), wait=True)
+                break
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Failed to reconnect to {self._host}:{self._port}: {e}, "
+                                                    f"retrying in {delay} seconds")
+                delay = min(delay * 2, self.reconnect_max_delay)
+        with self._lock:
+            if self._closed:
+                connection.disconnect()
+                return
+            for subscription in self.get_subscriptions(connection):
+                connection.subscribe(destination=subscription.destination, id=subscription.subscription_id,
+                                     ack=subscription.ack, headers=subscription.headers)
+            self._states[index] = self.CONNECTED
+            self._reconnected.notify_all()
+        logging.getLogger(__name__).info(f"Reconnected connection {index} to {self._host}:{self._port}")
+
+    def subscribe(self, destination: str, listener: stomp.ConnectionListener, ack: str = 'auto',
+                  headers: Optional[Dict[str, str]] = None) -> StompSubscription:
+        '''Subscribe to the given destination on the least used connection of the pool.
+
+        Args:
+            destination (str): the destination
+            listener (stomp.ConnectionListener): the listener receiving the messages and errors of the subscription
+            ack (str): the ack mode of the subscription
+            headers (Optional[Dict[str, str]]): additional headers for the subscription
+
+        Returns:
+            StompSubscription: the subscription, to be passed to unsubscribe'''
+        with self._lock:
+            usage = [0] * len(self._connections)
+            for subscription in self._subscriptions.values():
+                usage[self._connections.index(subscription.connection)] += 1
+            index = usage.index(min(usage))
+            connection = self._connection(index)
+            subscription = StompSubscription(f"{destination}-{self._instance_id}-{next(self._subscription_ids)}", destination, connection,
+                                             listener, ack, headers or {})
+            self._subscriptions[subscription.subscription_id] = subscription
+            # a connection being re-established makes its subscriptions once it is back
+            if self._states[index] == self.CONNECTED:
+                connection.subscribe(destination=destination, id=subscription.subscription_id, ack=ack,
+                                     headers=subscription.headers)
+            return subscription
+
+    def unsubscribe(self, subscription: StompSubscription):
+        '''Remove the given subscription.
+
+        Args:
+            subscription (StompSubscription): the subscription returned by subscribe'''
+        with self._lock:
+            self._subscriptions.pop(subscription.subscription_id, None)
+            if subscription.connection.is_connected():
+                subscription.connection.unsubscribe(destination=subscription.destination, id=subscription.subscription_id)
+
+    def get_subscription(self, subscription_id: str) -> Optional[StompSubscription]:
+        '''Get the subscription with the given id.'''
+        return self._subscriptions.get(subscription_id)
+
+    def get_subscription_for_destination(self, connection: stomp.Connection, destination: str) -> Optional[StompSubscription]:
+        '''Get the subscription made on the given connection to the given destination.'''
+        with self._lock:
+            for subscription in self._subscriptions.values():
+                if subscription.connection is connection and subscription.destination == destination:
+                    return subscription
+            return None
+
+    def get_subscriptions(self, connection: stomp.Connection) -> List[StompSubscription]:
+        '''Get the subscriptions made on the given connection.'''
+        with self._lock:
+            return [subscription for subscription in self._subscriptions.values() if subscription.connection is connection]
+
+    def send(self, destination: str, body, content_type: str, headers: Optional[Dict[str, str]] = None):
+        '''Send a message to the given destination, using the connections of the pool in turn.
+
+        Args:
+            destination (str): the destination
+            body (Union[str, bytes]): the body of the message
+            content_type (str): the content type of the body
+            headers (Optional[Dict[str, str]]): additional headers for the message'''
+        self.send_batch([(destination, body, content_type, headers or {})])
+
+    def send_batch(self, messages: List[Tuple[str, Union[str, bytes], str, Dict[str, str]]],
+                   receipt_timeout: Optional[float] = None):
+        '''Send several messages in a row on the same connection, using the connections of the pool in turn.
+
+        Args:
+            messages (List[Tuple[str, Union[str, bytes], str, Dict[str, str]]]): the destination, body, content type
+            and additional headers of each message
+            receipt_timeout (Optional[float]): if set, a receipt is requested for the last message and this method
+            waits up to this number of seconds for it. Since the broker processes the frames of a connection in order,
+            the receipt confirms that all the messages of the batch have been received'''
+        if len(messages) == 0:
+            return
+        connection = self._connected_connection()
+        for destination, body, content_type, headers in messages[:-1]:
+            connection.send(body=body, destination=destination, content_type=content_type, headers=headers)
+        destination, body, content_type, headers = messages[-1]
+        if receipt_timeout is None:
+            connection.send(body=body, destination=destination, content_type=content_type, headers=headers)
+            return
+        receipt_id = f"receipt-{next(self._receipt_ids)}"
+        received = threading.Event()
+        self._receipts[receipt_id] = received
+        try:
+            connection.send(body=body, destination=destination, content_type=content_type,
+                            headers={**headers, 'receipt': receipt_id})
+            if not received.wait(receipt_timeout):
+                raise TimeoutError(f"No receipt received from the broker for {len(messages)} message(s) "
+                                   f"sent to {', '.join(sorted(set(m[0] for m in messages)))}")
+        finally:
+            self._receipts.pop(receipt_id, None)
+
+    def _receipt_received(self, receipt_id: str):
+        '''Wake up the sender waiting for the receipt with the given id.'''
+        received = self._receipts.get(receipt_id)
+        if received is not None:
+            received.set()
+
+
+_STOP = object()
 
 
 class StompWiseAgentTransport(WiseAgentTransport):
-    '''A transport for sending messages between agents using the STOMP protocol.'''
-    
+    '''A transport for sending messages between agents using the STOMP protocol.
+    The transports of the agents running in the same process share their connections to the broker,
+    see StompConnectionPool.
+
+    Several replicas of an agent can run behind the same name: they compete for the requests sent to the
+    request queue of the agent, while each replica also listens on its own reply queue. The requests are
+    sent with a reply-to header naming the reply queue of the sender, and the response to a request is sent
+    to the reply queue of the replica which sent it, so it reaches the replica holding the state of the
+    conversation.'''
+
     yaml_tag = u'!wiseagents.transports.StompWiseAgentTransport'
-    request_conn : stomp.Connection = None
-    response_conn : stomp.Connection = None
-    
-    def __init__(self, host: str, port: int, agent_name: str):
+    _pool : StompConnectionPool = None
+    _request_subscription : StompSubscription = None
+    _response_subscription : StompSubscription = None
+    _request_pool : OrderedWorkerPool = None
+    _received_requests : queue.Queue = None
+    _dispatcher : threading.Thread = None
+    _outbound : queue.Queue = None
+    _flusher : threading.Thread = None
+    _instance_id : str = None
+    _reply_subscription : StompSubscription = None
+    # Maps (context name, agent name) to the reply queue of the replica of the agent which sent the last request
+    # received for the context, the least recently used entries are evicted once reply_to_cache_size is reached
+    _reply_to : OrderedDict = None
+    _reply_to_lock : threading.Lock = None
+    reply_to_cache_size : int = 1000
+
+    def __new__(cls, *args, **kwargs):
+        '''Create a new instance of the class, setting default values for the optional instance variables.'''
+        obj = super().__new__(cls)
+        obj._request_workers = 1
+        obj._max_in_flight_requests = 10
+        obj._codec = "yaml"
+        obj._async_publish = False
+        obj._receipt_timeout = None
+        obj._compression_threshold = None
+        return obj
+
+    def __init__(self, host: str, port: int, agent_name: str, request_workers: Optional[int] = 1,
+                 max_in_flight_requests: Optional[int] = 10, codec: Optional[str] = "yaml",
+                 async_publish: Optional[bool] = False, receipt_timeout: Optional[float] = None,
+                 compression_threshold: Optional[int] = None):
         '''Initialize the transport.
 
         Args:
             host (str): the host
             port (int): the port
-            agent_name (str): the agent name'''
+            agent_name (str): the agent name
+            request_workers (Optional[int]): the number of threads handling the received requests, requests for
+            the same context are always handled in order by the same thread
+            max_in_flight_requests (Optional[int]): the maximum number of requests received but not yet handled,
+            requests are acknowledged to the broker only once handled, and the prefetch size of the subscription is
+            set to this limit so the broker stops delivering new ones when it is reached
+            codec (Optional[str]): the codec used to encode the messages sent, one of yaml, json or msgpack. It
+            defaults to yaml, which the peers not supporting the other codecs can read, so json and msgpack must only
+            be used once all the peers have been upgraded. The received messages are decoded according to their
+            content-type header, messages without one are decoded as YAML, which is what these peers send
+            async_publish (Optional[bool]): if True, the messages are put in an outbound queue and sent to the broker
+            by a background thread, so sending doesn't block the caller. Otherwise they are sent before returning
+            receipt_timeout (Optional[float]): if set, a receipt is requested to the broker for the messages sent,
+            and an error is raised (or passed to the error receiver when publishing asynchronously) if it isn't
+            received within this number of seconds
+            compression_threshold (Optional[int]): if set, the encoded messages of at least this number of bytes are
+            compressed with zlib and sent with a content-encoding header. The received messages are decompressed
+            according to this header whatever this setting'''
         self._host = host
         self._port = port
         self._agent_name = agent_name
-        
+        self._request_workers = request_workers
+        self._max_in_flight_requests = max_in_flight_requests
+        self._codec = codec
+        self._async_publish = async_publish
+        self._receipt_timeout = receipt_timeout
+        self._compression_threshold = compression_threshold
 
     def __repr__(self) -> str:
         return f"host={self._host}, port={self._port}, agent_name={self._agent_name}"
@@ -73,29 +449,152 @@ class StompWiseAgentTransport(WiseAgentTransport):
     def __getstate__(self) -> object:
         '''Return the state of the transport. Removing the instance variable chain to avoid it is serialized/deserialized by pyyaml.'''
         state = super().__getstate__()
-        del state['request_conn']
-        del state['response_conn']
+        state.pop('pool', None)
+        state.pop('request_subscription', None)
+        state.pop('response_subscription', None)
+        state.pop('request_pool', None)
+        state.pop('received_requests', None)
+        state.pop('dispatcher', None)
+        state.pop('outbound', None)
+        state.pop('flusher', None)
+        state.pop('instance_id', None)
+        state.pop('reply_subscription', None)
+        state.pop('reply_to', None)
+        state.pop('reply_to_lock', None)
         return state
 
+    def _decode(self, frame: stomp.utils.Frame) -> WiseAgentMessage:
+        '''Decode the body of the given frame, decompressing it if needed and using the codec matching its content type.'''
+        body = decompress_body(frame.body, frame.headers.get('content-encoding'))
+        return get_codec_for_content_type(frame.headers.get('content-type')).decode(body)
+
+    def _encode(self, destination: str, message: WiseAgentMessage,
+                headers: Dict[str, str]) -> Tuple[str, Union[str, bytes], str, Dict[str, str]]:
+        '''Encode the given message, compressing it if it is large enough, into a message to send with the connection pool.'''
+        codec = self.message_codec
+        body, content_encoding = compress_body(codec.encode(message), self.compression_threshold)
+        if content_encoding is not None:
+            headers = {**headers, 'content-encoding': content_encoding}
+        # let the broker deliver the messages by priority and discard them once expired
+        if message.priority is not None:
+            headers = {**headers, 'priority': str(message.priority)}
+        if message.deadline is not None:
+            headers = {**headers, 'expires': str(int(message.deadline * 1000))}
+        return destination, body, codec.content_type, headers
+
+    def _remember_reply_to(self, message: WiseAgentMessage, reply_to: Optional[str]):
+        '''Remember the reply queue of the replica which sent the given request, to route the response to it.'''
+        if reply_to is None or message.sender is None:
+            return
+        with self._reply_to_lock:
+            key = (message.context_name, message.sender)
+            self._reply_to[key] = reply_to
+            self._reply_to.move_to_end(key)
+            while len(self._reply_to) > self.reply_to_cache_size:
+                self._reply_to.popitem(last=False)
+
+    def _get_reply_to(self, context_name: str, dest_agent_name: str) -> Optional[str]:
+        '''Get the reply queue of the replica of the given agent which sent the last request received for the given context.'''
+        with self._reply_to_lock:
+            return self._reply_to.get((context_name, dest_agent_name))
+
+    def _receive_request(self, frame: stomp.utils.Frame, message: WiseAgentMessage):
+        '''Queue the given request for the dispatcher thread. The receiver thread calling this method is shared by
+        all the agents using the same pooled connection, so it must never wait for the worker pool.'''
+        self._remember_reply_to(message, frame.headers.get('reply-to'))
+        self._received_requests.put((frame, message))
+
+    def _dispatch(self):
+        '''Hand the queued requests over to the worker pool in the order they were received until the transport is
+        stopped, waiting for a worker when max_in_flight_requests requests are already waiting to be handled.'''
+        while True:
+            item = self._received_requests.get()
+            if item is _STOP:
+                return
+            self._submit_request(*item)
+
+    def _submit_request(self, frame: stomp.utils.Frame, message: WiseAgentMessage):
+        '''Hand the given request over to the worker pool, acknowledging it to the broker once it has been handled.'''
+        subscription = self._request_subscription
+        def handle():
+            try:
+                # the request may have expired while waiting in the broker or in the worker pool
+                if message.is_expired():
+                    logging.getLogger(__name__).info(f"Dropping expired request {message} for agent {self.agent_name}")
+                    return
+                self.request_receiver(message)
+            finally:
+                subscription.connection.ack(frame.headers['message-id'], subscription.subscription_id)
+        self._request_pool.submit(message.context_name, handle)
+
 
     def start(self):
         '''
         Start the transport.
         require the environment variables STOMP_USER and STOMP_PASSWORD to be set'''
-        if (self.request_conn is not None and self.request_conn.is_connected()) and (self.response_conn is not None and self.response_conn.is_connected()):
+        if self._pool is not None:
             return
-        hosts = [(self.host, self.port)] 
-        self.request_conn = stomp.Connection(host_and_ports=hosts, heartbeats=(60000, 60000))
-        self.request_conn.set_listener('WiseAgentRequestTopicListener', WiseAgentRequestQueueListener(self))
-        self.request_conn.connect(os.getenv("STOMP_USER"), os.getenv("STOMP_PASSWORD"), wait=True)
-        self.request_conn.subscribe(destination=self.request_queue, id=id(self), ack='auto')
-        
-        self.response_conn = stomp.Connection(host_and_ports=hosts, heartbeats=(60000, 60000))
-        
-        self.response_conn.set_listener('WiseAgentResponseQueueListener', WiseAgentResponseQueueListener(self))
-        self.response_conn.connect(os.getenv("STOMP_USER"), os.getenv("STOMP_PASSWORD"), wait=True)
-        
-        self.response_conn.subscribe(destination=self.response_queue, id=id(self) + 1 , ack='auto')
+        # fail early if the codec is unknown or not available
+        self.message_codec
+        self._instance_id = uuid.uuid4().hex
+        self._reply_to = OrderedDict()
+        self._reply_to_lock = threading.Lock()
+        self._request_pool = OrderedWorkerPool(workers=self.request_workers, max_in_flight=self.max_in_flight_requests,
+                                               name=f"StompTransport-{self.agent_name}")
+        self._received_requests = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True,
+                                            name=f"StompTransport-{self.agent_name}-dispatcher")
+        self._dispatcher.start()
+        self._pool = StompConnectionPool.acquire(self.host, self.port)
+        # requests are acknowledged once handled, the prefetch size lets the broker stop delivering when the pool is full
+        self._request_subscription = self._pool.subscribe(self.request_queue, WiseAgentRequestQueueListener(self),
+                                                          ack='client-individual',
+                                                          headers={'activemq.prefetchSize': self.max_in_flight_requests})
+        # the shared response queue receives the responses from peers which don't support reply queues
+        self._response_subscription = self._pool.subscribe(self.response_queue, WiseAgentResponseQueueListener(self))
+        self._reply_subscription = self._pool.subscribe(self.reply_queue, WiseAgentResponseQueueListener(self))
+        if self.async_publish:
+            self._outbound = queue.Queue()
+            self._flusher = threading.Thread(target=self._flush, daemon=True, name=f"StompTransport-{self.agent_name}-flusher")
+            self._flusher.start()
+
+    def _publish(self, messages: List[Tuple[str, Union[str, bytes], str, Dict[str, str]]]):
+        '''Send the given messages to the broker, or put them in the outbound queue when publishing asynchronously.'''
+        if self._outbound is not None:
+            self._outbound.put(messages)
+        else:
+            self._pool.send_batch(messages, self.receipt_timeout)
+
+    def _flush(self):
+        '''Send the messages put in the outbound queue until the transport is stopped. All the messages queued
+        while a batch is being sent are sent together in the next batch. While the connections to the broker are
+        being re-established, the messages are kept in the queue.'''
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self._outbound.get()
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.extend(item)
+                try:
+                    item = self._outbound.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                while True:
+                    try:
+                        self._pool.send_batch(batch, self.receipt_timeout)
+                        break
+                    except StompConnectionUnavailable:
+                        # keep the messages until a connection is back, without delaying the stop of the transport forever
+                        if not self._pool.wait_until_connected(self._pool.reconnect_max_delay if stopping else None):
+                            raise
+            except Exception as e:
+                logging.getLogger(__name__).exception(f"Error sending {len(batch)} message(s) for agent {self.agent_name}")
+                if self.error_receiver is not None:
+                    self.error_receiver(e)
 
 
     def send_request(self, message: WiseAgentMessage, dest_agent_name: str):
@@ -105,42 +604,67 @@ class StompWiseAgentTransport(WiseAgentTransport):
             message (WiseAgentMessage): the message to send
             dest_agent_name (str): the destination agent name'''
         # Send the message using the STOMP protocol
-        if self.request_conn is None or self.response_conn is None:
+        if self._pool is None:
             self.start()
-        if self.request_conn.is_connected() == False:
-            self.request_conn.connect(os.getenv("STOMP_USER"), os.getenv("STOMP_PASSWORD"), wait=True)
-        if self.response_conn.is_connected() == False:
-            self.response_conn.connect(os.getenv("STOMP_USER"), os.getenv("STOMP_PASSWORD"), wait=True)
         request_destination = '/queue/request/' + dest_agent_name
         logging.getLogger(__name__).debug(f"Sending request {message} to {request_destination}")
-        self.request_conn.send(body=yaml.dump(message), destination=request_destination)
-        
+        self._publish([self._encode(request_destination, message, {'reply-to': self.reply_queue})])
+
+    def send_requests(self, requests: List[Tuple[WiseAgentMessage, str]]):
+        '''Send several request messages at once, in a single batch.
+
+        Args:
+            requests (List[Tuple[WiseAgentMessage, str]]): the messages to send, with their destination agent name'''
+        if self._pool is None:
+            self.start()
+        self._publish([self._encode('/queue/request/' + dest_agent_name, message, {'reply-to': self.reply_queue})
+                       for message, dest_agent_name in requests])
+
     def send_response(self, message: WiseAgentMessage, dest_agent_name: str):
-        '''Send a response message to an agent.
+        '''Send a response message to an agent. The response is sent to the reply queue of the replica of the agent
+        which sent the last request received for the context of the message if any, otherwise to the response
+        queue of the agent.
 
         Args:
             message (WiseAgentMessage): the message to send
             dest_agent_name (str): the destination agent name'''
         # Send the message using the STOMP protocol
-        if self.request_conn is None or self.response_conn is None:
+        if self._pool is None:
             self.start()
-        response_destination = '/queue/response/' + dest_agent_name    
-        self.response_conn.send(body=yaml.dump(message), destination=response_destination)
+        response_destination = self._get_reply_to(message.context_name, dest_agent_name) or '/queue/response/' + dest_agent_name
+        self._publish([self._encode(response_destination, message, {})])
 
     def stop(self):
         '''Stop the transport.'''
-        if self.request_conn is not None and self.request_conn.is_connected():
-            #unsubscribe from the request topic
-            self.request_conn.unsubscribe(destination=self.request_queue, id=id(self))
-            # Disconnect request from the STOMP server
-            self.request_conn.disconnect()
-        if self.response_conn is not None and self.response_conn.is_connected():
-            #unsubscribe from the response queue
-            self.response_conn.unsubscribe(destination=self.response_queue, id=id(self) + 1)
-            # Disconnect response from the STOMP server
-            self.response_conn.disconnect()
-            
-        
+        if self._pool is None:
+            return
+        #unsubscribe from the request and response queues
+        self._pool.unsubscribe(self._request_subscription)
+        self._pool.unsubscribe(self._response_subscription)
+        self._pool.unsubscribe(self._reply_subscription)
+        # The requests not handed over to the worker pool yet are not acknowledged, the broker delivers them again
+        while True:
+            try:
+                self._received_requests.get_nowait()
+            except queue.Empty:
+                break
+        self._received_requests.put(_STOP)
+        if self._dispatcher is not threading.current_thread():
+            self._dispatcher.join()
+        # Wait for the requests being handled to be acknowledged
+        self._request_pool.shutdown()
+        # Send the messages still in the outbound queue
+        if self._flusher is not None:
+            self._outbound.put(_STOP)
+            if self._flusher is not threading.current_thread():
+                self._flusher.join()
+            self._outbound = None
+            self._flusher = None
+        # Disconnect from the STOMP server if no other transport uses the connections
+        self._pool.release()
+        self._pool = None
+
+
     @property
     def host(self) -> str:
         '''Get the host.'''
@@ -154,6 +678,42 @@ class StompWiseAgentTransport(WiseAgentTransport):
         '''Get the agent name.'''
         return self._agent_name
     @property
+    def request_workers(self) -> int:
+        '''Get the number of threads handling the received requests.'''
+        return self._request_workers
+    @property
+    def max_in_flight_requests(self) -> int:
+        '''Get the maximum number of requests received but not yet handled.'''
+        return self._max_in_flight_requests
+    @property
+    def codec(self) -> str:
+        '''Get the name of the codec used to encode the messages sent.'''
+        return self._codec
+    @property
+    def async_publish(self) -> bool:
+        '''Get whether the messages are sent asynchronously by a background thread.'''
+        return self._async_publish
+    @property
+    def receipt_timeout(self) -> Optional[float]:
+        '''Get the number of seconds to wait for the receipt of the messages sent, None if no receipt is requested.'''
+        return self._receipt_timeout
+    @property
+    def compression_threshold(self) -> Optional[int]:
+        '''Get the minimum size in bytes of the encoded messages to compress, None if they are never compressed.'''
+        return self._compression_threshold
+    @property
+    def message_codec(self) -> WiseAgentMessageCodec:
+        '''Get the codec used to encode the messages sent.'''
+        return get_codec(self.codec)
+    @property
+    def instance_id(self) -> Optional[str]:
+        '''Get the id of this replica of the agent, generated when the transport is started.'''
+        return self._instance_id
+    @property
+    def reply_queue(self) -> str:
+        '''Get the reply queue of this replica of the agent.'''
+        return f"{self.response_queue}.{self.instance_id}"
+    @property
     def request_queue(self) -> str:
         '''Get the request queue.'''
         return '/queue/request/' + self.agent_name
@@ -161,5 +721,4 @@ class StompWiseAgentTransport(WiseAgentTransport):
     def response_queue(self) -> str:
         '''Get the response queue.'''
         return '/queue/response/' + self.agent_name
-    
-    
\ No newline at end of file
+
@@ -0,0 +1,66 @@
+import logging
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+
+class OrderedWorkerPool:
+    '''A pool of worker threads used by the transports to process the messages they receive.
+
+    Tasks sharing the same key (e.g. the context name of a message) always run on the same worker,
+    so they are processed in the order they were submitted, while tasks for different keys run
+    concurrently. At most max_in_flight tasks can be pending at any time: submit blocks until
+    one of them has completed, or returns False right away when called with block=False.'''
+
+    def __init__(self, workers: int, max_in_flight: int, name: str):
+        '''Initialize the pool.
+
+        Args:
+            workers (int): the number of worker threads
+            max_in_flight (int): the maximum number of tasks submitted but not yet completed
+            name (str): the name used as a prefix for the worker threads'''
+        self._executors : List[ThreadPoolExecutor] = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-{i}")
+                                                      for i in range(workers)]
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._local = threading.local()
+
+    def submit(self, key: str, task: Callable[[], None], block: bool = True) -> bool:
+        '''Submit the given task, blocking if the maximum number of tasks in flight has been reached.
+
+        Args:
+            key (str): the key of the task, tasks with the same key are run in submission order
+            task (Callable[[], None]): the task to run
+            block (bool): whether to wait for a task to complete when the maximum number of tasks in flight
+            has been reached, rather than returning False without submitting the task
+
+        Returns:
+            bool: True if the task has been submitted'''
+        if not self._in_flight.acquire(blocking=block):
+            return False
+        executor = self._executors[zlib.crc32(str(key).encode("utf-8")) % len(self._executors)]
+        try:
+            executor.submit(self._run, task)
+        except Exception:
+            self._in_flight.release()
+            raise
+        return True
+
+    def _run(self, task: Callable[[], None]):
+        '''Run the given task, releasing its in flight slot once done.'''
+        self._local.is_worker = True
+        try:
+            task()
+        except Exception:
+            logging.getLogger(__name__).exception("Error running task in worker pool")
+        finally:
+            self._in_flight.release()
+
+    def shutdown(self, wait: bool = True):
+        '''Shutdown the pool. It never waits when called from one of its own workers, to avoid a deadlock.
+
+        Args:
+            wait (bool): whether to wait for the pending tasks to complete'''
+        wait = wait and not getattr(self._local, 'is_worker', False)
+        for executor in self._executors:
+            executor.shutdown(wait=wait)
@@ -1,7 +1,8 @@
 import logging
+import time
 from abc import *
 from enum import StrEnum
-from typing import Callable, Optional
+from typing import Callable, List, Optional, Tuple
 
 import yaml
 from yaml import YAMLObject
@@ -33,7 +34,9 @@ class WiseAgentMessage(YAMLObject):
     yaml_tag = u'!wiseagents.WiseAgentMessage'
     def __init__(self, message: str, context_name: str, sender: Optional[str] = None, message_type: Optional[WiseAgentMessageType] = None, 
                  tool_id : Optional[str] = None,
-                 route_response_to: Optional[str] = None):
+                 route_response_to: Optional[str] = None,
+                 priority: Optional[int] = None,
+                 deadline: Optional[float] = None):
         '''Initialize the message.
 
         Args:
@@ -43,6 +46,9 @@ class WiseAgentMessage(YAMLObject):
             tool_id Optional(str): the id of the tool
             context_name Optional(str): the context name of the message
             route_response_to Optional(str): the id of the tool to route the response to
+            priority Optional(int): the priority of the message, from 0 (lowest) to 9 (highest), or None for the default priority
+            deadline Optional(float): the time (in seconds since the epoch) after which the message is no longer
+            worth processing, e.g. because the client has given up waiting for the response, or None if it never expires
             ''' 
         self._message = message
         self._sender = sender
@@ -50,8 +56,19 @@ class WiseAgentMessage(YAMLObject):
         self._tool_id = tool_id
         self._route_response_to = route_response_to
         self._context_name = context_name
+        self._priority = priority
+        self._deadline = deadline
         self.__class__.yaml_dumper.add_representer(WiseAgentMessageType, wiseAgentMessageType_representer)
         
+    def __getstate__(self):
+        '''Return the state of the message, leaving out the priority and deadline when not set so the messages
+        dumped are unchanged for the peers which don't know them.'''
+        state = self.__dict__.copy()
+        for key in ("_priority", "_deadline"):
+            if state.get(key) is None:
+                state.pop(key, None)
+        return state
+
     def __setstate__(self, state):
         self._message = state["_message"]
         self._sender =  state["_sender"]
@@ -63,10 +80,40 @@ class WiseAgentMessage(YAMLObject):
         self._tool_id =  state["_tool_id"]
         self._route_response_to =  state["_route_response_to"]
         self._context_name = state["_context_name"]
+        self._priority = state.get("_priority")
+        self._deadline = state.get("_deadline")
         
 
     def __repr__(self) -> str:
-        return f"{self.__class__.__name__}(message={self.message}, sender={self.sender}, message_type={self.message_type}, tool_id={self.tool_id}, context_name={self.context_name}, route_response_to={self.route_response_to}, route_response_to={self.route_response_to})"
+        return f"{self.__class__.__name__}(message={self.message}, sender={self.sender}, message_type={self.message_type}, tool_id={self.tool_id}, context_name={self.context_name}, route_response_to={self.route_response_to}, route_response_to={self.route_response_to}, priority={self.priority}, deadline={self.deadline})"
+
+    def to_dict(self) -> dict:
+        '''Return the message as a dictionary made of plain types only, used by the transport codecs.'''
+        return {"message": self.message.to_dict() if isinstance(self.message, WiseAgentMessage) else self.message,
+                "sender": self.sender,
+                "message_type": self.message_type.value if self.message_type is not None else None,
+                "tool_id": self.tool_id,
+                "context_name": self.context_name,
+                "route_response_to": self.route_response_to,
+                "priority": self.priority,
+                "deadline": self.deadline}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'WiseAgentMessage':
+        '''Create a message from a dictionary returned by to_dict.
+
+        Args:
+            d (dict): the dictionary representation of the message'''
+        message = d.get("message")
+        message_type = d.get("message_type")
+        return cls(message=cls.from_dict(message) if isinstance(message, dict) else message,
+                   context_name=d.get("context_name"),
+                   sender=d.get("sender"),
+                   message_type=WiseAgentMessageType(message_type) if message_type else None,
+                   tool_id=d.get("tool_id"),
+                   route_response_to=d.get("route_response_to"),
+                   priority=d.get("priority"),
+                   deadline=d.get("deadline"))
 
     @property
     def context_name(self) -> str:
@@ -106,6 +153,20 @@ class WiseAgentMessage(YAMLObject):
         """Get the id of the tool."""
         return self._route_response_to
 
+    @property
+    def priority(self) -> Optional[int]:
+        """Get the priority of the message, from 0 (lowest) to 9 (highest), or None for the default priority."""
+        return self._priority
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """Get the time (in seconds since the epoch) after which the message is no longer worth processing, or None if it never expires."""
+        return self._deadline
+
+    def is_expired(self) -> bool:
+        """Return True if the deadline of the message has passed."""
+        return self._deadline is not None and self._deadline < time.time()
+
 class WiseAgentTransport(WiseAgentsYAMLObject):
     
     def __init__(self):
@@ -157,6 +218,19 @@ class WiseAgentTransport(WiseAgentsYAMLObject):
         """
         pass
     
+    def send_requests(self, requests: List[Tuple[WiseAgentMessage, str]]):
+        """
+        Send several request messages at once, e.g. when fanning out a request to the agents of a phase.
+        The default implementation sends them one by one, transports able to send them in a single batch
+        override it.
+
+
+        Args:
+            requests (List[Tuple[WiseAgentMessage, str]]): the messages to send, with their destination agent name
+        """
+        for message, dest_agent_name in requests:
+            self.send_request(message, dest_agent_name)
+
     @abstractmethod
     def send_response(self, message: WiseAgentMessage, dest_agent_name: str):
         """
@@ -0,0 +1,76 @@
+import threading
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+from openai.types.chat import ChatCompletionMessageParam
+
+from wiseagents import WiseAgent, WiseAgentMessage, WiseAgentMetaData
+from wiseagents.agents import AssistantAgent
+from wiseagents.agents import assistant
+from wiseagents.transports import InMemoryWiseAgentTransport
+from tests.wiseagents import assert_standard_variables_set
+
+cond = threading.Condition()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def run_after_all_tests():
+    assert_standard_variables_set()
+    yield
+
+
+class SilentWiseAgent(WiseAgent):
+
+    def __init__(self, name: str):
+        self.requests_received = []
+        super().__init__(name=name, metadata=WiseAgentMetaData(description=f"{name} never answers"),
+                         transport=InMemoryWiseAgentTransport(agent_name=name))
+
+    def process_request(self, request: WiseAgentMessage,
+                        conversation_history: List[ChatCompletionMessageParam]) -> Optional[str]:
+        with cond:
+            self.requests_received.append(request)
+            cond.notify()
+        return None
+
+    def process_response(self, response):
+        return True
+
+    def process_event(self, event):
+        return True
+
+    def process_error(self, error):
+        return True
+
+
+def test_late_response_is_not_returned_for_the_next_question(monkeypatch):
+    # don't start the web interface
+    monkeypatch.setattr(assistant.gradio, "ChatInterface",
+                        lambda *args, **kwargs: SimpleNamespace(launch=lambda **kwargs: None))
+    agents = []
+    try:
+        agents.append(SilentWiseAgent("AssistantDestinationAgent"))
+        agents.append(AssistantAgent(name="TestAssistantAgent", metadata=WiseAgentMetaData(description="Assistant"),
+                                     transport=InMemoryWiseAgentTransport(agent_name="TestAssistantAgent"),
+                                     destination_agent_name="AssistantDestinationAgent", request_timeout=0.5))
+        destination, assistant_agent = agents
+        assert "No response was received in time, please try again." == assistant_agent.slow_echo("First question", [])
+        answers = []
+        second_question = threading.Thread(target=lambda: answers.append(assistant_agent.slow_echo("Second question", [])))
+        with cond:
+            second_question.start()
+            assert cond.wait_for(lambda: len(destination.requests_received) == 2, timeout=10)
+        first_request, second_request = destination.requests_received
+        # the answer to the first question arrives while the second one is waiting
+        assistant_agent.process_response(WiseAgentMessage(message="First answer", sender=destination.name,
+                                                          context_name=first_request.context_name,
+                                                          deadline=first_request.deadline))
+        assistant_agent.process_response(WiseAgentMessage(message="Second answer", sender=destination.name,
+                                                          context_name=second_request.context_name,
+                                                          deadline=second_request.deadline))
+        second_question.join(10)
+        assert ["Second answer"] == answers
+    finally:
+        for agent in agents:
+            agent.stop_agent()
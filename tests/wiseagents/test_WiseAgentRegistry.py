@@ -1,8 +1,13 @@
 import logging
+import pickle
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
+import redis
 
-from wiseagents import WiseAgent, WiseAgentContext, WiseAgentMessage, WiseAgentMetaData, WiseAgentRegistry, WiseAgentTransport
+from wiseagents import WiseAgent, WiseAgentCollaborationType, WiseAgentContext, WiseAgentMessage, WiseAgentMessageType, WiseAgentMetaData, WiseAgentRegistry, WiseAgentRegistrySettings, WiseAgentTool, WiseAgentTransport
 from wiseagents.transports.stomp import StompWiseAgentTransport
 from tests.wiseagents import assert_standard_variables_set
 
@@ -73,4 +78,496 @@ def test_get_or_create_context():
         context = WiseAgentContext(name="Context1")
         assert context == WiseAgentRegistry.get_context(context.name)
     finally:
-        WiseAgentRegistry.remove_context(context.name)  
\ No newline at end of file
+        WiseAgentRegistry.remove_context(context.name)  
+def test_register_agent_replicas():
+    replicas = []
+    try:
+        metadata = WiseAgentMetaData(description="This is a replicated test agent")
+        replicas = [TestAgent(name="ReplicatedAgent", metadata=metadata, transport=DummyTransport()),
+                    TestAgent(name="ReplicatedAgent", metadata=metadata, transport=DummyTransport())]
+        with pytest.raises(NameError):
+            TestAgent(name="ReplicatedAgent", metadata=WiseAgentMetaData(description="This is another agent"),
+                      transport=DummyTransport())
+        replicas.pop().stop_agent()
+        assert metadata == WiseAgentRegistry.get_agent_metadata("ReplicatedAgent")
+        replicas.pop().stop_agent()
+        assert WiseAgentRegistry.get_agent_metadata("ReplicatedAgent") is None
+    finally:
+        for agent in replicas:
+            agent.stop_agent()
+
+def test_crashed_agent_replicas_are_removed():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    WiseAgentRegistry.reload_config(dict(WiseAgentRegistry.get_config(), agent_replica_ttl=1))
+    agent = None
+    try:
+        metadata = WiseAgentMetaData(description="This is a crashing test agent")
+        # a replica registered without sending heartbeats, like one which crashed
+        WiseAgentRegistry._get_backend().register_agent("CrashingAgent", metadata, "crashed")
+        agent = TestAgent(name="CrashingAgent", metadata=metadata, transport=DummyTransport())
+        time.sleep(1.5)
+        # the heartbeats keep the live replica
+        assert [] == WiseAgentRegistry.remove_dead_agent_replicas()
+        assert metadata == WiseAgentRegistry.get_agent_metadata("CrashingAgent")
+        # the agent is removed once its last live replica stops
+        agent.stop_agent()
+        agent = None
+        assert WiseAgentRegistry.get_agent_metadata("CrashingAgent") is None
+        # an agent whose replicas all crashed is removed, and can be registered again with other metadata
+        WiseAgentRegistry._get_backend().register_agent("CrashingAgent", metadata, "crashed")
+        WiseAgentRegistry._get_backend().register_agent("OtherAgent", metadata, "live")
+        # other metadata are refused while a replica is alive
+        with pytest.raises(NameError):
+            WiseAgentRegistry._get_backend().register_agent("OtherAgent", WiseAgentMetaData(description="Other"), "other")
+        time.sleep(1.2)
+        other_metadata = WiseAgentMetaData(description="This is another test agent")
+        WiseAgentRegistry._get_backend().register_agent("CrashingAgent", other_metadata, "restarted")
+        assert other_metadata == WiseAgentRegistry.get_agent_metadata("CrashingAgent")
+        time.sleep(1.2)
+        assert "CrashingAgent" in WiseAgentRegistry.remove_dead_agent_replicas()
+        assert WiseAgentRegistry.get_agent_metadata("CrashingAgent") is None
+    finally:
+        if agent is not None:
+            agent.stop_agent()
+        WiseAgentRegistry._get_backend().unregister_agent("OtherAgent", "live")
+        WiseAgentRegistry._get_backend().unregister_agent("CrashingAgent", "")
+        WiseAgentRegistry.reload_config()
+
+def test_context_redis_storage():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    context = WiseAgentRegistry.create_context("RedisContext")
+    try:
+        context.append_chat_completion({"role": "user", "content": "Hello"})
+        context.append_chat_completion({"role": "assistant", "content": "Hi"})
+        assert [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi"}] == context.llm_chat_completion
+        assert 2 == WiseAgentRegistry.redis_db.llen(WiseAgentContext.redis_key(context.name, "llm_chat_completion"))
+        context.append_required_tool_call("tool1")
+        context.append_required_tool_call("tool2")
+        context.remove_required_tool_call("tool1")
+        assert ["tool2"] == context.llm_required_tool_call
+        context.set_agent_phase_assignments([["Agent1", "Agent2"], ["Agent3"]])
+        context.set_current_phase(0)
+        context.remove_required_agent_for_current_phase("Agent1")
+        assert ["Agent2"] == context.get_required_agents_for_current_phase()
+        assert ["Agent3"] == context.get_agents_for_next_phase()
+        assert 1 == context.get_current_phase()
+        assert context.get_current_query() is None
+        context.add_query("first")
+        context.add_query("second")
+        assert "second" == context.get_current_query()
+        context.set_route_response_to("Agent0")
+        assert "Agent0" == WiseAgentRegistry.get_context(context.name).get_route_response_to()
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+    assert 0 == WiseAgentRegistry.redis_db.exists(*WiseAgentContext.redis_keys(context.name))
+
+def test_context_redis_migration():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    WiseAgentRegistry.redis_db.hset("LegacyContext", mapping={
+        "llm_chat_completion": pickle.dumps([{"role": "user", "content": "Hello"}]),
+        "agent_phase_assignments": pickle.dumps([["Agent1"], ["Agent2"]]),
+        "current_phase": pickle.dumps(1),
+        "route_response_to": "Agent0",
+        "restart_sequence": pickle.dumps(True)})
+    WiseAgentRegistry.redis_db.hset("contexts", "LegacyContext", b"")
+    # the contexts are only migrated on demand, getting a handle doesn't access redis
+    WiseAgentContext.handle("LegacyContext", WiseAgentRegistry.get_config())
+    assert 1 == WiseAgentRegistry.redis_db.exists("LegacyContext")
+    assert ["LegacyContext"] == WiseAgentRegistry.migrate_legacy_contexts()
+    context = WiseAgentRegistry.get_context("LegacyContext")
+    try:
+        assert 0 == WiseAgentRegistry.redis_db.exists("LegacyContext")
+        assert 0 == WiseAgentRegistry.redis_db.exists("contexts")
+        assert [] == WiseAgentRegistry.migrate_legacy_contexts()
+        assert [{"role": "user", "content": "Hello"}] == context.llm_chat_completion
+        assert [["Agent1"], ["Agent2"]] == context.get_agent_phase_assignments()
+        assert 1 == context.get_current_phase()
+        assert "Agent0" == context.get_route_response_to()
+        assert context.get_restart_sequence()
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+def test_context_chat_completion_cache():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    context = WiseAgentRegistry.create_context("CachedContext")
+    try:
+        context.append_chat_completion({"role": "user", "content": "Hello"})
+        assert [{"role": "user", "content": "Hello"}] == context.llm_chat_completion
+        WiseAgentRegistry.get_context(context.name).append_chat_completion({"role": "assistant", "content": "Hi"})
+        assert [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi"}] == context.llm_chat_completion
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+    context = WiseAgentRegistry.create_context("CachedContext")
+    try:
+        assert [] == context.llm_chat_completion
+        context.append_chat_completion({"role": "user", "content": "Bye"})
+        assert [{"role": "user", "content": "Bye"}] == context.llm_chat_completion
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+def test_context_shares_redis_connection_pool():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    context = WiseAgentRegistry.create_context("PooledContext")
+    try:
+        pool = WiseAgentRegistry.redis_db.connection_pool
+        assert pool is context._redis_db.connection_pool
+        assert pool is WiseAgentRegistry.get_context(context.name)._redis_db.connection_pool
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+def test_context_concurrent_phase_responses():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    agents = [f"Agent{i}" for i in range(20)]
+    context = WiseAgentRegistry.create_context("PhasedContext")
+    try:
+        context.set_agent_phase_assignments([agents, ["FinalAgent"]])
+        context.set_current_phase(0)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            remaining = list(executor.map(context.remove_required_agent_for_current_phase, agents))
+        assert sorted(remaining) == list(range(20))
+        assert context.remove_required_agent_for_current_phase("Agent0") is None
+        assert ["FinalAgent"] == context.get_agents_for_next_phase()
+        assert ["FinalAgent"] == context.get_required_agents_for_current_phase()
+        assert context.get_agents_for_next_phase() is None
+        assert 1 == context.get_current_phase()
+        with pytest.raises(IndexError):
+            context.set_current_phase(2)
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+def test_remove_expired_contexts():
+    WiseAgentRegistry.reload_config(dict(WiseAgentRegistry.get_config(), context_ttl=2))
+    idle_context = WiseAgentRegistry.create_context("IdleContext")
+    active_context = WiseAgentRegistry.create_context("ActiveContext")
+    try:
+        idle_context.append_chat_completion({"role": "user", "content": "Hello"})
+        live_contexts = WiseAgentRegistry.get_live_context_count()
+        time.sleep(1.2)
+        assert active_context == WiseAgentRegistry.get_context(active_context.name)
+        time.sleep(1.2)
+        assert ["IdleContext"] == WiseAgentRegistry.remove_expired_contexts()
+        assert not WiseAgentRegistry.does_context_exist("IdleContext")
+        assert WiseAgentRegistry.does_context_exist("ActiveContext")
+        assert live_contexts - 1 == WiseAgentRegistry.get_live_context_count()
+        if WiseAgentRegistry.get_config().get("use_redis") == True:
+            assert 0 == WiseAgentRegistry.redis_db.exists(*WiseAgentContext.redis_keys("IdleContext"))
+    finally:
+        WiseAgentRegistry.remove_context(active_context.name)
+        if WiseAgentRegistry.does_context_exist(idle_context.name):
+            WiseAgentRegistry.remove_context(idle_context.name)
+        WiseAgentRegistry.reload_config()
+
+def test_context_touch_throttling():
+    WiseAgentRegistry.reload_config(dict(WiseAgentRegistry.get_config(), context_ttl=10))
+    context = WiseAgentRegistry.create_context("ThrottledContext")
+    try:
+        if WiseAgentRegistry.get_config().get("use_redis") == True:
+            last_access_key = f"{WiseAgentRegistry.get_config().redis_namespace}contexts_last_access"
+            last_access = WiseAgentRegistry.redis_db.zscore(last_access_key, context.name)
+            # the access isn't recorded again within the touch interval (context_ttl / 10)
+            assert context == WiseAgentRegistry.get_context(context.name)
+            assert last_access == WiseAgentRegistry.redis_db.zscore(last_access_key, context.name)
+        # removing a context already removed by the sweeper doesn't fail
+        WiseAgentRegistry.remove_context(context.name)
+        WiseAgentRegistry.remove_context(context.name)
+        sweeper = WiseAgentRegistry._context_sweeper
+        assert sweeper is not None
+    finally:
+        if WiseAgentRegistry.does_context_exist(context.name):
+            WiseAgentRegistry.remove_context(context.name)
+    try:
+        WiseAgentRegistry.reload_config(dict(WiseAgentRegistry.get_config(), context_ttl=None))
+        # the sweeper stops once the contexts no longer expire
+        sweeper.join(timeout=5)
+        assert not sweeper.is_alive()
+    finally:
+        WiseAgentRegistry.reload_config()
+
+def test_writes_through_a_handle_refresh_the_context():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    WiseAgentRegistry.reload_config(dict(WiseAgentRegistry.get_config(), context_ttl=2))
+    context = WiseAgentRegistry.create_context("RefreshedContext")
+    try:
+        last_access_key = f"{WiseAgentRegistry.get_config().redis_namespace}contexts_last_access"
+        last_access = WiseAgentRegistry.redis_db.zscore(last_access_key, context.name)
+        handle = WiseAgentRegistry.get_context(context.name)
+        # the access is recorded once the touch interval (context_ttl / 10) elapsed
+        time.sleep(0.3)
+        handle.add_query("What is the weather?")
+        assert last_access < WiseAgentRegistry.redis_db.zscore(last_access_key, context.name)
+        # the keys written through a handle after the context was removed expire too
+        WiseAgentRegistry.remove_context(context.name)
+        handle.append_chat_completion({"role": "user", "content": "Hello"})
+        handle.set_agents_sequence(["Agent1", "Agent2"])
+        handle.set_route_response_to("Agent1")
+        keys = [key for key in WiseAgentContext.redis_keys(context.name) if WiseAgentRegistry.redis_db.exists(key)]
+        assert 3 == len(keys)
+        assert all(WiseAgentRegistry.redis_db.ttl(key) > 0 for key in keys)
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+        WiseAgentRegistry.reload_config()
+
+def test_get_context_handle():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    context = WiseAgentRegistry.create_context("HandleContext")
+    try:
+        context.add_query("What is the weather?")
+        handle = WiseAgentRegistry.get_context("HandleContext")
+        assert "HandleContext" == handle.name
+        assert "What is the weather?" == handle.get_current_query()
+        assert "HandleContext" in WiseAgentRegistry.get_contexts()
+        assert WiseAgentRegistry.get_context("MissingContext") is None
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+def test_in_memory_context_state():
+    config = {"use_redis": False, "trace_enabled": True, "context_max_message_trace": 2}
+    contexts = [WiseAgentContext("InMemoryContext1", config), WiseAgentContext("InMemoryContext2", config)]
+    try:
+        contexts[0].append_chat_completion({"role": "user", "content": "Hello"})
+        contexts[0].add_query("first")
+        assert [{"role": "user", "content": "Hello"}] == contexts[0].llm_chat_completion
+        assert [] == contexts[1].llm_chat_completion
+        assert [] == contexts[1].get_queries()
+        contexts[0].llm_chat_completion.append({"role": "user", "content": "Not added"})
+        assert 1 == len(contexts[0].llm_chat_completion)
+        for i in range(3):
+            contexts[0].trace(WiseAgentMessage(message=f"message {i}", context_name=contexts[0].name))
+        assert ["message 1", "message 2"] == [message.message for message in contexts[0].message_trace]
+    finally:
+        for context in contexts:
+            WiseAgentRegistry.remove_context(context.name)
+
+def test_create_sub_context_with_initial_state(monkeypatch):
+    parent = WiseAgentRegistry.create_context("ParentContext")
+    # count the round trips to redis
+    round_trips = []
+    send_packed_command = redis.connection.AbstractConnection.send_packed_command
+    def counting_send_packed_command(self, *args, **kwargs):
+        round_trips.append(args)
+        return send_packed_command(self, *args, **kwargs)
+    try:
+        monkeypatch.setattr(redis.connection.AbstractConnection, "send_packed_command", counting_send_packed_command)
+        context = WiseAgentRegistry.create_sub_context(parent.name, "Child", collaboration_type=WiseAgentCollaborationType.SEQUENTIAL_MEMORY,
+                                                       route_response_to="Agent0", agents_sequence=["Agent1", "Agent2"],
+                                                       llm_chat_completion=[{"role": "system", "content": "Be nice"}],
+                                                       queries=["What is the weather?"])
+        monkeypatch.undo()
+        if WiseAgentRegistry.get_config().get("use_redis") == True:
+            # one round trip checking the contexts exist, one transaction registering the sub context with its state
+            assert 2 == len(round_trips)
+        assert WiseAgentCollaborationType.SEQUENTIAL_MEMORY == context.collaboration_type
+        assert "Agent0" == context.get_route_response_to()
+        assert ["Agent1", "Agent2"] == context.get_agents_sequence()
+        assert [{"role": "system", "content": "Be nice"}] == context.llm_chat_completion
+        assert "What is the weather?" == context.get_current_query()
+        WiseAgentRegistry.remove_context(context.name)
+    finally:
+        WiseAgentRegistry.remove_context(parent.name)
+
+def test_context_batch():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    context = WiseAgentRegistry.create_context("BatchContext")
+    try:
+        with context.batch():
+            context.append_chat_completion({"role": "user", "content": "Hello"})
+            context.set_agent_phase_assignments([["Agent1", "Agent2"]])
+            context.set_current_phase(0)
+            context.add_query("Hello")
+            # the updates are sent at the end of the batch
+            assert [] == context.llm_chat_completion
+        assert [{"role": "user", "content": "Hello"}] == context.llm_chat_completion
+        assert ["Agent1", "Agent2"] == context.get_required_agents_for_current_phase()
+        assert "Hello" == context.get_current_query()
+        with pytest.raises(RuntimeError):
+            with context.batch():
+                context.add_query("Not added")
+                raise RuntimeError()
+        assert ["Hello"] == context.get_queries()
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+def test_context_trace_ring_buffer():
+    config = dict(WiseAgentRegistry.get_config(), trace_enabled=True, context_max_message_trace=2)
+    context = WiseAgentContext("TraceContext", config)
+    try:
+        for i in range(3):
+            context.trace(WiseAgentMessage(message=f"message {i}", context_name=context.name, sender="Agent1"))
+        assert 2 == len(context.message_trace)
+        assert "message 2" in str(context.message_trace[-1])
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+    config.update(trace_format="record", trace_sample_rate=0.0)
+    context = WiseAgentContext("TraceContext", config)
+    try:
+        context.trace(WiseAgentMessage(message="not traced", context_name=context.name))
+        assert [] == context.message_trace
+        config["trace_sample_rate"] = 1.0
+        context.trace(WiseAgentMessage(message="Hello", context_name=context.name, sender="Agent1",
+                                       message_type=WiseAgentMessageType.QUERY))
+        record = context.message_trace[0]
+        assert "Agent1" == record["sender"]
+        assert "QUERY" == record["message_type"]
+        assert 5 == record["length"]
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+def test_registry_settings(monkeypatch):
+    settings = WiseAgentRegistry.get_config()
+    assert isinstance(settings, WiseAgentRegistrySettings)
+    with pytest.raises(TypeError):
+        settings["context_ttl"] = 10
+    def fail_find_file(*args, **kwargs):
+        raise AssertionError("the configuration is read once")
+    monkeypatch.setattr(WiseAgentRegistry, "find_file", fail_find_file)
+    assert settings is WiseAgentRegistry.get_config()
+    monkeypatch.undo()
+    try:
+        in_memory_settings = WiseAgentRegistry.reload_config({"use_redis": False})
+        assert not in_memory_settings.use_redis
+        assert WiseAgentRegistry.redis_db is None
+        context = WiseAgentRegistry.create_context("SettingsContext")
+        assert context is WiseAgentRegistry.get_context("SettingsContext")
+        WiseAgentRegistry.remove_context(context.name)
+    finally:
+        assert settings == WiseAgentRegistry.reload_config()
+    assert settings.use_redis == (WiseAgentRegistry.redis_db is not None)
+
+def test_agent_catalog_cache():
+    namespace = WiseAgentRegistry.get_config().redis_namespace
+    agent = TestAgent(name="CatalogAgent", metadata=WiseAgentMetaData(description="This is a catalog test agent"),
+                      transport=DummyTransport())
+    try:
+        assert "Agent Name: CatalogAgent Agent Description: This is a catalog test agent" in WiseAgentRegistry.get_agent_catalog().split("\n")
+        assert WiseAgentRegistry.get_agent_catalog().split("\n") == WiseAgentRegistry.get_agent_names_and_descriptions()
+        if WiseAgentRegistry.get_config().use_redis:
+            # the catalog is cached once the registry is subscribed to the agents channel
+            for i in range(50):
+                if WiseAgentRegistry.get_agent_catalog() is WiseAgentRegistry.get_agent_catalog():
+                    break
+                time.sleep(0.1)
+            else:
+                pytest.fail("The agent catalog isn't cached")
+            # an agent registered by another process is seen once the change is published
+            WiseAgentRegistry.redis_db.hset(f"{namespace}agents", "RemoteAgent", pickle.dumps(WiseAgentMetaData(description="Remote")))
+            WiseAgentRegistry.redis_db.publish(f"{namespace}agents_changed", "RemoteAgent")
+            for i in range(50):
+                if WiseAgentRegistry.get_agent_metadata("RemoteAgent") is not None:
+                    break
+                time.sleep(0.1)
+            assert "Remote" == WiseAgentRegistry.get_agent_metadata("RemoteAgent").description
+    finally:
+        agent.stop_agent()
+        if WiseAgentRegistry.get_config().use_redis:
+            WiseAgentRegistry.redis_db.hdel(f"{namespace}agents", "RemoteAgent")
+            WiseAgentRegistry.redis_db.publish(f"{namespace}agents_changed", "RemoteAgent")
+    assert "CatalogAgent" not in WiseAgentRegistry.get_agent_catalog()
+
+def test_agent_metadata_lookup_without_catalog(monkeypatch):
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    agent = TestAgent(name="LookupAgent", metadata=WiseAgentMetaData(description="This is a lookup test agent"),
+                      transport=DummyTransport())
+    commands = []
+    send_packed_command = redis.connection.AbstractConnection.send_packed_command
+    def recording_send_packed_command(self, *args, **kwargs):
+        commands.append(args)
+        return send_packed_command(self, *args, **kwargs)
+    try:
+        # drop the cached catalog, as after a change of the agents
+        WiseAgentRegistry._backend._invalidate()
+        monkeypatch.setattr(redis.connection.AbstractConnection, "send_packed_command", recording_send_packed_command)
+        assert "This is a lookup test agent" == WiseAgentRegistry.get_agent_metadata("LookupAgent").description
+        assert WiseAgentRegistry.get_agent_metadata("MissingAgent") is None
+        monkeypatch.undo()
+        # a single HGET for each lookup, without scanning the catalog
+        assert 2 == len(commands)
+        assert all(b"HGET" in b"".join(command[0]) and b"HSCAN" not in b"".join(command[0]) for command in commands)
+    finally:
+        monkeypatch.undo()
+        agent.stop_agent()
+
+def test_tool_catalog_cache():
+    # the tools can't be removed from the registry, their names are unique so the test can be run again
+    suffix = uuid.uuid4().hex[:8]
+    tool_name = f"CatalogTool-{suffix}"
+    missing_tool_name = f"MissingTool-{suffix}"
+    tool = WiseAgentTool(name=tool_name, description="This is a catalog test tool", agent_tool=False,
+                         parameters_json_schema={"type": "object", "properties": {}})
+    tools = WiseAgentRegistry.get_tools_OpenAI_format([tool_name])
+    assert (tool.get_tool_OpenAI_format(),) == tools
+    assert tool_name == WiseAgentRegistry.get_tool(tool_name).name
+    assert tool_name in WiseAgentRegistry.get_tools()
+    with pytest.raises(NameError):
+        WiseAgentRegistry.get_tools_OpenAI_format([tool_name, missing_tool_name])
+    WiseAgentTool(name=missing_tool_name, description="This tool is registered later", agent_tool=False)
+    assert (tool_name, missing_tool_name) == tuple(tool["function"]["name"] for tool in
+                                                   WiseAgentRegistry.get_tools_OpenAI_format([tool_name, missing_tool_name]))
+
+def test_tool_catalog_skips_undecodable_tool():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    tools_key = f"{WiseAgentRegistry.get_config().redis_namespace}tools"
+    tool_name = f"DecodableTool-{uuid.uuid4().hex[:8]}"
+    WiseAgentRegistry.redis_db.hset(tools_key, "UndecodableTool", b"not a tool")
+    try:
+        # registering a tool drops the cached catalog
+        WiseAgentTool(name=tool_name, description="This tool can be decoded", agent_tool=False)
+        assert tool_name == WiseAgentRegistry.get_tool(tool_name).name
+        assert WiseAgentRegistry.get_tool("UndecodableTool") is None
+    finally:
+        WiseAgentRegistry.redis_db.hdel(tools_key, "UndecodableTool")
+
+def test_tool_lookup_without_catalog(monkeypatch):
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    tool_name = f"LookupTool-{uuid.uuid4().hex[:8]}"
+    WiseAgentTool(name=tool_name, description="This is a lookup test tool", agent_tool=False)
+    commands = []
+    send_packed_command = redis.connection.AbstractConnection.send_packed_command
+    def recording_send_packed_command(self, *args, **kwargs):
+        commands.append(args)
+        return send_packed_command(self, *args, **kwargs)
+    try:
+        # drop the cached catalog, as after a change of the tools
+        WiseAgentRegistry._backend._invalidate()
+        monkeypatch.setattr(redis.connection.AbstractConnection, "send_packed_command", recording_send_packed_command)
+        assert tool_name == WiseAgentRegistry.get_tool(tool_name).name
+        assert WiseAgentRegistry.get_tool(f"Missing{tool_name}") is None
+        monkeypatch.undo()
+        # a single HGET for each lookup, without scanning the catalog
+        assert 2 == len(commands)
+        assert all(b"HGET" in b"".join(command[0]) and b"HSCAN" not in b"".join(command[0]) for command in commands)
+    finally:
+        monkeypatch.undo()
+
+def test_registry_namespace():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    config = WiseAgentRegistry.get_config()
+    context = WiseAgentRegistry.create_context("NamespacedContext")
+    try:
+        context.add_query("Hello")
+        namespace = config.redis_namespace
+        assert WiseAgentContext.redis_key(context.name, "queries").startswith(f"{namespace}context:")
+        assert 1 == WiseAgentRegistry.redis_db.llen(f"{namespace}context:{{NamespacedContext}}:queries")
+        assert "NamespacedContext" in list(WiseAgentRegistry.iter_context_names())
+        WiseAgentRegistry.reload_config(dict(config, redis_db="other-tenant"))
+        assert not WiseAgentRegistry.does_context_exist("NamespacedContext")
+        assert "NamespacedContext" not in list(WiseAgentRegistry.iter_context_names())
+        other_context = WiseAgentRegistry.create_context("NamespacedContext")
+        assert [] == other_context.get_queries()
+        WiseAgentRegistry.remove_context(other_context.name)
+    finally:
+        WiseAgentRegistry.reload_config()
+        WiseAgentRegistry.remove_context(context.name)
+    assert 0 == WiseAgentRegistry.redis_db.exists(*WiseAgentContext.redis_keys("NamespacedContext"))
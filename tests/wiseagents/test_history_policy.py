@@ -0,0 +1,141 @@
+from types import SimpleNamespace
+
+import pytest
+
+from wiseagents import WiseAgent, WiseAgentContext, WiseAgentHistoryPolicy, WiseAgentMetaData, WiseAgentRegistry
+from wiseagents.llm import WiseAgentLLM
+from wiseagents.transports import InMemoryWiseAgentTransport
+from tests.wiseagents import assert_standard_variables_set
+
+
+@pytest.fixture(scope="session", autouse=True)
+def run_after_all_tests():
+    assert_standard_variables_set()
+    yield
+
+
+class SummaryLLM(WiseAgentLLM):
+    def __init__(self):
+        super().__init__(model_name="summary")
+        self.prompts = []
+
+    def process_single_prompt(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=f"summary {len(self.prompts)}")
+
+    def process_chat_completion(self, messages, tools):
+        pass
+
+
+@pytest.fixture
+def context():
+    context = WiseAgentRegistry.create_context("HistoryContext")
+    for i in range(6):
+        context.append_chat_completion({"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"})
+    yield context
+    WiseAgentRegistry.remove_context(context.name)
+
+
+def test_last_n(context):
+    history = WiseAgentHistoryPolicy(last_n=2).apply(context)
+    assert ["message 4", "message 5"] == [message["content"] for message in history]
+
+
+def test_max_tokens(context):
+    # each message is estimated to 2 + 4 tokens
+    history = WiseAgentHistoryPolicy(max_tokens=20).apply(context)
+    assert ["message 3", "message 4", "message 5"] == [message["content"] for message in history]
+
+
+def test_tool_messages_are_not_split(context):
+    context.append_chat_completion({"role": "assistant", "content": "", "tool_calls": []})
+    context.append_chat_completion({"role": "tool", "content": "tool answer"})
+    context.append_chat_completion({"role": "assistant", "content": "message 8"})
+    history = WiseAgentHistoryPolicy(last_n=2).apply(context)
+    assert ["message 8"] == [message["content"] for message in history]
+
+
+def test_rolling_summary(context):
+    llm = SummaryLLM()
+    policy = WiseAgentHistoryPolicy(last_n=2, summary_llm=llm)
+    history = policy.apply(context)
+    assert "Summary of the beginning of the conversation: summary 1" == history[0]["content"]
+    assert ["message 4", "message 5"] == [message["content"] for message in history[1:]]
+    assert "message 3" in llm.prompts[0]
+    # the summary is only updated with the messages leaving the window
+    policy.apply(context)
+    assert 1 == len(llm.prompts)
+    context.append_chat_completion({"role": "user", "content": "message 6"})
+    history = policy.apply(context)
+    assert "Summary of the beginning of the conversation: summary 2" == history[0]["content"]
+    assert "message 3" not in llm.prompts[1]
+    assert "summary 1" in llm.prompts[1] and "message 4" in llm.prompts[1]
+    assert ("summary 2", 5) == context.get_history_summary()
+
+
+def test_summarized_messages_are_not_repeated(context):
+    llm = SummaryLLM()
+    WiseAgentHistoryPolicy(last_n=2, summary_llm=llm).apply(context)
+    assert ("summary 1", 4) == context.get_history_summary()
+    # a wider window must not send again the messages already in the summary
+    history = WiseAgentHistoryPolicy(last_n=4, summary_llm=llm).apply(context)
+    assert "Summary of the beginning of the conversation: summary 1" == history[0]["content"]
+    assert ["message 4", "message 5"] == [message["content"] for message in history[1:]]
+    assert 1 == len(llm.prompts)
+
+
+def test_dropped_messages_are_summarized():
+    config = dict(WiseAgentRegistry.get_config(), use_redis=False, context_max_chat_completion=4)
+    context = WiseAgentContext("BoundedHistoryContext", config=config)
+    try:
+        llm = SummaryLLM()
+        policy = WiseAgentHistoryPolicy(last_n=2, summary_llm=llm)
+        for i in range(4):
+            context.append_chat_completion({"role": "user", "content": f"message {i}"})
+        policy.apply(context)
+        assert ("summary 1", 2) == context.get_history_summary()
+        # the first four messages leave the chat completion, only the first two were summarized
+        for i in range(4, 8):
+            context.append_chat_completion({"role": "user", "content": f"message {i}"})
+        assert ["message 2", "message 3"] == [message["content"] for message in context.get_dropped_chat_completion()]
+        assert ("summary 1", 0) == context.get_history_summary()
+        history = policy.apply(context)
+        assert ["message 6", "message 7"] == [message["content"] for message in history[1:]]
+        assert "message 1" not in llm.prompts[1]
+        assert all(f"message {i}" in llm.prompts[1] for i in (2, 3, 4, 5))
+        assert "message 6" not in llm.prompts[1]
+        assert ("summary 2", 2) == context.get_history_summary()
+        assert [] == context.get_dropped_chat_completion()
+    finally:
+        WiseAgentRegistry.remove_context(context.name)
+
+
+class HistoryWiseAgent(WiseAgent):
+
+    def process_request(self, request, conversation_history):
+        return None
+
+    def process_response(self, response):
+        return True
+
+    def process_event(self, event):
+        return True
+
+    def process_error(self, error):
+        return True
+
+
+def test_history_policy_in_python():
+    llm = SummaryLLM()
+    policy = WiseAgentHistoryPolicy(last_n=2, summary_llm=llm)
+    agent = HistoryWiseAgent(name="HistoryAgent", metadata=WiseAgentMetaData(description="history agent"),
+                             transport=InMemoryWiseAgentTransport(agent_name="HistoryAgent"), history_policy=policy)
+    try:
+        assert policy is agent.history_policy
+        assert "HistoryAgent" == llm._agent_name
+        other_llm = SummaryLLM()
+        agent.history_policy = WiseAgentHistoryPolicy(last_n=4, summary_llm=other_llm)
+        assert 4 == agent.history_policy.last_n
+        assert "HistoryAgent" == other_llm._agent_name
+    finally:
+        agent.stop_agent()
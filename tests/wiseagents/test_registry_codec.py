@@ -0,0 +1,88 @@
+import json
+import pickle
+
+import pytest
+from openai.types.chat import ChatCompletionMessage
+
+from wiseagents import WiseAgentContext, WiseAgentMetaData, WiseAgentRegistry, WiseAgentTool
+from wiseagents.core import _decode_registry_object, _encode_registry_object
+from wiseagents.registry_codec import REGISTRY_SCHEMA_VERSION, get_registry_codec, get_registry_codec_for_payload
+from tests.wiseagents import assert_standard_variables_set
+
+
+@pytest.fixture(scope="session", autouse=True)
+def run_after_all_tests():
+    assert_standard_variables_set()
+    yield
+
+
+def weather_call_back(**kwargs) -> str:
+    return "sunny"
+
+
+@pytest.mark.parametrize("codec_name", ["pickle", "json", "msgpack"])
+def test_registry_codec_round_trip(codec_name):
+    if codec_name == "msgpack":
+        pytest.importorskip("msgpack")
+    codec = get_registry_codec(codec_name)
+    metadata = WiseAgentMetaData(description="This is a test agent", system_message="You are a test agent",
+                                 pre_user_messages=["Hello"])
+    payload = _encode_registry_object(codec, metadata)
+    assert codec is get_registry_codec_for_payload(payload)
+    assert metadata == _decode_registry_object(payload)
+    tool = WiseAgentTool(name="WeatherTool", description="Get the weather", agent_tool=False,
+                         parameters_json_schema={"type": "object", "properties": {}}, call_back=weather_call_back)
+    decoded_tool = _decode_registry_object(_encode_registry_object(codec, tool))
+    assert tool.get_tool_OpenAI_format() == decoded_tool.get_tool_OpenAI_format()
+    assert "sunny" == decoded_tool.exec()
+    if not codec.preserves_objects:
+        # the chat completion messages returned by the LLM are stored as plain dictionaries
+        message = ChatCompletionMessage(role="assistant", content="Hello")
+        assert [{"role": "assistant", "content": "Hello"}] == codec.decode(codec.encode([message]))
+
+
+def test_registry_codec_schema_version():
+    codec = get_registry_codec("json")
+    payload = codec.encode({"schema": "WiseAgentMetaData", "version": REGISTRY_SCHEMA_VERSION + 1,
+                            "data": {"description": "From the future"}})
+    with pytest.raises(ValueError):
+        _decode_registry_object(payload)
+    tool = WiseAgentTool.from_dict({"name": "LambdaTool", "description": "A tool with a lambda", "agent_tool": False})
+    tool._call_back = lambda: "Hello"
+    with pytest.raises(ValueError):
+        _encode_registry_object(codec, tool)
+
+
+def test_registry_with_json_codec():
+    if WiseAgentRegistry.get_config().get("use_redis") != True:
+        pytest.skip("The registry is not configured to use redis")
+    config = WiseAgentRegistry.get_config()
+    context = None
+    try:
+        WiseAgentRegistry.reload_config(dict(config, registry_codec="json"))
+        namespace = WiseAgentRegistry.get_config().redis_namespace
+        WiseAgentTool(name="JSONTool", description="A tool stored as JSON", agent_tool=False)
+        stored = json.loads(WiseAgentRegistry.redis_db.hget(f"{namespace}tools", "JSONTool"))
+        assert "WiseAgentTool" == stored["schema"]
+        assert "JSONTool" == WiseAgentRegistry.get_tool("JSONTool").name
+        context = WiseAgentRegistry.create_context("JSONContext")
+        context.append_chat_completion({"role": "user", "content": "Hello"})
+        context.append_chat_completion(ChatCompletionMessage(role="assistant", content="Hi"))
+        # the values stored with pickle are still read
+        WiseAgentRegistry.redis_db.rpush(WiseAgentContext.redis_key(context.name, "queries"), pickle.dumps("Pickled"))
+        assert [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi"}] == context.llm_chat_completion
+        assert "Pickled" == context.get_current_query()
+        raw = WiseAgentRegistry.redis_db.lindex(WiseAgentContext.redis_key(context.name, "llm_chat_completion"), 0)
+        assert {"role": "user", "content": "Hello"} == json.loads(raw)
+        # the values stored with pickle are also removed
+        WiseAgentRegistry.redis_db.rpush(WiseAgentContext.redis_key(context.name, "llm_required_tool_call"),
+                                         pickle.dumps("PickledTool"))
+        context.append_required_tool_call("JSONTool")
+        assert ["PickledTool", "JSONTool"] == context.llm_required_tool_call
+        context.remove_required_tool_call("PickledTool")
+        context.remove_required_tool_call("JSONTool")
+        assert [] == context.llm_required_tool_call
+    finally:
+        if context is not None:
+            WiseAgentRegistry.remove_context(context.name)
+        WiseAgentRegistry.reload_config()
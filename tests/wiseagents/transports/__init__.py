@@ -0,0 +1,8 @@
+# This is the __init__.py file for the wiseagents.transports package
+
+# Import any modules or subpackages here
+
+# Define any necessary initialization code here
+
+# Optionally, you can define __all__ to specify the public interface of the package
+# __all__ = ['module1', 'module2', 'subpackage']
@@ -0,0 +1,61 @@
+import pytest
+
+from wiseagents import WiseAgentMessage, WiseAgentMessageType
+from wiseagents.transports.codec import (DEFLATE_CONTENT_ENCODING, compress_body, decompress_body, get_codec,
+                                         get_codec_for_content_type)
+
+
+def assert_same_message(expected: WiseAgentMessage, actual: WiseAgentMessage):
+    assert expected.__repr__() == actual.__repr__()
+
+
+def test_json_codec_round_trip():
+    codec = get_codec("json")
+    message = WiseAgentMessage(message="Hello", context_name="Context1", sender="Agent1",
+                               message_type=WiseAgentMessageType.ACK, tool_id="Tool1", route_response_to="Agent2")
+    decoded = get_codec_for_content_type(codec.content_type).decode(codec.encode(message))
+    assert_same_message(message, decoded)
+    assert decoded.message_type == WiseAgentMessageType.ACK
+
+
+def test_json_codec_nested_message():
+    codec = get_codec("json")
+    inner = WiseAgentMessage(message="Hello", context_name="Context1", sender="Client")
+    message = WiseAgentMessage(message=inner, context_name="Context1", sender="Agent1")
+    decoded = codec.decode(codec.encode(message))
+    assert isinstance(decoded.message, WiseAgentMessage)
+    assert_same_message(inner, decoded.message)
+
+
+def test_msgpack_codec_round_trip():
+    pytest.importorskip("msgpack")
+    codec = get_codec("msgpack")
+    message = WiseAgentMessage(message="Hello", context_name="Context1", sender="Agent1")
+    assert_same_message(message, get_codec_for_content_type(codec.content_type).decode(codec.encode(message)))
+
+
+def test_message_without_content_type_is_decoded_as_yaml():
+    message = WiseAgentMessage(message="Hello", context_name="Context1", sender="Agent1",
+                               message_type=WiseAgentMessageType.QUERY)
+    assert_same_message(message, get_codec_for_content_type(None).decode(get_codec("yaml").encode(message)))
+
+
+def test_unsupported_schema_version():
+    with pytest.raises(ValueError):
+        get_codec_for_content_type("application/vnd.wiseagents.message.v99+json")
+
+
+def test_large_message_is_compressed():
+    codec = get_codec("yaml")
+    message = WiseAgentMessage(message="Hello " * 1000, context_name="Context1", sender="Agent1")
+    body = codec.encode(message)
+    compressed, content_encoding = compress_body(body, 1024)
+    assert content_encoding == DEFLATE_CONTENT_ENCODING
+    assert len(compressed) < len(body)
+    assert_same_message(message, codec.decode(decompress_body(compressed, content_encoding)))
+
+
+def test_small_message_is_not_compressed():
+    body = get_codec("json").encode(WiseAgentMessage(message="Hello", context_name="Context1"))
+    assert compress_body(body, 1024) == (body, None)
+    assert compress_body(body, None) == (body, None)
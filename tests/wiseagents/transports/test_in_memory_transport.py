@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import List, Optional
+
+import pytest
+from openai.types.chat import ChatCompletionMessageParam
+
+from wiseagents import WiseAgent, WiseAgentMessage, WiseAgentMetaData, WiseAgentRegistry
+from wiseagents.agents import SequentialCoordinatorWiseAgent
+from wiseagents.transports import InMemoryWiseAgentTransport
+from tests.wiseagents import assert_standard_variables_set
+
+cond = threading.Condition()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def run_after_all_tests():
+    assert_standard_variables_set()
+    yield
+
+
+class EchoWiseAgent(WiseAgent):
+
+    response_received : WiseAgentMessage = None
+
+    def __init__(self, name: str):
+        super().__init__(name=name, metadata=WiseAgentMetaData(description=f"{name} echoes the requests it receives"),
+                         transport=InMemoryWiseAgentTransport(agent_name=name))
+        self.responses_received = []
+        self.requests_received = []
+
+    def process_request(self, request: WiseAgentMessage,
+                        conversation_history: List[ChatCompletionMessageParam]) -> Optional[str]:
+        self.requests_received.append(request)
+        return f"Echo: {request.message}"
+
+    def process_response(self, response: WiseAgentMessage):
+        with cond:
+            self.response_received = response
+            self.responses_received.append(response)
+            cond.notify()
+        return True
+
+    def process_event(self, event):
+        return True
+
+    def process_error(self, error):
+        return True
+
+
+def test_send_request_and_get_response():
+    context = WiseAgentRegistry.create_context("InMemoryTransportContext")
+    agent1 = EchoWiseAgent("InMemoryAgent1")
+    agent2 = EchoWiseAgent("InMemoryAgent2")
+    try:
+        request = WiseAgentMessage(message="Hello", context_name=context.name)
+        with cond:
+            agent1.send_request(request, "InMemoryAgent2")
+            cond.wait_for(lambda: agent1.response_received is not None, timeout=10)
+        assert agent1.response_received.message == "Echo: Hello"
+        assert agent1.response_received.sender == "InMemoryAgent2"
+    finally:
+        agent1.stop_agent()
+        agent2.stop_agent()
+        WiseAgentRegistry.remove_context(context.name)
+
+
+def test_request_is_delivered_once_the_agent_starts():
+    context = WiseAgentRegistry.create_context("InMemoryTransportLateContext")
+    agent1 = EchoWiseAgent("InMemoryLateAgent1")
+    try:
+        with cond:
+            agent1.send_request(WiseAgentMessage(message="Are you there?", context_name=context.name),
+                                "InMemoryLateAgent2")
+            agent2 = EchoWiseAgent("InMemoryLateAgent2")
+            cond.wait_for(lambda: agent1.response_received is not None, timeout=10)
+        assert agent1.response_received.message == "Echo: Are you there?"
+    finally:
+        agent1.stop_agent()
+        agent2.stop_agent()
+        WiseAgentRegistry.remove_context(context.name)
+
+
+def test_send_requests_to_several_agents():
+    context = WiseAgentRegistry.create_context("InMemoryTransportFanOutContext")
+    agent1 = EchoWiseAgent("InMemoryFanOutAgent1")
+    agents = [EchoWiseAgent(f"InMemoryFanOutAgent{i}") for i in range(2, 5)]
+    try:
+        with cond:
+            agent1.send_requests([(WiseAgentMessage(message="Hello", context_name=context.name), agent.name)
+                                  for agent in agents])
+            cond.wait_for(lambda: len(agent1.responses_received) == len(agents), timeout=10)
+        assert sorted(response.sender for response in agent1.responses_received) == [agent.name for agent in agents]
+        assert all(response.message == "Echo: Hello" for response in agent1.responses_received)
+    finally:
+        agent1.stop_agent()
+        for agent in agents:
+            agent.stop_agent()
+        WiseAgentRegistry.remove_context(context.name)
+
+
+def test_expired_request_is_dropped():
+    context = WiseAgentRegistry.create_context("InMemoryTransportExpiredContext")
+    agent1 = EchoWiseAgent("InMemoryExpiredAgent1")
+    agent2 = EchoWiseAgent("InMemoryExpiredAgent2")
+    try:
+        with cond:
+            agent1.send_request(WiseAgentMessage(message="Too late", context_name=context.name,
+                                                 deadline=time.time() - 1), agent2.name)
+            agent1.send_request(WiseAgentMessage(message="Just in time", context_name=context.name, priority=9,
+                                                 deadline=time.time() + 60), agent2.name)
+            cond.wait_for(lambda: len(agent1.responses_received) > 0, timeout=10)
+        assert [response.message for response in agent1.responses_received] == ["Echo: Just in time"]
+    finally:
+        agent1.stop_agent()
+        agent2.stop_agent()
+        WiseAgentRegistry.remove_context(context.name)
+
+
+def test_priority_and_deadline_are_propagated():
+    context = WiseAgentRegistry.create_context("InMemoryTransportPropagationContext")
+    agents = []
+    try:
+        agents.append(EchoWiseAgent("InMemoryPropagationClient"))
+        agents.extend(EchoWiseAgent(f"InMemoryPropagationAgent{i}") for i in range(1, 3))
+        agents.append(SequentialCoordinatorWiseAgent(name="InMemoryPropagationCoordinator",
+                                                     metadata=WiseAgentMetaData(description="Coordinator"),
+                                                     transport=InMemoryWiseAgentTransport(agent_name="InMemoryPropagationCoordinator"),
+                                                     agents=[agent.name for agent in agents[1:]]))
+        client = agents[0]
+        deadline = time.time() + 60
+        with cond:
+            client.send_request(WiseAgentMessage(message="Hello", context_name=context.name, priority=9,
+                                                 deadline=deadline), "InMemoryPropagationCoordinator")
+            cond.wait_for(lambda: client.response_received is not None, timeout=10)
+        assert "Echo: Echo: Hello" == client.response_received.message
+        # every hop of the sequence and the final response keep the priority and deadline of the request
+        for message in [agent.requests_received[0] for agent in agents[1:3]] + [client.response_received]:
+            assert (9, deadline) == (message.priority, message.deadline)
+    finally:
+        for agent in agents:
+            agent.stop_agent()
+        WiseAgentRegistry.remove_context(context.name)
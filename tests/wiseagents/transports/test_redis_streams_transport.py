@@ -0,0 +1,230 @@
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+import pytest
+import redis
+from openai.types.chat import ChatCompletionMessageParam
+
+from wiseagents import WiseAgent, WiseAgentMessage, WiseAgentMetaData, WiseAgentRegistry
+from wiseagents.transports import RedisStreamsWiseAgentTransport
+from tests.wiseagents import assert_standard_variables_set
+
+cond = threading.Condition()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def run_after_all_tests():
+    assert_standard_variables_set()
+    yield
+
+
+class EchoWiseAgent(WiseAgent):
+
+    def __init__(self, name: str, reclaim_idle_time: float = 60):
+        self.responses_received = []
+        super().__init__(name=name, metadata=WiseAgentMetaData(description=f"{name} echoes the requests it receives"),
+                         transport=RedisStreamsWiseAgentTransport(host='localhost', port=6379, agent_name=name,
+                                                                  reclaim_idle_time=reclaim_idle_time))
+
+    def process_request(self, request: WiseAgentMessage,
+                        conversation_history: List[ChatCompletionMessageParam]) -> Optional[str]:
+        return f"Echo: {request.message}"
+
+    def process_response(self, response: WiseAgentMessage):
+        with cond:
+            self.responses_received.append(response)
+            cond.notify()
+        return True
+
+    def process_event(self, event):
+        return True
+
+    def process_error(self, error):
+        return True
+
+
+class SlowEchoWiseAgent(EchoWiseAgent):
+
+    def __init__(self, name: str, release: threading.Event):
+        self.handling = threading.Event()
+        self.release = release
+        super().__init__(name=name, reclaim_idle_time=0.5)
+
+    def process_request(self, request: WiseAgentMessage,
+                        conversation_history: List[ChatCompletionMessageParam]) -> Optional[str]:
+        with cond:
+            self.handling.set()
+            cond.notify()
+        self.release.wait(10)
+        return f"Slow echo: {request.message}"
+
+
+def delete_streams(redis_db: redis.Redis, *agents: WiseAgent):
+    # the streams are deleted with their consumer groups
+    for agent in agents:
+        redis_db.delete(*redis_db.keys(f"{agent.transport.response_stream}.*"),
+                        agent.transport.request_stream, agent.transport.response_stream)
+
+
+def test_send_requests_and_get_responses():
+    """
+    Requires a Redis server on localhost:6379.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    redis_db = redis.Redis(host='localhost', port=6379)
+    context = None
+    agents = []
+    try:
+        context = WiseAgentRegistry.create_context(f"RedisStreamsTransportContext-{suffix}")
+        agents.append(EchoWiseAgent(f"RedisStreamsAgent1-{suffix}"))
+        agents.extend(EchoWiseAgent(f"RedisStreamsAgent{i}-{suffix}") for i in range(2, 4))
+        agent1 = agents[0]
+        with cond:
+            agent1.send_requests([(WiseAgentMessage(message="Hello", context_name=context.name), agent.name)
+                                  for agent in agents[1:]])
+            cond.wait_for(lambda: len(agent1.responses_received) == len(agents) - 1, timeout=10)
+        assert sorted(response.sender for response in agent1.responses_received) == [agent.name for agent in agents[1:]]
+        assert all(response.message == "Echo: Hello" for response in agent1.responses_received)
+    finally:
+        for agent in agents:
+            agent.stop_agent()
+        delete_streams(redis_db, *agents)
+        redis_db.close()
+        if context is not None:
+            WiseAgentRegistry.remove_context(context.name)
+
+
+def test_streams_use_the_registry_namespace():
+    transport = RedisStreamsWiseAgentTransport(host='localhost', port=6379, agent_name="RedisStreamsAgent")
+    namespace = WiseAgentRegistry.get_config().redis_namespace
+    assert f"{namespace}wiseagents:request:RedisStreamsAgent" == transport.request_stream
+    assert f"{namespace}wiseagents:response:RedisStreamsAgent" == transport.response_stream
+
+
+def wait_until(condition, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    return condition()
+
+
+def test_reclaim_entries_of_crashed_replica():
+    """
+    Requires a Redis server on localhost:6379.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    redis_db = redis.Redis(host='localhost', port=6379)
+    context = None
+    agents = []
+    try:
+        context = WiseAgentRegistry.create_context(f"RedisStreamsReclaimContext-{suffix}")
+        agents.append(EchoWiseAgent(f"RedisStreamsReclaimAgent1-{suffix}"))
+        agents.append(EchoWiseAgent(f"RedisStreamsReclaimAgent2-{suffix}", reclaim_idle_time=0.5))
+        agent1, agent2 = agents
+        transport = agent2.transport
+        crashed_reply_stream = transport._reply_stream("crashed")
+        # another replica of agent2 reads a request and a response, then crashes before acknowledging them.
+        # The transaction makes sure agent2 doesn't read them first
+        pipe = redis_db.pipeline(transaction=True)
+        for stream, message in ((transport.request_stream, "Hello"), (transport.response_stream, "Lost response")):
+            pipe.xadd(stream, transport._entry(WiseAgentMessage(message=message, sender=agent1.name,
+                                                                context_name=context.name)))
+        pipe.xgroup_create(crashed_reply_stream, agent2.name, id='0', mkstream=True)
+        pipe.xreadgroup(agent2.name, "crashed", {transport.request_stream: '>', transport.response_stream: '>'})
+        assert 2 == sum(len(entries) for _, entries in pipe.execute()[-1])
+        with cond:
+            cond.wait_for(lambda: len(agent1.responses_received) == 1 and len(agent2.responses_received) == 1,
+                          timeout=10)
+        assert "Echo: Hello" == agent1.responses_received[0].message
+        assert "Lost response" == agent2.responses_received[0].message
+        # the entries are acknowledged once the agent has processed them
+        for stream in (transport.request_stream, transport.response_stream):
+            assert wait_until(lambda: 0 == redis_db.xpending(stream, agent2.name)['pending'])
+        # the crashed replica is then removed with its reply stream
+        for stream in (transport.request_stream, transport.response_stream):
+            assert wait_until(lambda: [transport.instance_id] == [consumer['name'].decode("utf-8") for consumer in
+                                                                  redis_db.xinfo_consumers(stream, agent2.name)])
+        assert 0 == redis_db.exists(crashed_reply_stream)
+    finally:
+        for agent in agents:
+            agent.stop_agent()
+        delete_streams(redis_db, *agents)
+        redis_db.close()
+        if context is not None:
+            WiseAgentRegistry.remove_context(context.name)
+
+
+def test_entries_of_slow_replica_are_not_reclaimed():
+    """
+    Requires a Redis server on localhost:6379.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    redis_db = redis.Redis(host='localhost', port=6379)
+    context = None
+    agents = []
+    release = threading.Event()
+    try:
+        context = WiseAgentRegistry.create_context(f"RedisStreamsSlowContext-{suffix}")
+        agents.append(EchoWiseAgent(f"RedisStreamsSlowAgent1-{suffix}"))
+        # the replica takes longer than reclaim_idle_time to handle the request
+        agents.append(SlowEchoWiseAgent(f"RedisStreamsSlowAgent2-{suffix}", release))
+        agent1, slow_replica = agents
+        transport = slow_replica.transport
+        with cond:
+            agent1.send_request(WiseAgentMessage(message="Hello", context_name=context.name), slow_replica.name)
+            assert cond.wait_for(lambda: slow_replica.handling.is_set(), timeout=10)
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            # neither the request nor the replica look idle to the other replicas
+            pending = redis_db.xpending_range(transport.request_stream, slow_replica.name, min='-', max='+', count=10)
+            assert 1 == len(pending) and pending[0]['time_since_delivered'] < 500
+            assert all(consumer['idle'] < 500 for consumer in
+                       redis_db.xinfo_consumers(transport.request_stream, slow_replica.name))
+            time.sleep(0.1)
+        release.set()
+        with cond:
+            cond.wait_for(lambda: len(agent1.responses_received) == 1, timeout=10)
+        assert ["Slow echo: Hello"] == [response.message for response in agent1.responses_received]
+    finally:
+        release.set()
+        for agent in agents:
+            agent.stop_agent()
+        delete_streams(redis_db, *agents)
+        redis_db.close()
+        if context is not None:
+            WiseAgentRegistry.remove_context(context.name)
+
+
+def test_stop_removes_the_replica():
+    """
+    Requires a Redis server on localhost:6379.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    redis_db = redis.Redis(host='localhost', port=6379)
+    context = None
+    agents = []
+    try:
+        context = WiseAgentRegistry.create_context(f"RedisStreamsStopContext-{suffix}")
+        agents.append(EchoWiseAgent(f"RedisStreamsStopAgent1-{suffix}"))
+        agents.append(EchoWiseAgent(f"RedisStreamsStopAgent2-{suffix}"))
+        agent1, agent2 = agents
+        with cond:
+            agent1.send_request(WiseAgentMessage(message="Hello", context_name=context.name), agent2.name)
+            cond.wait_for(lambda: len(agent1.responses_received) == 1, timeout=10)
+        reply_stream = agent1.transport.reply_stream
+        agent1.stop_agent()
+        assert 0 == redis_db.exists(reply_stream)
+        assert [] == redis_db.xinfo_consumers(agent1.transport.request_stream, agent1.name)
+        # the response to a request of the stopped replica goes to the response stream of the agent
+        agent2.send_response(WiseAgentMessage(message="Late response", context_name=context.name), agent1.name)
+        assert 0 == redis_db.exists(reply_stream)
+        assert 1 == redis_db.xlen(agent1.transport.response_stream)
+    finally:
+        for agent in agents:
+            agent.stop_agent()
+        delete_streams(redis_db, *agents)
+        redis_db.close()
+        if context is not None:
+            WiseAgentRegistry.remove_context(context.name)
@@ -0,0 +1,61 @@
+import queue
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from wiseagents import WiseAgentMessage
+from wiseagents.transports import StompWiseAgentTransport
+from wiseagents.transports.stomp import _STOP
+from wiseagents.transports.worker_pool import OrderedWorkerPool
+from tests.wiseagents import assert_standard_variables_set
+
+
+@pytest.fixture(scope="session", autouse=True)
+def run_after_all_tests():
+    assert_standard_variables_set()
+    yield
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.acked = []
+        self.nacked = []
+
+    def ack(self, message_id, subscription_id):
+        self.acked.append(message_id)
+
+    def nack(self, message_id, subscription_id):
+        self.nacked.append(message_id)
+
+
+def test_requests_wait_for_the_worker_pool_without_blocking_the_receiver():
+    transport = StompWiseAgentTransport(host="localhost", port=61616, agent_name="DispatcherAgent",
+                                        max_in_flight_requests=1)
+    connection = RecordingConnection()
+    transport._request_subscription = SimpleNamespace(connection=connection, subscription_id="sub")
+    transport._reply_to = {}
+    transport._reply_to_lock = threading.Lock()
+    transport._request_pool = OrderedWorkerPool(workers=1, max_in_flight=1, name="DispatcherAgent")
+    transport._received_requests = queue.Queue()
+    transport._dispatcher = threading.Thread(target=transport._dispatch, daemon=True)
+    transport._dispatcher.start()
+    release = threading.Event()
+    handled = []
+    def receive(message):
+        release.wait(10)
+        handled.append(message.message)
+    transport.set_call_backs(receive, None, None, None)
+    try:
+        for i in range(3):
+            frame = SimpleNamespace(headers={'message-id': f"message-{i}"})
+            # the receiver thread is never blocked even though the worker pool only takes one request
+            transport._receive_request(frame, WiseAgentMessage(message=f"request {i}", context_name="context"))
+    finally:
+        release.set()
+        transport._received_requests.put(_STOP)
+        transport._dispatcher.join(10)
+        transport._request_pool.shutdown()
+    assert ["request 0", "request 1", "request 2"] == handled
+    assert ["message-0", "message-1", "message-2"] == connection.acked
+    assert [] == connection.nacked
@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+from wiseagents.transports.worker_pool import OrderedWorkerPool
+from tests.wiseagents import assert_standard_variables_set
+
+
+@pytest.fixture(scope="session", autouse=True)
+def run_after_all_tests():
+    assert_standard_variables_set()
+    yield
+
+
+def test_submit_without_blocking_when_full():
+    pool = OrderedWorkerPool(workers=2, max_in_flight=2, name="TestWorkerPool")
+    release = threading.Event()
+    done = threading.Semaphore(0)
+    def task():
+        release.wait(10)
+        done.release()
+    try:
+        assert pool.submit("context1", task, block=False)
+        assert pool.submit("context2", task, block=False)
+        # the pool is full, the task is rejected right away instead of blocking the caller
+        assert not pool.submit("context3", task, block=False)
+        release.set()
+        assert done.acquire(timeout=10) and done.acquire(timeout=10)
+        assert pool.submit("context3", done.release, block=False)
+        assert done.acquire(timeout=10)
+    finally:
+        release.set()
+        pool.shutdown()